@@ -0,0 +1,612 @@
+#!python
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmarks of split_nlogo_experiment on synthetic models of increasing size,
+and golden output checks confirming that the different ways of writing the
+files give the same result.
+"""
+
+__author__ = "Lukas Ahrenberg <lukas@ahrenberg.se>"
+
+__license__ = "GPL3"
+
+
+import sys
+
+import os
+
+import argparse
+
+import array
+
+import csv
+
+import hashlib
+
+import json
+
+import platform
+
+import shutil
+
+import subprocess
+
+import tempfile
+
+import time
+
+
+# Default location of split_nlogo_experiment, relative to this file.
+DEFAULT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              os.pardir,
+                              "split_nlogo_experiment.py")
+
+# Name of the experiment that is split.
+EXPERIMENT_NAME = "sweep"
+
+# Script template using all kinds of keys.
+SCRIPT_TEMPLATE = """#!/bin/bash
+#PBS -N {job}
+#PBS -o {csvfpath}/{job}.log
+# Combination {combination}, clone {clone}, wide value {param:wide}.
+netlogo-headless.sh --model {model} --setup-file {setup} --experiment {experiment} --table {csv}
+"""
+
+# Script template using only the keys of the first releases, for comparing
+# with the output of earlier versions.
+REFERENCE_SCRIPT_TEMPLATE = """#!/bin/bash
+#PBS -N {job}
+#PBS -o {csvfpath}/{job}.log
+# Combination {combination}.
+netlogo-headless.sh --model {model} --setup-file {setup} --experiment {experiment} --table {csv}
+"""
+
+# Sections of an .nlogo file after the code: interface, info, turtle shapes,
+# version, preview, system dynamics, BehaviorSpace, HubNet, link shapes,
+# model settings and DeltaTick.
+NUM_SECTIONS_AFTER_CODE = 11
+EXPERIMENTS_SECTION = 6
+
+
+def scaleVariables(scale):
+    """
+    Varying variables of a synthetic experiment with 10**scale combinations.
+
+    There are two enumerated variables of ten values each, one with numbers
+    and one with strings, a stepped variable of ten floating point values,
+    and a wide stepped range making up the rest. Scales above four get
+    further stepped variables of ten values each.
+
+    Parameters
+    ----------
+
+    scale : int
+       Base ten logarithm of the number of combinations, at least 3.
+
+    Returns
+    -------
+
+    enumerated : list
+       List of (variable_name, [value_0, ... , value_N]) tuples, values as
+       written in the model file.
+
+    stepped : list
+       List of (variable_name, first, step, last) tuples.
+
+    """
+    if scale < 3:
+        raise ValueError("The scale must be at least 3.")
+    enumerated = [("density", [str(v * 5) for v in range(10)]),
+                  ("strategy", ["&quot;s{0}&quot;".format(v) for v in range(10)])]
+    stepped = [("rate", "0", "0.1", "0.9")]
+    extra = max(0, scale - 4)
+    for v in range(extra):
+        stepped.append(("factor-{0}".format(v), "1", "1", "10"))
+    wide = 10 ** (scale - 3 - extra)
+    stepped.append(("wide", "0", "2", str(2 * (wide - 1))))
+    return enumerated, stepped
+
+
+def experimentXML(name, enumerated, stepped, repetitions = 1, constants = 0):
+    """
+    The XML of an experiment with the given value sets, and constants
+    single valued enumerated value sets.
+    """
+    lines = ['  <experiment name="{0}" repetitions="{1}" runMetricsEveryStep="true">'\
+                 .format(name, repetitions),
+             '    <setup>setup</setup>',
+             '    <go>go</go>',
+             '    <timeLimit steps="1000"/>',
+             '    <metric>count turtles</metric>',
+             '    <metric>mean [energy] of turtles</metric>']
+    for variable, values in enumerated:
+        lines.append('    <enumeratedValueSet variable="{0}">'.format(variable))
+        for value in values:
+            lines.append('      <value value="{0}"/>'.format(value))
+        lines.append('    </enumeratedValueSet>')
+    for variable, first, step, last in stepped:
+        lines.append('    <steppedValueSet variable="{0}" first="{1}" step="{2}" last="{3}"/>'\
+                         .format(variable, first, step, last))
+    for c in range(constants):
+        lines.append('    <enumeratedValueSet variable="constant-{0}">'.format(c))
+        lines.append('      <value value="{0}"/>'.format(c))
+        lines.append('    </enumeratedValueSet>')
+    lines.append('  </experiment>')
+    return "\n".join(lines)
+
+
+def makeModel(nlogo_file, scale, num_experiments = 50, constants = 40, code_lines = 20000):
+    """
+    Write a synthetic .nlogo model with an experiment called 'sweep' of
+    10**scale combinations.
+
+    The experiment comes after num_experiments other experiments, so that
+    these have to be read past, and the model has large code, interface and
+    info sections.
+
+    Parameters
+    ----------
+
+    nlogo_file : str
+       File name of the model.
+
+    scale : int
+       Base ten logarithm of the number of combinations, at least 3.
+
+    num_experiments : int, optional
+       Number of experiments before 'sweep'.
+
+    constants : int, optional
+       Number of single valued enumerated value sets in 'sweep'.
+
+    code_lines : int, optional
+       Number of lines of code of the model, also used for the size of the
+       interface and info sections.
+
+    """
+    enumerated, stepped = scaleVariables(scale)
+    experiments = []
+    for e in range(num_experiments):
+        experiments.append(experimentXML("other {0}".format(e),
+                                         [("density", [str(v) for v in range(e % 7 + 1)])],
+                                         [("rate", "0", "0.25", "1")],
+                                         repetitions = 3,
+                                         constants = 5))
+    experiments.append(experimentXML(EXPERIMENT_NAME, enumerated, stepped,
+                                     repetitions = 4,
+                                     constants = constants))
+
+    sections = ["\n".join(["globals [ energy-total ]",
+                           "turtles-own [ energy ]"]
+                          + ["to procedure-{0}\n  ask turtles [ set energy energy + {0} ]\nend"\
+                                 .format(line) for line in range(code_lines // 3)])]
+    for section in range(NUM_SECTIONS_AFTER_CODE):
+        if section == EXPERIMENTS_SECTION:
+            sections.append("<experiments>\n" + "\n".join(experiments) + "\n</experiments>")
+        elif section == 0:
+            sections.append("\n".join(["SLIDER\n{0}\n{1}\n{2}\n{3}\ndensity\ndensity\n0\n100\n50\n1\n1\nNIL\nHORIZONTAL\n"\
+                                           .format(i, i * 2, i + 100, i * 2 + 30) \
+                                           for i in range(code_lines // 15)]))
+        elif section == 1:
+            sections.append("## WHAT IS IT?\n\n" + "A synthetic model for benchmarks. " * code_lines)
+        else:
+            sections.append("")
+    with open(nlogo_file, 'w') as nlogofp:
+        nlogofp.write("\n@#$#@#$#@\n".join(sections) + "\n")
+
+
+def defaultOutputDir():
+    """
+    Directory for the files written by the benchmarks: /dev/shm if it
+    exists, so the file system is in memory, otherwise the temporary
+    directory.
+    """
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+def runSplit(script, nlogo_file, output_dir, options = (), stats_file = None):
+    """
+    Run split_nlogo_experiment on the 'sweep' experiment of a model.
+
+    Parameters
+    ----------
+
+    script : str
+       Path of split_nlogo_experiment.
+
+    nlogo_file : str
+       The model.
+
+    output_dir : str
+       Directory of the files. Must exist.
+
+    options : sequence, optional
+       Further command line options.
+
+    stats_file : str, optional
+       If given, the statistics of the split are saved to this file (see
+       --stats_json).
+
+    Returns
+    -------
+
+    seconds : float
+       Wall clock time of the split, including starting Python.
+
+    Raises
+    ------
+
+    subprocess.CalledProcessError
+       If the split fails. Its stderr holds the error output of the split.
+
+    """
+    command = [sys.executable, script, nlogo_file, EXPERIMENT_NAME,
+               "--output_dir", output_dir] + list(options)
+    if stats_file != None:
+        command += ["--stats_json", stats_file]
+    started = time.time()
+    subprocess.run(command, stdout = subprocess.DEVNULL, stderr = subprocess.PIPE,
+                   universal_newlines = True, check = True)
+    return time.time() - started
+
+
+def benchmark(script, work_dir, output_dir, scale, options = (), repeats = 1):
+    """
+    Time the split of a synthetic model of 10**scale combinations.
+
+    The model is created in work_dir and the files written to a directory
+    in output_dir, which is removed afterwards. The fastest of repeats
+    splits is kept.
+
+    Returns
+    -------
+
+    result : dict
+       The scale, options and the statistics of the split (see
+       --stats_json), with the wall clock time in "wall_seconds" and the
+       files written per second in "files_per_second".
+
+    """
+    nlogo_file = os.path.join(work_dir, "synthetic_{0}.nlogo".format(scale))
+    if not os.path.exists(nlogo_file):
+        makeModel(nlogo_file, scale)
+    stats_file = os.path.join(work_dir, "stats.json")
+    best = None
+    for repeat in range(repeats):
+        run_dir = tempfile.mkdtemp(prefix = "split_benchmark_", dir = output_dir)
+        try:
+            wall_seconds = runSplit(script, nlogo_file, run_dir, options, stats_file)
+        finally:
+            shutil.rmtree(run_dir)
+        with open(stats_file) as statsfp:
+            stats = json.load(statsfp)
+        if best == None or stats["seconds"] < best["seconds"]:
+            best = stats
+            best["wall_seconds"] = wall_seconds
+    best["scale"] = scale
+    best["options"] = list(options)
+    best["files_per_second"] = best["files"] / best["seconds"] if best["seconds"] > 0 else None
+    return best
+
+
+def outputDigests(directory):
+    """
+    Content hashes of all files in a directory, by file name relative to
+    the directory.
+    """
+    digests = {}
+    for path, dirs, files in os.walk(directory):
+        for file_name in files:
+            full_name = os.path.join(path, file_name)
+            with open(full_name, 'rb') as fp:
+                digests[os.path.relpath(full_name, directory)] = hashlib.sha1(fp.read()).hexdigest()
+    return digests
+
+
+def goldenCheck(script, work_dir, output_dir, reference_script = None, scale = 3):
+    """
+    Check that the ways of writing the files of a split give identical xml
+    setup files, scripts and run tables.
+
+    The split of a synthetic model with the default, fast, writer is
+    compared to the split with --dom_writer, with several worker processes,
+    with binary run tables, and, if given, to the split by another version
+    of split_nlogo_experiment. The latter comparison uses a script template
+    with only the keys known to the first releases. All splits write to
+    the same directory, as the scripts hold its path. A split that fails
+    counts as a failed check.
+
+    Parameters
+    ----------
+
+    script : str
+       Path of split_nlogo_experiment.
+
+    work_dir : str
+       Directory of the model and script template.
+
+    output_dir : str
+       Directory in which the splits are written.
+
+    reference_script : str, optional
+       Path of another split_nlogo_experiment, for instance the last
+       release, whose output should be the same.
+
+    scale : int, optional
+       Base ten logarithm of the number of combinations of the model.
+
+    Returns
+    -------
+
+    failures : list
+       Descriptions of the differences found. Empty if all are the same.
+
+    """
+    nlogo_file = os.path.join(work_dir, "golden_{0}.nlogo".format(scale))
+    makeModel(nlogo_file, scale, num_experiments = 5, constants = 5, code_lines = 100)
+    template_file = os.path.join(work_dir, "template.pbs")
+    with open(template_file, 'w') as templatefp:
+        templatefp.write(SCRIPT_TEMPLATE)
+    reference_template_file = os.path.join(work_dir, "reference_template.pbs")
+    with open(reference_template_file, 'w') as templatefp:
+        templatefp.write(REFERENCE_SCRIPT_TEMPLATE)
+    common = ["--create_run_table",
+              "--repetitions_per_run", "2"]
+    current = common + ["--create_script", template_file]
+    original = common + ["--create_script", reference_template_file]
+    # Variants as (name, script, options, group). The output of each is
+    # compared with that of the first variant of its group.
+    variants = [("fast writer", script, current, "current"),
+                ("--dom_writer", script, current + ["--dom_writer"], "current"),
+                ("--jobs 2", script, current + ["--jobs", "2"], "current"),
+                ("--dom_writer --jobs 2", script, current + ["--dom_writer", "--jobs", "2"], "current")]
+    if reference_script != None:
+        variants += [("fast writer, original template keys", script, original, "reference"),
+                     ("reference " + reference_script, reference_script, original, "reference")]
+
+    run_dir = os.path.join(output_dir, "split_golden_check")
+    failures = []
+    goldens = {}
+    for name, variant_script, options, group in variants:
+        if os.path.exists(run_dir):
+            shutil.rmtree(run_dir)
+        os.mkdir(run_dir)
+        try:
+            runSplit(variant_script, nlogo_file, run_dir, options)
+            digests = outputDigests(run_dir)
+        except subprocess.CalledProcessError as cpe:
+            failures.append(splitFailure(name, cpe))
+            digests = None
+        finally:
+            shutil.rmtree(run_dir)
+        if group not in goldens:
+            goldens[group] = digests
+            continue
+        golden = goldens[group]
+        if golden == None or digests == None:
+            continue
+        missing = sorted(set(golden) - set(digests))
+        extra = sorted(set(digests) - set(golden))
+        changed = sorted([file_name for file_name in golden \
+                              if file_name in digests and digests[file_name] != golden[file_name]])
+        for kind, file_names in (("missing", missing), ("extra", extra), ("different", changed)):
+            if len(file_names) > 0:
+                failures.append("{0}: {1} file(s) {2}, for instance '{3}'"\
+                                    .format(name, len(file_names), kind, file_names[0]))
+
+    # The binary run table should hold the same rows as the csv table.
+    tables = []
+    for run_table_format in ("csv", "binary"):
+        os.mkdir(run_dir)
+        try:
+            runSplit(script, nlogo_file, run_dir,
+                     current + ["--run_table_format", run_table_format])
+            tables.append(readRunTable(os.path.join(run_dir, EXPERIMENT_NAME + "_run_table"),
+                                       run_table_format))
+        except subprocess.CalledProcessError as cpe:
+            failures.append(splitFailure("--run_table_format " + run_table_format, cpe))
+            return failures
+        finally:
+            shutil.rmtree(run_dir)
+    if tables[0] != tables[1]:
+        rows = [row for row in range(min(len(tables[0]), len(tables[1]))) \
+                    if tables[0][row] != tables[1][row]]
+        failures.append("binary run table: {0} rows, csv run table {1} rows, first difference in row {2}"\
+                            .format(len(tables[1]), len(tables[0]), 
+                                    rows[0] if len(rows) > 0 else min(len(tables[0]), len(tables[1]))))
+    return failures
+
+
+def splitFailure(name, cpe):
+    """
+    Description of a split that failed, with the last line of its error
+    output.
+    """
+    lines = (cpe.stderr or "").strip().splitlines()
+    return "{0}: split failed with exit status {1}: {2}"\
+        .format(name, cpe.returncode, lines[-1] if len(lines) > 0 else "no error output")
+
+
+def readRunTable(file_base, run_table_format):
+    """
+    The rows of a run table, as lists of the run number and the values of
+    the variables as strings.
+
+    Parameters
+    ----------
+
+    file_base : str
+       File name of the run table without extension.
+
+    run_table_format : str
+       'csv' or 'binary'.
+
+    Returns
+    -------
+
+    rows : list
+       The rows of the table, without header.
+
+    """
+    if run_table_format == "csv":
+        with open(file_base + ".csv") as csvfp:
+            return [row for row in csv.reader(csvfp)][1:]
+
+    with open(file_base + ".json") as jsonfp:
+        meta = json.load(jsonfp)
+    values = array.array({"<u1" : "B", "<u2" : "H", "<u4" : "I", "<u8" : "Q"}[meta["dtype"]])
+    with open(file_base + ".bin", 'rb') as binfp:
+        values.frombytes(binfp.read())
+    if sys.byteorder != "little":
+        values.byteswap()
+    rows = []
+    for row in range(meta["runs"]):
+        columns = values[row * meta["columns"]:(row + 1) * meta["columns"]]
+        if meta["run_column"]:
+            run, columns = columns[0], columns[1:]
+        else:
+            run = meta["first_run"] + row
+        rows.append([str(run)] + [str(meta["values"][variable][index]) \
+                                      for variable, index in enumerate(columns[:len(meta["variables"])])])
+    return rows
+
+
+def compareBaseline(results, baseline, tolerance):
+    """
+    Compare benchmark results with a baseline.
+
+    Parameters
+    ----------
+
+    results : list
+       Results of benchmark.
+
+    baseline : dict
+       Baseline saved earlier, with a list of "results".
+
+    tolerance : float
+       Largest allowed slowdown, as a fraction of the baseline's runs per
+       second.
+
+    Returns
+    -------
+
+    report : list
+       One line per scale in both, with the change in runs per second, and
+       whether it is a regression.
+
+    regressions : int
+       Number of regressions.
+
+    """
+    previous = dict([((result["scale"], tuple(result["options"])), result) \
+                         for result in baseline["results"]])
+    report = []
+    regressions = 0
+    for result in results:
+        key = (result["scale"], tuple(result["options"]))
+        if key not in previous or not previous[key]["runs_per_second"]:
+            continue
+        change = result["runs_per_second"] / previous[key]["runs_per_second"] - 1.0
+        regression = change < -tolerance
+        regressions += regression
+        report.append("10^{0} runs: {1:+.1f}% runs/s compared to baseline{2}"\
+                          .format(result["scale"], 100.0 * change,
+                                  " - REGRESSION" if regression else ""))
+    return report, regressions
+
+
+if __name__ == "__main__":
+
+    aparser = argparse.ArgumentParser(description = "Benchmark split_nlogo_experiment on synthetic models.")
+    aparser.add_argument("--script", default = DEFAULT_SCRIPT, help = "split_nlogo_experiment to benchmark. Default: the one in this repository.")
+    aparser.add_argument("--scales", type = int, nargs = "+", default = [3, 4, 5], help = "Sizes of the synthetic experiments, as base ten logarithms of the number of runs. Default: %(default)s. A scale of 6 writes a million files.")
+    aparser.add_argument("--repeats", type = int, default = 3, help = "Number of times each split is timed; the fastest is kept. Default: %(default)s.")
+    aparser.add_argument("--output_dir", default = defaultOutputDir(), help = "Directory in which the files are written, preferably in memory. Default: %(default)s.")
+    aparser.add_argument("--work_dir", help = "Directory of the synthetic models. Default: a temporary directory, removed afterwards.")
+    aparser.add_argument("--options", default = "", help = "Further options of the splits, for instance '--create_script template.pbs --jobs 4'.")
+    aparser.add_argument("--save_baseline", metavar = "FILE", help = "Save the results as a baseline in FILE.")
+    aparser.add_argument("--baseline", metavar = "FILE", help = "Compare the results with the baseline in FILE, and exit with status 1 if any scale is slower than allowed by --tolerance.")
+    aparser.add_argument("--tolerance", type = float, default = 0.2, help = "Largest slowdown compared to the baseline not counted as a regression, as a fraction. Default: %(default)s.")
+    aparser.add_argument("--check", action = "store_true", help = "Run the golden output checks instead of the benchmarks: the xml setup files, scripts and run tables must be the same whichever writer and number of jobs are used.")
+    aparser.add_argument("--reference", metavar = "SCRIPT", help = "With --check, also compare the output with that of another split_nlogo_experiment, for instance the last release.")
+
+    argument_ns = aparser.parse_args()
+
+    script = os.path.abspath(argument_ns.script)
+    work_dir = argument_ns.work_dir
+    if work_dir == None:
+        work_dir = tempfile.mkdtemp(prefix = "split_benchmark_models_")
+    elif not os.path.isdir(work_dir):
+        os.mkdir(work_dir)
+
+    try:
+        if argument_ns.check == True:
+            reference = os.path.abspath(argument_ns.reference) \
+                if argument_ns.reference != None else None
+            failures = goldenCheck(script, work_dir, argument_ns.output_dir, reference)
+            for failure in failures:
+                print("FAILED " + failure)
+            if len(failures) > 0:
+                exit(1)
+            print("Golden output checks passed.")
+            exit(0)
+
+        options = argument_ns.options.split()
+        results = []
+        print("{0:>6} {1:>10} {2:>10} {3:>12} {4:>12} {5:>10}"\
+                  .format("Runs", "Seconds", "Runs/s", "Files/s", "MB/s", "Peak MB"))
+        for scale in argument_ns.scales:
+            try:
+                result = benchmark(script, work_dir, argument_ns.output_dir, scale,
+                                   options, argument_ns.repeats)
+            except subprocess.CalledProcessError as cpe:
+                sys.stderr.write(cpe.stderr or "")
+                print("FAILED " + splitFailure("10^{0} runs".format(scale), cpe))
+                exit(1)
+            results.append(result)
+            print("{0:>6} {1:>10.2f} {2:>10.0f} {3:>12.0f} {4:>12.1f} {5:>10.1f}"\
+                      .format("10^{0}".format(scale),
+                              result["seconds"],
+                              result["runs_per_second"] or 0.0,
+                              result["files_per_second"] or 0.0,
+                              result["bytes"] / result["seconds"] / 1048576.0 if result["seconds"] > 0 else 0.0,
+                              max(result["peak_rss"], result["peak_rss_workers"]) / 1048576.0 \
+                                  if result["peak_rss"] != None else 0.0))
+    finally:
+        if argument_ns.work_dir == None:
+            shutil.rmtree(work_dir)
+
+    baseline_data = {"python" : platform.python_version(),
+                     "platform" : platform.platform(),
+                     "output_dir" : argument_ns.output_dir,
+                     "date" : time.strftime("%Y-%m-%d %H:%M:%S"),
+                     "results" : results}
+    if argument_ns.save_baseline != None:
+        with open(argument_ns.save_baseline, 'w') as baselinefp:
+            json.dump(baseline_data, baselinefp, indent = 2)
+            baselinefp.write("\n")
+
+    if argument_ns.baseline != None:
+        with open(argument_ns.baseline) as baselinefp:
+            report, regressions = compareBaseline(results, json.load(baselinefp),
+                                                  argument_ns.tolerance)
+        for line in report:
+            print(line)
+        if regressions > 0:
+            exit(1)
@@ -29,19 +29,471 @@ __version__ = "0.3"
 
 import sys
 
+import array
+
 import os.path
 
 import argparse
 
 from xml.dom import minidom
 
+from xml.dom import pulldom
+
 from string import Formatter
 
 import csv
 
+import io
+
+import json
+
+import mmap
+
+import heapq
+
+import math
+
+import re
+
+import struct
+
+import tarfile
+
+import time
+
+import zipfile
+
+import hashlib
+
+import multiprocessing
+
+import pickle
+
+import random
+
+import functools
+
+import collections
+
+import shlex
+
+import signal
+
+import subprocess
+
+import shutil
+
+import cProfile
+
+from decimal import Decimal, InvalidOperation
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is then not reported.
+    resource = None
+
+class CombinationSpace(object):
+    """
+    Random-access view of all variable value combinations of an experiment.
+
+    Combinations are numbered in the same order as a nested loop over the
+    variables, where the first variable is the outermost loop. That is, the
+    number of a combination is a mixed radix number with one digit per
+    variable, the digit being the index into that variable's value list.
+    Mapping between combination numbers and values is O(#variables) and does
+    not require enumerating earlier combinations.
+
+    Parameters
+    ----------
+
+    value_tuples : list
+       List of tuples, each tuple is on the form
+       (variable_name, [value_0, value_1, ... , value_N])
+       where the value list is the possible values for that variable.
+
+    """
+
+    def __init__(self, value_tuples):
+        self.names = [name for name, values in value_tuples]
+        self.values = [list(values) for name, values in value_tuples]
+        self.sizes = [len(values) for values in self.values]
+        # Place value of each digit, the last variable varies fastest.
+        self.strides = [1] * len(self.sizes)
+        size = 1
+        for i in range(len(self.sizes) - 1, -1, -1):
+            self.strides[i] = size
+            size *= self.sizes[i]
+        self.size = size
+        # Value to index lookup tables, built when first needed.
+        self._lookup = None
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return self.iterate()
+
+    def _checkIndex(self, index):
+        if index < 0 or index >= self.size:
+            raise IndexError("Combination number {0} out of range [0, {1})."\
+                                 .format(index, self.size))
+
+    def indices(self, index):
+        """
+        Value indices of a combination.
+
+        Parameters
+        ----------
+
+        index : int
+           Combination number.
+
+        Returns
+        -------
+
+        indices : list
+           One index per variable into the variable's value list.
+
+        """
+        self._checkIndex(index)
+        indices = []
+        for stride, size in zip(self.strides, self.sizes):
+            indices.append((index // stride) % size)
+        return indices
+
+    def combination(self, index):
+        """
+        Variable values of a combination.
+
+        Parameters
+        ----------
+
+        index : int
+           Combination number.
+
+        Returns
+        -------
+
+        combination : list
+           List of (variable_name, value) tuples, one per variable.
+
+        """
+        return [(name, values[i]) for name, values, i \
+                    in zip(self.names, self.values, self.indices(index))]
+
+    def indexOfIndices(self, indices):
+        """
+        Combination number from value indices. Inverse of indices.
+
+        Parameters
+        ----------
+
+        indices : list
+           One index per variable into the variable's value list.
+
+        Returns
+        -------
+
+        index : int
+           Combination number.
+
+        """
+        if len(indices) != len(self.sizes):
+            raise ValueError("Expected {0} value indices, got {1}."\
+                                 .format(len(self.sizes), len(indices)))
+        index = 0
+        for i, stride, size in zip(indices, self.strides, self.sizes):
+            if i < 0 or i >= size:
+                raise IndexError("Value index {0} out of range [0, {1})."\
+                                     .format(i, size))
+            index += i * stride
+        return index
+
+    def index(self, combination):
+        """
+        Combination number from variable values. Inverse of combination.
+
+        Parameters
+        ----------
+
+        combination : list or dict
+           List of (variable_name, value) tuples, or a dictionary mapping
+           variable names to values. All variables must be given.
+
+        Returns
+        -------
+
+        index : int
+           Combination number.
+
+        """
+        if self._lookup is None:
+            self._lookup = []
+            for values in self.values:
+                lookup = {}
+                for i, val in enumerate(values):
+                    # Keep the first index of repeated values.
+                    lookup.setdefault(val, i)
+                self._lookup.append(lookup)
+        valuemap = dict(combination)
+        indices = []
+        for name, lookup in zip(self.names, self._lookup):
+            try:
+                indices.append(lookup[valuemap[name]])
+            except KeyError:
+                raise ValueError("No value {0!r} for variable '{1}' in combination space."\
+                                     .format(valuemap.get(name), name))
+        return self.indexOfIndices(indices)
+
+    def combinationOfIndices(self, indices):
+        """
+        Variable values of a combination given as value indices.
+
+        Parameters
+        ----------
+
+        indices : list
+           One index per variable into the variable's value list.
+
+        Returns
+        -------
+
+        combination : list
+           List of (variable_name, value) tuples, one per variable.
+
+        """
+        return [(name, values[i]) for name, values, i \
+                    in zip(self.names, self.values, indices)]
+
+    def iterateIndices(self, start = 0, stop = None):
+        """
+        Generator giving the value indices of the combinations numbered start
+        up to (excluding) stop.
+
+        Yields
+        ------
+
+           : List of value indices, one per variable. The list is reused 
+           between yields and must be copied if kept.
+
+        """
+        if stop is None or stop > self.size:
+            stop = self.size
+        if start >= stop:
+            return
+        indices = self.indices(start)
+        last = len(indices) - 1
+        for index in range(start, stop):
+            yield indices
+            # Increment the odometer.
+            pos = last
+            while pos >= 0:
+                indices[pos] += 1
+                if indices[pos] < self.sizes[pos]:
+                    break
+                indices[pos] = 0
+                pos -= 1
+
+    def iterate(self, start = 0, stop = None):
+        """
+        Generator giving the combinations numbered start up to (excluding) stop.
+
+        Parameters
+        ----------
+
+        start : int, optional
+           First combination number.
+
+        stop : int, optional
+           Combination number to stop at. Default is the size of the space.
+
+        Yields
+        ------
+
+           : List of (variable_name, value) tuples for each combination.
+
+        """
+        for chunk in self.chunks(start, stop):
+            for combination in chunk:
+                yield combination
+
+    def chunks(self, start = 0, stop = None, chunk_size = 1024):
+        """
+        Generator giving combinations in bulk.
+
+        Combinations are produced by incrementing the value indices as an
+        odometer, so no division is needed after the first combination.
+
+        Parameters
+        ----------
+
+        start : int, optional
+           First combination number.
+
+        stop : int, optional
+           Combination number to stop at. Default is the size of the space.
+
+        chunk_size : int, optional
+           Maximum number of combinations in each chunk.
+
+        Yields
+        ------
+
+           : List of up to chunk_size combinations, each a list of
+           (variable_name, value) tuples.
+
+        """
+        if stop is None or stop > self.size:
+            stop = self.size
+        if start >= stop:
+            return
+        indices = self.indices(start)
+        current = [values[i] for values, i in zip(self.values, indices)]
+        last = len(indices) - 1
+        index = start
+        while index < stop:
+            chunk = []
+            chunk_stop = min(stop, index + chunk_size)
+            while index < chunk_stop:
+                chunk.append(list(zip(self.names, current)))
+                index += 1
+                # Increment the odometer.
+                pos = last
+                while pos >= 0:
+                    indices[pos] += 1
+                    if indices[pos] < self.sizes[pos]:
+                        current[pos] = self.values[pos][indices[pos]]
+                        break
+                    indices[pos] = 0
+                    current[pos] = self.values[pos][0]
+                    pos -= 1
+            yield chunk
+
+
+SAMPLING_METHODS = ("random", "lhs", "halton")
+
+
+def _primes(count):
+    # The first count prime numbers.
+    primes = []
+    candidate = 2
+    while len(primes) < count:
+        if all(candidate % prime != 0 for prime in primes):
+            primes.append(candidate)
+        candidate += 1
+    return primes
+
+
+def _radicalInverse(i, base):
+    # Van der Corput radical inverse of i in the given base.
+    inverse = 0.0
+    scale = 1.0 / base
+    while i > 0:
+        inverse += (i % base) * scale
+        i //= base
+        scale /= base
+    return inverse
+
+
+def sampleCombinations(space, sample_size, method = "random", seed = None):
+    """
+    Select combinations of a combination space without enumerating it.
+
+    The methods are
+
+    random
+       Uniformly random combinations, without replacement.
+
+    lhs
+       Latin hypercube sampling: the range of each variable is divided 
+       into sample_size strata, and each stratum is used by one sample.
+
+    halton
+       Points of the low discrepancy Halton sequence, one prime base per 
+       variable. If a seed is given the points are randomly shifted.
+
+    Points of the lhs and halton methods are mapped onto the value lists,
+    so several points may fall on the same combination. The duplicates are
+    replaced by further points of the Halton sequence, up to twice 
+    sample_size points, or by random combinations for lhs, so that 
+    sample_size distinct combinations are always selected. Combinations
+    still missing after the Halton points are chosen at random. If more 
+    than half of the space is to be selected, the combinations left out
+    are selected by the method instead, and all others returned.
+
+    Parameters
+    ----------
+
+    space : CombinationSpace
+       The full space of combinations.
+
+    sample_size : int
+       Number of combinations to select. If it is not smaller than the size
+       of the space all combinations are selected.
+
+    method : str, optional
+       One of SAMPLING_METHODS.
+
+    seed : int, optional
+       Seed of the random number generator, for reproducible samples.
+
+    Returns
+    -------
+
+    combinations : list
+       Selected combination numbers, in increasing order.
+
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError("Unknown sampling method '{0}'.".format(method))
+    if sample_size >= len(space):
+        return list(range(len(space)))
+    if sample_size < 1:
+        return []
+    rng = random.Random(seed)
+    if method == "random":
+        return sorted(rng.sample(range(len(space)), sample_size))
+    if 2 * sample_size > len(space):
+        # Points would mostly fall on combinations already chosen.
+        excluded = set(sampleCombinations(space, len(space) - sample_size, method, seed))
+        return [combination for combination in range(len(space)) \
+                    if combination not in excluded]
+
+    def combinationOfPoint(point):
+        return space.indexOfIndices([min(size - 1, int(x * size)) \
+                                         for x, size in zip(point, space.sizes)])
+
+    chosen = set()
+    if method == "lhs":
+        strata = []
+        for size in space.sizes:
+            permutation = list(range(sample_size))
+            rng.shuffle(permutation)
+            strata.append(permutation)
+        for i in range(sample_size):
+            chosen.add(combinationOfPoint([(permutation[i] + rng.random()) / sample_size \
+                                               for permutation in strata]))
+        while len(chosen) < sample_size:
+            chosen.add(rng.randrange(len(space)))
+    else:
+        bases = _primes(len(space.sizes))
+        shifts = [rng.random() if seed != None else 0.0 for base in bases]
+        # Point 0 of the sequence is the origin, start at 1. The number of
+        # points is bounded, as they may keep falling on chosen combinations.
+        i = 1
+        while len(chosen) < sample_size and i <= 2 * sample_size:
+            chosen.add(combinationOfPoint([(_radicalInverse(i, base) + shift) % 1.0 \
+                                               for base, shift in zip(bases, shifts)]))
+            i += 1
+        while len(chosen) < sample_size:
+            chosen.add(rng.randrange(len(space)))
+    return sorted(chosen)
+
+
 def expandValueSets( value_tuples):
     """
-    Recursive generator giving the different combinations of variable values.
+    Generator giving the different combinations of variable values.
     
     Parameters
     ----------
@@ -57,17 +509,17 @@ def expandValueSets( value_tuples):
        combination for all variables listed in the original value_tuples.
     
     """
-    if len(value_tuples) == 1:
-        for val in value_tuples[0][1]:
-            yield [(value_tuples[0][0], val)]
-    else:            
-        for val in value_tuples[0][1]:
-            for vlist in expandValueSets(value_tuples[1:]):
-                yield [(value_tuples[0][0], val)] + vlist
+    return CombinationSpace(value_tuples).iterate()
 
-def steppedValueSet(first, step, last):
+def steppedValueSet(first, step, last, exact = False):
     """
     Tries to mimic the functionality of BehaviorSpace SteppedValueSet class.
+
+    Value number n is first + n * step, computed in floating point as 
+    BehaviorSpace does, for all n where this is not larger than last. The 
+    number of values is computed directly rather than by stepping, so long 
+    value sets are fast to create. Results are cached, so value sets 
+    repeated in several experiments are only created once.
     
     Parameters
     ----------
@@ -76,13 +528,19 @@ def steppedValueSet(first, step, last):
        Start of value set.
        
     step : float
-       Step length of value set.
+       Step length of value set. Must be positive unless first > last.
 
     last : float
        Last value of the set. Inclusive in most cases, but may be exclusive 
        due to floating point rounding errors. This is as BehavioirSpace 
        implements it.
 
+    exact : bool, optional
+       If True the values are computed in exact decimal arithmetic from the 
+       textual form of first, step and last (pass the strings of the model 
+       file), and returned as strings with the precision of the input, 
+       e.g. '0.3' rather than 0.30000000000000004. last is then always 
+       inclusive if it is on the grid. This differs from BehaviorSpace.
 
     Returns
     -------
@@ -91,17 +549,198 @@ def steppedValueSet(first, step, last):
        The values between first and last taken with step length step.
 
     """
-    # May look backward, but this will have the same rounding behavior
-    # as the BehaviorSpace code as far as I can tell.
-    n = 0
-    val = first
-    values = []
-    while val <= last:
-        values.append(val)
-        n+=1
-        val = first + n * step
+    if exact:
+        return list(_steppedValues(str(first), str(step), str(last), True))
+    # Cached by the repr of the floats, since 0.0 == -0.0 but they are
+    # written differently.
+    return list(_steppedValues(repr(float(first)), repr(float(step)), repr(float(last)), False))
+
+
+@functools.lru_cache(maxsize = 256)
+def _steppedValues(first, step, last, exact):
+    # Cached value set as a tuple, see steppedValueSet.
+    if exact:
+        try:
+            first, step, last = Decimal(first), Decimal(step), Decimal(last)
+        except InvalidOperation:
+            raise ValueError("Invalid stepped value set '{0}', '{1}', '{2}'."\
+                                 .format(first, step, last))
+    else:
+        first, step, last = float(first), float(step), float(last)
+    if first > last:
+        return ()
+    if not step > 0:
+        raise ValueError("Step {0} of stepped value set must be positive.".format(step))
+    if exact:
+        # The first value is written as in the model file, 0 rather than
+        # 0.0 when stepping by 0.1.
+        count = int((last - first) // step) + 1
+        return tuple(["{0:f}".format(first)] + \
+                         ["{0:f}".format(first + n * step) for n in range(1, count)])
+    # The estimate may be off by a little due to rounding, adjust it so
+    # that exactly the values not larger than last are included.
+    count = int(math.floor((last - first) / step)) + 1
+    while first + count * step <= last:
+        count += 1
+    while count > 1 and first + (count - 1) * step > last:
+        count -= 1
+    # The first value is first itself, as in BehaviorSpace.
+    return (first,) + tuple([first + n * step for n in range(1, count)])
+
+
+class _RegionReader(object):
+    # File-like reading of a region of a memory mapped file, so the region
+    # can be parsed without copying it.
+
+    def __init__(self, mapped, start, stop):
+        self.mapped = mapped
+        self.pos = start
+        self.stop = stop
+
+    def read(self, size = -1):
+        if size < 0 or self.pos + size > self.stop:
+            size = self.stop - self.pos
+        data = self.mapped[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+
+def _experimentsRegions(mapped):
+    # Yields (start, stop) of each <experiments> ... </experiments> region.
+    pos = 0
+    while True:
+        start = mapped.find(b"<experiments", pos)
+        if start < 0:
+            return
+        # Make sure it is the experiments tag and not a prefix of another.
+        if mapped[start + 12:start + 13] not in (b">", b" ", b"\t", b"\n", b"\r", b"/"):
+            pos = start + 12
+            continue
+        stop = mapped.find(b"</experiments>", start)
+        if stop < 0:
+            return
+        stop += len(b"</experiments>")
+        yield start, stop
+        pos = stop
+
+
+def iterateExperiments(nlogo_file, names = None, expand = True):
+    """
+    Iterator giving the experiments of a model file, in file order.
+
+    The file is memory mapped and only the experiments sections are parsed,
+    incrementally, so neither the whole model nor a DOM of all experiments 
+    is held in memory. Works for .nlogo files, where the experiments are an 
+    XML section among non-XML sections, as well as for NetLogo .nlogox 
+    files, which are XML throughout.
+
+    Parameters
+    ----------
+
+    nlogo_file : str
+       Path of the .nlogo or .nlogox file.
+
+    names : collection, optional
+       Names of the experiments to give. Other experiments are skipped 
+       without building their nodes, and the file is not read further once 
+       all names have been found. Default is to give all experiments.
+
+    expand : bool, optional
+       If False the experiment nodes are given without their children, 
+       which is enough to list the names.
+
+    Returns
+    -------
+
+    experiments : iterator
+       Iterator giving experiment xml nodes.
+
+    """
+    # Open the file right away, so that errors are raised by the call.
+    with open(nlogo_file, 'rb') as nlogof:
+        if os.fstat(nlogof.fileno()).st_size == 0:
+            return iter([])
+        mapped = mmap.mmap(nlogof.fileno(), 0, access = mmap.ACCESS_READ)
+    return _iterateMappedExperiments(mapped, names, expand)
+
+
+def _iterateMappedExperiments(mapped, names, expand):
+    remaining = set(names) if names != None else None
+    try:
+        for start, stop in _experimentsRegions(mapped):
+            events = pulldom.parse(_RegionReader(mapped, start, stop))
+            for event, node in events:
+                if event != pulldom.START_ELEMENT or node.tagName != "experiment":
+                    continue
+                name = node.getAttribute("name")
+                if remaining != None and name not in remaining:
+                    continue
+                if expand:
+                    events.expandNode(node)
+                yield node
+                if remaining != None:
+                    remaining.discard(name)
+                    if len(remaining) < 1:
+                        return
+    finally:
+        mapped.close()
+
+
+def listExperiments(nlogo_file):
+    """
+    Names of the experiments in a model file.
+
+    Parameters
+    ----------
+
+    nlogo_file : str
+       Path of the .nlogo or .nlogox file.
+
+    Returns
+    -------
+
+    names : list
+       The experiment names, in file order.
+
+    """
+    return [node.getAttribute("name") \
+                for node in iterateExperiments(nlogo_file, expand = False)]
+
+
+# Separator of the sections of an .nlogo file. The code is the first.
+NLOGO_SECTION_SEPARATOR = b"@#$#@#$#@"
+
+
+def modelCodeHash(nlogo_file):
+    """
+    Hash of the code of a model.
+
+    The code is the first section of an .nlogo file, or the text of the 
+    code element of an .nlogox file. Changes to the interface, info tab or
+    experiments of the model do not change the hash.
+
+    Parameters
+    ----------
+
+    nlogo_file : str
+       Path of the .nlogo or .nlogox file.
+
+    Returns
+    -------
 
-    return values
+    hash : str
+       SHA-1 hex digest of the code.
+
+    """
+    with open(nlogo_file, 'rb') as nlogofp:
+        contents = nlogofp.read()
+    code = re.search(b"<code>(.*?)</code>", contents, re.DOTALL) \
+        if nlogo_file.endswith(".nlogox") else None
+    if code != None:
+        contents = code.group(1)
+    else:
+        contents = contents.split(NLOGO_SECTION_SEPARATOR, 1)[0]
+    return hashlib.sha1(contents).hexdigest()
 
 
 def saveExperimentToXMLFile(experiment, xmlfile):
@@ -125,106 +764,3295 @@ def saveExperimentToXMLFile(experiment, xmlfile):
     xmlfile.write("""<experiments>\n""")
     experiment.writexml(xmlfile)
     xmlfile.write("""</experiments>\n""")
-    
 
-def createScriptFile(script_fp,
-                     xmlfile, 
-                     nlogofile,
-                     experiment,
-                     combination_nr,
-                     script_template,
-                     csv_output_dir = "./"
-                     ):
+
+def experimentFileName(experiment_name):
     """
-    Create a script file from a template string.
+    Turn an experiment name into something usable as part of a file name.
+
+    Replace some special characters (including space) with chars that may 
+    cause problems in a file name. This is NOT fail safe right now. Assuming 
+    some form of useful experiment naming practice.
 
     Parameters
     ----------
 
-    script_fp : file pointer
-       File opened for writing.    
+    experiment_name : str
+       Name of the experiment.
 
-    xmlfile : string
-       File name and path of the xml experiment file.
-       This string will be accessible through the key {setup}
-       in the script_template string.
+    Returns
+    -------
 
-    nlogofile : string
-       File name and path of the ,nlogo model file.
-       This string will be accessible through the key {model}
-       in the script_template string.
+    file_name : str
+       The name with spaces and path separators replaced.
 
-    experiment : string
-       Name of the experiment.
-       This string will be accessible through the key {experiment}
-       in the script_template string.
+    """
+    return experiment_name.replace(' ', '_').replace('/', '-').replace('\\','-')
 
-    combination_nr : int
-       The experiment combination number.
-       This value will be accessible through the key {combination}
-       in the script_template string.
 
-    script_template : str
-       The script template string. This string will be cloned for each script
-       but the following keys can be used and will have individual values.
-       {job} - Name of the job. Will be the name of the xml-file (minus extension).
-       {combination} - The value of the parameter combination_nr.
-       {experiment} - The value of the parameter experiment.
-       {csv} - File name, including full path, of a experiment-unique csv-file.
-       {setup} - The value of the parameter csvfile.
-       {model} - The value of the parameter nlogofile.
-       {csvfname} - Only the file name part of the {csv} key.
-       {csvfpath} - Only the path part of the {csv} key.
-       
-    csv_output_dir : str, optional
-       Path to the directory used when constructing the {csv} and {csvfpath} 
-       keys.
+def splitRepetitions(original_reps, repetitions_per_run):
+    """
+    Decide how the repetitions of an experiment are split into runs.
+
+    Parameters
+    ----------
 
+    original_reps : int
+       Number of repetitions in the original experiment.
+
+    repetitions_per_run : int or None
+       Requested number of repetitions per generated run. None or a value 
+       <= 0 means no splitting.
 
     Returns
     -------
 
-    file_name : str
-       Name of the file name used for the script.
+    reps_in_experiment : int
+       Number of repetitions in each generated experiment.
+
+    reps_of_experiment : int
+       Number of generated experiments (repetition clones) per combination.
 
     """
-    jobname = os.path.splitext(os.path.basename(xmlfile))[0]
+    # Read original value first. Default is to have all internal.
+    reps_in_experiment = original_reps
+    reps_of_experiment = 1
+    if repetitions_per_run != None \
+            and repetitions_per_run > 0 \
+            and original_reps >= repetitions_per_run:
+        reps_in_experiment = int(repetitions_per_run)
+        reps_of_experiment = int(original_reps / reps_in_experiment)
+        if(original_reps % reps_in_experiment != 0):
+            sys.stderr.write("Warning: Number of repetitions per experiment does not divide the number of repetitions in the nlogo file. New number of repetitions is {0} ({1} per experiment in {2} unique script(s)). Original number of repetitions per experiment: {3}.\n"\
+                                 .format((reps_in_experiment*reps_of_experiment), 
+                                         reps_in_experiment, 
+                                         reps_of_experiment,
+                                         original_reps))
+    return reps_in_experiment, reps_of_experiment
 
 
-    fname = jobname + ".csv"
-    csvfile = os.path.join(csv_output_dir, fname)
+def extractValueSets(experiment, exact_steps = False):
+    """
+    Remove the varying value sets from an experiment node.
 
-    strformatter = Formatter()
-    formatmap = {
-        "job" : jobname, 
-        "combination" : combination_nr, 
-        "experiment" : experiment,
-        "csv" : csvfile,
-        "setup" : xmlfile,
-        "model" : nlogofile,
-        "csvfname" : fname,
-        "csvfpath" : csv_output_dir
-        }
-    # Use string formatter to go through the script template and
-    # look for unknown keys. Do not replace them, but print warning.
-    for lt, fn, fs, co in strformatter.parse(script_template):
-        if fn != None and fn not in formatmap.keys():
-            print("Warning: Unsupported key '{{{0}}}' in script template. Ignoring."\
-                      .format(fn))
-            formatmap[fn] = "{" + fn + "}"
-            
-    script_fp.write(script_template.format(**formatmap))
+    enumeratedValueSet tags with more than one value, and all 
+    steppedValueSet tags, are removed from the node and returned as value 
+    tuples. What remains of the node is the part of the experiment common to 
+    all runs.
 
-                          
-if __name__ == "__main__":
-    
+    Parameters
+    ----------
 
-    experiments_to_expand = []
-    
+    experiment : xml node
+       An experiment tag node. Will be modified.
+
+    exact_steps : bool, optional
+       If True, steppedValueSet values are computed in exact decimal 
+       arithmetic and kept as strings. See steppedValueSet.
+
+    Returns
+    -------
+
+    value_tuples : list
+       List of tuples on the form (variable_name, [value_0, ... , value_N]).
+
+    """
+    value_tuples = []
+    # Handle enumeratedValueSets
+    for evs in experiment.getElementsByTagName("enumeratedValueSet"):
+        values = evs.getElementsByTagName("value")
+        # If an enumeratedValueSet has more than a single value, it should
+        # be included in the value expansion tuples.
+        if len(values) > 1:
+            # A tuple is the name of the variable and
+            # A list of all the values.
+            value_tuples.append((evs.getAttribute("variable"), 
+                                 [val.getAttribute("value") \
+                                      for val in values]
+                                 )
+                                )
+            # Remove the node.
+            evs.parentNode.removeChild(evs)
+
+    # Handle steppedValueSet
+    for svs in experiment.getElementsByTagName("steppedValueSet"):
+        first = svs.getAttribute("first")
+        last = svs.getAttribute("last")
+        step = svs.getAttribute("step")
+        if not exact_steps:
+            first, last, step = float(first), float(last), float(step)
+        # Add values to the tuple list.
+        value_tuples.append((svs.getAttribute("variable"),
+                             steppedValueSet(first, step, last, exact = exact_steps)
+                             )
+                            )
+        # Remove node.
+        svs.parentNode.removeChild(svs)
+
+    return value_tuples
+
+
+def valueSetContainer(experiment):
+    """
+    The node holding the value sets of an experiment.
+
+    In .nlogo files the value sets are children of the experiment node. In
+    the XML of .nlogox files they are children of a constants node in the 
+    experiment.
+
+    Parameters
+    ----------
+
+    experiment : xml node
+       An experiment tag node.
+
+    Returns
+    -------
+
+    container : xml node
+       The constants child node if there is one, otherwise experiment.
+
+    """
+    for child in experiment.childNodes:
+        if child.nodeType == child.ELEMENT_NODE and child.tagName == "constants":
+            return child
+    return experiment
+
+
+def experimentInstance(experiment, combination, repetitions, document):
+    """
+    Create the experiment node of a single run.
+
+    Parameters
+    ----------
+
+    experiment : xml node
+       Experiment node with the varying value sets removed.
+
+    combination : list
+       List of (variable_name, value) tuples. Each is added to the new node 
+       as an enumeratedValueSet with a single value.
+
+    repetitions : int
+       Value of the repetitions attribute of the new node.
+
+    document : xml document
+       Document used to create the new nodes.
+
+    Returns
+    -------
+
+    experiment_instance : xml node
+       A deep copy of experiment with the combination values added.
+
+    """
+    experiment_instance = experiment.cloneNode(deep = True)
+    experiment_instance.setAttribute("repetitions",str(repetitions))
+    container = valueSetContainer(experiment_instance)
+    for evs_name, evs_value in combination:
+        evs = document.createElement("enumeratedValueSet")
+        evs.setAttribute("variable", evs_name)
+        vnode = document.createElement("value")
+        vnode.setAttribute("value", str(evs_value))
+        evs.appendChild(vnode)
+        container.appendChild(evs)
+    return experiment_instance
+
+
+def _escapeAttribute(value):
+    # Same escaping as minidom uses when writing attribute values.
+    return value.replace("&", "&amp;").replace("<", "&lt;")\
+        .replace("\"", "&quot;").replace(">", "&gt;")
+
+
+class ExperimentWriter(object):
+    """
+    Fast writer of single run experiment setup files.
+
+    The part of the experiment that is the same in all runs is serialized 
+    once, and split around the name and repetitions attributes and the point
+    where the value sets of a run are added (see valueSetContainer). Writing a run then only joins these 
+    fragments with the pre-serialized value sets of the combination. The 
+    output is the same as that of saveExperimentToXMLFile on the node built 
+    by experimentInstance.
+
+    Parameters
+    ----------
+
+    experiment : xml node
+       Experiment node with the varying value sets removed.
+
+    value_tuples : list
+       List of tuples on the form (variable_name, [value_0, ... , value_N]).
+
+    """
+
+    REPETITIONS_MARKER = "@@split_nlogo_experiment:repetitions@@"
+    NAME_MARKER = "@@split_nlogo_experiment:name@@"
+    VALUE_SETS_MARKER = "@@split_nlogo_experiment:value_sets@@"
+
+    HEADER = """<?xml version="1.0" encoding="us-ascii"?>\n""" \
+        """<!DOCTYPE experiments SYSTEM "behaviorspace.dtd">\n""" \
+        """<experiments>\n"""
+
+    FOOTER = """</experiments>\n"""
+
+    def __init__(self, experiment, value_tuples):
+        skeleton = experiment.cloneNode(deep = True)
+        skeleton.setAttribute("repetitions", self.REPETITIONS_MARKER)
+        self.name = None
+        if skeleton.hasAttribute("name"):
+            self.name = experiment.getAttribute("name")
+            skeleton.setAttribute("name", self.NAME_MARKER)
+        if len(value_tuples) < 1:
+            # Nothing is added, and minidom may write an empty tag.
+            head, tail = skeleton.toxml(), ""
+        else:
+            valueSetContainer(skeleton).appendChild(
+                skeleton.ownerDocument.createTextNode(self.VALUE_SETS_MARKER))
+            head, tail = skeleton.toxml().split(self.VALUE_SETS_MARKER)
+        # Literal text alternating with the attribute markers, in the order
+        # the attributes are written.
+        self.head = re.split("(" + re.escape(self.NAME_MARKER) 
+                             + "|" + re.escape(self.REPETITIONS_MARKER) + ")",
+                             head)
+        self.tail = tail
+        self.value_sets = [['<enumeratedValueSet variable="{0}"><value value="{1}"/></enumeratedValueSet>'\
+                                .format(_escapeAttribute(name), _escapeAttribute(str(val))) \
+                                for val in values] \
+                               for name, values in value_tuples]
+
+    def renderExperiment(self, indices, repetitions, name = None):
+        """
+        The experiment element of a run.
+
+        Parameters
+        ----------
+
+        indices : list
+           Value indices of the combination, one per variable.
+
+        repetitions : int
+           Value of the repetitions attribute.
+
+        name : str, optional
+           Name of the experiment. Default is the original name.
+
+        Returns
+        -------
+
+        xml : str
+           The experiment element.
+
+        """
+        if name == None:
+            name = self.name
+        attributes = {self.REPETITIONS_MARKER : str(repetitions),
+                      self.NAME_MARKER : _escapeAttribute(name) if name != None else ""}
+        parts = self.head[:]
+        for pos in range(1, len(parts), 2):
+            parts[pos] = attributes[parts[pos]]
+        parts.extend([value_sets[i] for value_sets, i in zip(self.value_sets, indices)])
+        parts.append(self.tail)
+        return "".join(parts)
+
+    def render(self, indices, repetitions):
+        """
+        The complete setup file of a run.
+
+        Parameters
+        ----------
+
+        indices : list
+           Value indices of the combination, one per variable.
+
+        repetitions : int
+           Value of the repetitions attribute.
+
+        Returns
+        -------
+
+        xml : str
+           Contents of the setup file.
+
+        """
+        return self.HEADER + self.renderExperiment(indices, repetitions) + self.FOOTER
+
+    def write(self, xmlfile, indices, repetitions):
+        """
+        Write the setup file of a run.
+
+        Parameters
+        ----------
+
+        xmlfile : file pointer
+           File opened for writing.
+
+        indices : list
+           Value indices of the combination, one per variable.
+
+        repetitions : int
+           Value of the repetitions attribute.
+
+        """
+        xmlfile.write(self.render(indices, repetitions))
+
+
+ARRAY_MANIFEST_FORMAT = "split_nlogo_experiment array manifest"
+
+def saveArrayManifest(manifest_fp,
+                      experiment,
+                      value_tuples,
+                      reps_in_experiment,
+                      reps_of_experiment,
+                      selection = None):
+    """
+    Save everything needed to recreate the runs of an experiment.
+
+    The manifest is a JSON document holding the experiment with the varying 
+    value sets removed (the skeleton) and the value sets themselves. Task 
+    number i of an array job is the same as run (experiment) number i in a 
+    normal split, or, if only a selection of the combinations is split, the
+    i:th selected run. Use materializeTask to create the setup of a single 
+    task.
+
+    Parameters
+    ----------
+
+    manifest_fp : file pointer
+       File opened for writing.
+
+    experiment : xml node
+       Experiment node with the varying value sets removed.
+
+    value_tuples : list
+       List of tuples on the form (variable_name, [value_0, ... , value_N]).
+
+    reps_in_experiment : int
+       Number of repetitions in each run.
+
+    reps_of_experiment : int
+       Number of runs (repetition clones) per combination.
+
+    selection : sequence, optional
+       Increasing combination numbers of the selected combinations. Default
+       is all combinations.
+
+    Returns
+    -------
+
+    num_tasks : int
+       Number of tasks (runs) described by the manifest.
+
+    """
+    if selection != None:
+        num_tasks = len(selection) * reps_of_experiment
+    else:
+        num_tasks = len(CombinationSpace(value_tuples)) * reps_of_experiment
+    manifest = {"format" : ARRAY_MANIFEST_FORMAT,
+                "version" : 1,
+                "experiment" : experiment.getAttribute("name"),
+                "skeleton" : experiment.toxml(),
+                "value_sets" : value_tuples,
+                "repetitions" : reps_in_experiment,
+                "clones" : reps_of_experiment,
+                "tasks" : num_tasks}
+    if selection != None:
+        manifest["selection"] = list(selection)
+    json.dump(manifest, manifest_fp)
+    manifest_fp.write("\n")
+    return num_tasks
+
+
+def loadArrayManifest(manifest_fp):
+    """
+    Load a manifest saved by saveArrayManifest.
+
+    Parameters
+    ----------
+
+    manifest_fp : file pointer
+       File opened for reading.
+
+    Returns
+    -------
+
+    manifest : dict
+       The manifest contents.
+
+    """
+    manifest = json.load(manifest_fp)
+    if manifest.get("format") != ARRAY_MANIFEST_FORMAT:
+        raise ValueError("Not an array job manifest.")
+    return manifest
+
+
+def materializeTask(manifest, task_index, xmlfile):
+    """
+    Write the XML setup of a single array job task.
+
+    The output is the same as the XML file of the task's run in a normal 
+    split.
+
+    Parameters
+    ----------
+
+    manifest : dict
+       Manifest as returned by loadArrayManifest.
+
+    task_index : int
+       Task number, in the range [0, manifest["tasks"]).
+
+    xmlfile : file pointer
+       File opened for writing.
+
+    """
+    if task_index < 0 or task_index >= manifest["tasks"]:
+        raise IndexError("Task index {0} out of range [0, {1})."\
+                             .format(task_index, manifest["tasks"]))
+    space = CombinationSpace(manifest["value_sets"])
+    experiment = minidom.parseString(manifest["skeleton"]).documentElement
+    writer = ExperimentWriter(experiment, manifest["value_sets"])
+    combination = task_index // manifest["clones"]
+    if "selection" in manifest:
+        combination = manifest["selection"][combination]
+    writer.write(xmlfile,
+                 space.indices(combination),
+                 manifest["repetitions"])
+
+
+class ScriptTemplate(object):
+    """
+    A script template compiled for repeated rendering.
+
+    The template is parsed once, when the object is created. Keys are 
+    validated at that point and a warning is printed once for each 
+    unsupported key. The template is stored as a list of literal text and 
+    field segments, so rendering a script only formats the fields and joins 
+    the segments.
+
+    Besides the keys given, the template may refer to the value of a varying
+    variable of the run through {param:variable_name}.
+
+    Parameters
+    ----------
+
+    template : str
+       The script template string. Keys are written as in str.format, 
+       optionally with conversion and format specification.
+
+    keys : iterable
+       Names of the supported keys.
+
+    parameters : iterable, optional
+       Names of the variables that may be used with {param:...}. If None, 
+       parameter fields are not checked when compiling.
+
+    """
+
+    # Field name used for parameter values.
+    PARAMETER_FIELD = "param"
+
+    def __init__(self, template, keys, parameters = None):
+        self.template = template
+        self.keys = set(keys)
+        self.segments = []
+        literal = []
+        for lt, fn, fs, co in Formatter().parse(template):
+            literal.append(lt)
+            if fn == None:
+                continue
+            if fn == self.PARAMETER_FIELD and fn not in self.keys:
+                if parameters == None or fs in parameters:
+                    self._addLiteral(literal)
+                    self.segments.append((True, fs, None, ""))
+                    continue
+                print("Warning: Unknown parameter '{0}' in key '{{{1}:{0}}}' in script template. Ignoring."\
+                          .format(fs, fn))
+            elif fn in self.keys:
+                self._addLiteral(literal)
+                self.segments.append((False, fn, co, fs))
+                continue
+            else:
+                print("Warning: Unsupported key '{{{0}}}' in script template. Ignoring."\
+                          .format(fn))
+            # Ignored fields are kept as written.
+            literal.append("{" + fn
+                           + ("!" + co if co != None else "")
+                           + (":" + fs if fs else "")
+                           + "}")
+        self._addLiteral(literal)
+
+    def _addLiteral(self, literal):
+        text = "".join(literal)
+        if len(text) > 0:
+            self.segments.append(text)
+        del literal[:]
+
+    def render(self, formatmap, parameters = None):
+        """
+        Render the template.
+
+        Parameters
+        ----------
+
+        formatmap : dict
+           Values of the keys.
+
+        parameters : dict, optional
+           Values of the variables, used for {param:...} fields.
+
+        Returns
+        -------
+
+        script : str
+           The rendered script.
+
+        """
+        parts = []
+        for segment in self.segments:
+            if segment.__class__ is str:
+                parts.append(segment)
+                continue
+            is_parameter, key, conversion, spec = segment
+            if is_parameter:
+                if parameters != None and key in parameters:
+                    parts.append(str(parameters[key]))
+                else:
+                    parts.append("{" + self.PARAMETER_FIELD + ":" + key + "}")
+                continue
+            value = formatmap[key]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+            parts.append(format(value, spec))
+        return "".join(parts)
+
+
+# Keys always available in script templates.
+SCRIPT_KEYS = ("job", "combination", "experiment", "csv", "setup", "model", "csvfname", "csvfpath")
+
+@functools.lru_cache(maxsize = 64)
+def _compiledTemplate(script_template, keys, parameters):
+    # Template compiled by createScriptFile, see ScriptTemplate. Bounded,
+    # as a long batch may use many templates.
+    return ScriptTemplate(script_template, keys, parameters)
+
+def createScriptFile(script_fp,
+                     xmlfile, 
+                     nlogofile,
+                     experiment,
+                     combination_nr,
+                     script_template,
+                     csv_output_dir = "./",
+                     extra_keys = None,
+                     parameters = None
+                     ):
+    """
+    Create a script file from a template string.
+
+    Parameters
+    ----------
+
+    script_fp : file pointer
+       File opened for writing.    
+
+    xmlfile : string
+       File name and path of the xml experiment file.
+       This string will be accessible through the key {setup}
+       in the script_template string.
+
+    nlogofile : string
+       File name and path of the ,nlogo model file.
+       This string will be accessible through the key {model}
+       in the script_template string.
+
+    experiment : string
+       Name of the experiment.
+       This string will be accessible through the key {experiment}
+       in the script_template string.
+
+    combination_nr : int
+       The experiment combination number.
+       This value will be accessible through the key {combination}
+       in the script_template string.
+
+    script_template : str or ScriptTemplate
+       The script template string, or a compiled template. A string is 
+       compiled on first use and the compiled template is reused by later 
+       calls. This string will be cloned for each script
+       but the following keys can be used and will have individual values.
+       {job} - Name of the job. Will be the name of the xml-file (minus extension).
+       {combination} - The value of the parameter combination_nr.
+       {experiment} - The value of the parameter experiment.
+       {csv} - File name, including full path, of a experiment-unique csv-file.
+       {setup} - The value of the parameter csvfile.
+       {model} - The value of the parameter nlogofile.
+       {csvfname} - Only the file name part of the {csv} key.
+       {csvfpath} - Only the path part of the {csv} key.
+       {param:name} - The value of variable name in parameters.
+       
+    csv_output_dir : str, optional
+       Path to the directory used when constructing the {csv} and {csvfpath} 
+       keys.
+
+    extra_keys : dict, optional
+       Additional keys and values made available to the script_template 
+       string, for instance {task_index} in array job scripts.
+
+    parameters : dict, optional
+       Values of the varying variables of the run, made available through 
+       {param:variable_name} keys.
+
+
+    Returns
+    -------
+
+    file_name : str
+       Name of the file name used for the script.
+
+    """
+    script_fp.write(renderScript(xmlfile,
+                                 nlogofile,
+                                 experiment,
+                                 combination_nr,
+                                 script_template,
+                                 csv_output_dir = csv_output_dir,
+                                 extra_keys = extra_keys,
+                                 parameters = parameters))
+
+
+def renderScript(xmlfile,
+                 nlogofile,
+                 experiment,
+                 combination_nr,
+                 script_template,
+                 csv_output_dir = "./",
+                 extra_keys = None,
+                 parameters = None
+                 ):
+    """
+    Render a script from a template string.
+
+    Takes the same parameters as createScriptFile, except for the file 
+    pointer, and returns the script instead of writing it.
+
+    Returns
+    -------
+
+    script : str
+       The rendered script.
+
+    """
+    jobname = os.path.splitext(os.path.basename(xmlfile))[0]
+
+
+    fname = jobname + ".csv"
+    csvfile = os.path.join(csv_output_dir, fname)
+
+    formatmap = {
+        "job" : jobname, 
+        "combination" : combination_nr, 
+        "experiment" : experiment,
+        "csv" : csvfile,
+        "setup" : xmlfile,
+        "model" : nlogofile,
+        "csvfname" : fname,
+        "csvfpath" : csv_output_dir
+        }
+    if extra_keys != None:
+        formatmap.update(extra_keys)
+    if not isinstance(script_template, ScriptTemplate):
+        # Compile and check the template only once.
+        script_template = _compiledTemplate(script_template,
+                                            tuple(sorted(formatmap.keys())),
+                                            tuple(sorted(parameters.keys())) \
+                                                if parameters != None else None)
+
+    return script_template.render(formatmap, parameters)
+
+                          
+class FileSink(object):
+    """
+    Output sink writing each file to the file system.
+
+    Sinks receive the files generated for the runs. All sinks have the 
+    methods write and close, and count the files and bytes written.
+    """
+
+    def __init__(self):
+        self.files_written = 0
+        self.bytes_written = 0
+
+    def write(self, file_name, contents):
+        """
+        Write a file.
+
+        Parameters
+        ----------
+
+        file_name : str
+           Path of the file.
+
+        contents : str
+           Contents of the file.
+
+        """
+        with open(file_name, 'w') as fp:
+            fp.write(contents)
+            # The size in bytes, which differs from the number of
+            # characters for non-ASCII values.
+            self.bytes_written += fp.tell()
+        self.files_written += 1
+
+    def close(self):
+        pass
+
+
+class CollectSink(FileSink):
+    """
+    Output sink keeping the files in memory. Used by worker processes to 
+    send files back to the sink of the main process.
+    """
+
+    def __init__(self):
+        FileSink.__init__(self)
+        self.files = []
+
+    def write(self, file_name, contents):
+        self.files.append((file_name, contents))
+
+    def take(self):
+        """
+        Return and forget the files collected so far.
+        """
+        files, self.files = self.files, []
+        return files
+
+
+class ArchiveSink(FileSink):
+    """
+    Base of output sinks writing all files into a single archive.
+
+    Members are named by their path relative to base_dir, or by their base 
+    name if they are not below base_dir.
+
+    Parameters
+    ----------
+
+    archive_name : str
+       File name of the archive.
+
+    base_dir : str
+       Directory that member names are relative to.
+
+    """
+
+    def __init__(self, archive_name, base_dir):
+        FileSink.__init__(self)
+        self.archive_name = archive_name
+        self.base_dir = base_dir
+
+    def memberName(self, file_name):
+        name = os.path.relpath(file_name, self.base_dir)
+        if name.startswith(os.pardir):
+            name = os.path.basename(file_name)
+        return name.replace(os.sep, "/")
+
+    def write(self, file_name, contents):
+        data = contents.encode("utf-8")
+        self.writeMember(self.memberName(file_name), data)
+        self.files_written += 1
+        self.bytes_written += len(data)
+
+
+class TarSink(ArchiveSink):
+    """
+    Output sink writing a tar archive, optionally compressed.
+
+    Parameters
+    ----------
+
+    compression : str, optional
+       "" for no compression, or "gz", "bz2" or "xz".
+
+    """
+
+    def __init__(self, archive_name, base_dir, compression = ""):
+        ArchiveSink.__init__(self, archive_name, base_dir)
+        self.tar = tarfile.open(archive_name, "w:" + compression)
+        self.mtime = time.time()
+
+    def writeMember(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = self.mtime
+        info.mode = 0o644
+        self.tar.addfile(info, io.BytesIO(data))
+
+    def close(self):
+        self.tar.close()
+
+
+class ZipSink(ArchiveSink):
+    """
+    Output sink writing a deflate compressed zip archive.
+    """
+
+    def __init__(self, archive_name, base_dir):
+        ArchiveSink.__init__(self, archive_name, base_dir)
+        self.zip = zipfile.ZipFile(archive_name, "w", zipfile.ZIP_DEFLATED, allowZip64 = True)
+
+    def writeMember(self, name, data):
+        self.zip.writestr(name, data)
+
+    def close(self):
+        self.zip.close()
+
+
+class PackSink(ArchiveSink):
+    """
+    Output sink writing a pack file with an offset index.
+
+    A pack file starts with the 8 byte magic string PACK_MAGIC, followed by 
+    the members' contents back to back. After the members follow the member 
+    names, UTF-8 encoded and separated by newlines, and then the index: two
+    little endian unsigned 64 bit integers per member giving its offset and 
+    size. The file ends with a 32 byte trailer holding the offset of the 
+    names, the offset of the index and the number of members (all little 
+    endian unsigned 64 bit), and the magic string again. Member N can 
+    therefore be read with three small reads, see readPackMember.
+    """
+
+    def __init__(self, archive_name, base_dir):
+        ArchiveSink.__init__(self, archive_name, base_dir)
+        self.fp = open(archive_name, 'wb')
+        self.fp.write(PACK_MAGIC)
+        self.offset = len(PACK_MAGIC)
+        self.names = []
+        self.index = array.array("Q")
+
+    def writeMember(self, name, data):
+        self.fp.write(data)
+        self.names.append(name)
+        self.index.extend((self.offset, len(data)))
+        self.offset += len(data)
+
+    def close(self):
+        names_offset = self.offset
+        names = "\n".join(self.names).encode("utf-8")
+        self.fp.write(names)
+        index_offset = names_offset + len(names)
+        if sys.byteorder != "little":
+            self.index.byteswap()
+        self.index.tofile(self.fp)
+        self.fp.write(struct.pack(PACK_TRAILER, names_offset, index_offset, 
+                                  len(self.names), PACK_MAGIC))
+        self.fp.close()
+
+
+PACK_MAGIC = b"SNEPACK1"
+
+PACK_TRAILER = "<QQQ8s"
+
+def _readPackTrailer(fp):
+    fp.seek(-struct.calcsize(PACK_TRAILER), os.SEEK_END)
+    names_offset, index_offset, count, magic = \
+        struct.unpack(PACK_TRAILER, fp.read(struct.calcsize(PACK_TRAILER)))
+    if magic != PACK_MAGIC:
+        raise ValueError("Not a pack file.")
+    return names_offset, index_offset, count
+
+
+def packMemberNames(pack_fp):
+    """
+    Names of the members of a pack file, in order.
+
+    Parameters
+    ----------
+
+    pack_fp : file pointer
+       Pack file opened for binary reading.
+
+    Returns
+    -------
+
+    names : list
+       Member names.
+
+    """
+    names_offset, index_offset, count = _readPackTrailer(pack_fp)
+    if count < 1:
+        return []
+    pack_fp.seek(names_offset)
+    return pack_fp.read(index_offset - names_offset).decode("utf-8").split("\n")
+
+
+def readPackMember(pack_fp, member):
+    """
+    Read a single member of a pack file.
+
+    Parameters
+    ----------
+
+    pack_fp : file pointer
+       Pack file opened for binary reading.
+
+    member : int or str
+       Number of the member, counting from 0 in the order they were 
+       written, or its name. Reading by number does not read the names.
+
+    Returns
+    -------
+
+    data : bytes
+       Contents of the member.
+
+    """
+    names_offset, index_offset, count = _readPackTrailer(pack_fp)
+    if not isinstance(member, int):
+        try:
+            member = packMemberNames(pack_fp).index(member)
+        except ValueError:
+            raise KeyError("No member named '{0}'.".format(member))
+    if member < 0 or member >= count:
+        raise IndexError("Member number {0} out of range [0, {1})."\
+                             .format(member, count))
+    pack_fp.seek(index_offset + 16 * member)
+    offset, size = struct.unpack("<QQ", pack_fp.read(16))
+    pack_fp.seek(offset)
+    return pack_fp.read(size)
+
+
+def openArchiveSink(archive_name, base_dir):
+    """
+    Open an archive output sink, choosing the format from the file name.
+
+    Parameters
+    ----------
+
+    archive_name : str
+       File name ending in .tar, .tar.gz, .tgz, .tar.bz2, .tar.xz, .zip or 
+       .pack.
+
+    base_dir : str
+       Directory that member names are relative to.
+
+    Returns
+    -------
+
+    sink : ArchiveSink
+       The opened sink.
+
+    """
+    lower = archive_name.lower()
+    if lower.endswith(".zip"):
+        return ZipSink(archive_name, base_dir)
+    if lower.endswith(".pack"):
+        return PackSink(archive_name, base_dir)
+    for ending, compression in ((".tar", ""),
+                                (".tar.gz", "gz"), 
+                                (".tgz", "gz"),
+                                (".tar.bz2", "bz2"),
+                                (".tar.xz", "xz")):
+        if lower.endswith(ending):
+            return TarSink(archive_name, base_dir, compression)
+    raise ValueError("Unknown archive format of '{0}'.".format(archive_name))
+
+
+def extractArchiveMember(archive_name, member):
+    """
+    Read a single member of an archive written by an archive sink.
+
+    Pack files are read with random access. Tar and zip archives are read 
+    through their own indices, a tar archive is scanned up to the member.
+
+    Parameters
+    ----------
+
+    archive_name : str
+       File name of the archive.
+
+    member : int or str
+       Number of the member, counting from 0, or its name.
+
+    Returns
+    -------
+
+    data : bytes
+       Contents of the member.
+
+    """
+    lower = archive_name.lower()
+    if lower.endswith(".pack"):
+        with open(archive_name, 'rb') as pack_fp:
+            return readPackMember(pack_fp, member)
+    if lower.endswith(".zip"):
+        with zipfile.ZipFile(archive_name) as zfp:
+            if isinstance(member, int):
+                member = zfp.infolist()[member]
+            return zfp.read(member)
+    with tarfile.open(archive_name) as tfp:
+        if isinstance(member, int):
+            for number, info in enumerate(tfp):
+                if number == member:
+                    break
+            else:
+                raise IndexError("Member number {0} out of range.".format(member))
+        else:
+            info = tfp.getmember(member)
+        return tfp.extractfile(info).read()
+
+
+class RunTableWriter(object):
+    """
+    Streaming writer of a csv run table.
+
+    Rows are written as runs are emitted through a large write buffer, so 
+    the table never has to be held in memory. The first column is the run 
+    number, followed by one column per varying variable, and any extra 
+    columns.
+
+    Parameters
+    ----------
+
+    file_name : str
+       Name of the csv file.
+
+    space : CombinationSpace
+       Combination space of the experiment.
+
+    buffer_size : int, optional
+       Size of the file write buffer in bytes.
+
+    extra_columns : list, optional
+       Names of extra columns, such as the pack number of each run.
+
+    """
+
+    ENR_STR = "Experiment number"
+
+    def __init__(self, file_name, space, buffer_size = 1 << 20, extra_columns = ()):
+        self.file_names = [file_name]
+        self.space = space
+        self.fp = open(file_name, 'w', buffer_size, newline = '')
+        self.csv_writer = csv.writer(self.fp)
+        self.csv_writer.writerow([self.ENR_STR] + space.names + list(extra_columns))
+
+    def writeRun(self, enum, indices, extra = ()):
+        """
+        Add the row of a run.
+
+        Parameters
+        ----------
+
+        enum : int
+           Run number.
+
+        indices : list
+           Value indices of the run's combination.
+
+        extra : sequence, optional
+           Values of the extra columns.
+
+        """
+        self.csv_writer.writerow([enum] 
+                                 + [values[i] for values, i in zip(self.space.values, indices)]
+                                 + list(extra))
+
+    def close(self):
+        self.fp.close()
+
+
+class BinaryRunTableWriter(object):
+    """
+    Streaming writer of a compact binary run table.
+
+    The table is stored in two files. The .bin file holds one row per run 
+    of little endian unsigned integers, one per varying variable, giving the
+    index of the run's value in the variable's value list, followed by the 
+    values of any extra columns. The row of run number enum is row 
+    enum - first_run, unless the runs are not consecutive, in which case the
+    run number of each row is stored in a first column named "Run". The
+    .json file holds the variable names, their values,
+    and the numpy compatible dtype and shape of the table, so that it can be
+    memory mapped, for instance by
+
+       numpy.memmap(bin_file, dtype = meta["dtype"], mode = "r", 
+                    shape = (meta["runs"], meta["columns"]))
+
+    Parameters
+    ----------
+
+    file_base : str
+       File name without extension. '.bin' and '.json' are appended.
+
+    space : CombinationSpace
+       Combination space of the experiment.
+
+    first_run : int, optional
+       Run number of the first row.
+
+    clones : int, optional
+       Number of runs per combination, recorded in the dictionary file.
+
+    buffer_rows : int, optional
+       Number of rows collected before each write.
+
+    extra_columns : list, optional
+       Names of extra integer columns, such as the pack number of each run.
+
+    max_extra : int, optional
+       Largest value of the extra columns.
+
+    max_run : int, optional
+       Largest run number. If given, the runs need not be consecutive and 
+       the run number of each row is stored in the "Run" column.
+
+    """
+
+    FORMAT = "split_nlogo_experiment binary run table"
+
+    def __init__(self, file_base, space, first_run = 0, clones = 1, buffer_rows = 65536,
+                 extra_columns = (), max_extra = 0, max_run = None):
+        self.file_names = [file_base + ".bin", file_base + ".json"]
+        self.space = space
+        self.first_run = first_run
+        self.next_run = first_run
+        self.num_rows = 0
+        self.run_column = max_run != None
+        self.clones = clones
+        self.buffer_rows = buffer_rows
+        self.extra_columns = list(extra_columns)
+        self.columns = len(space.names) + len(self.extra_columns)
+        max_size = max(space.sizes + [max_extra + 1])
+        if self.run_column:
+            self.columns += 1
+            max_size = max(max_size, max_run + 1)
+        # Smallest integer type that can hold all value indices.
+        for typecode in "BHIL":
+            if max_size <= 1 << (8 * array.array(typecode).itemsize):
+                break
+        self.typecode = typecode
+        self.dtype = "<u{0}".format(array.array(typecode).itemsize)
+        self.rows = array.array(typecode)
+        self.fp = open(self.file_names[0], 'wb')
+
+    def writeRun(self, enum, indices, extra = ()):
+        """
+        Add the row of a run. Runs must be added in order.
+
+        Parameters
+        ----------
+
+        enum : int
+           Run number.
+
+        indices : list
+           Value indices of the run's combination.
+
+        extra : sequence, optional
+           Values of the extra columns.
+
+        """
+        if enum != self.next_run and not (self.run_column and enum > self.next_run):
+            raise ValueError("Binary run table rows must be written in run order.")
+        self.next_run = enum + 1
+        self.num_rows += 1
+        if self.run_column:
+            self.rows.append(enum)
+        self.rows.extend(indices)
+        self.rows.extend(extra)
+        if len(self.rows) >= self.buffer_rows * max(1, self.columns):
+            self._flush()
+
+    def _flush(self):
+        if sys.byteorder != "little":
+            self.rows.byteswap()
+        self.rows.tofile(self.fp)
+        self.rows = array.array(self.typecode)
+
+    def close(self):
+        self._flush()
+        self.fp.close()
+        with open(self.file_names[1], 'w') as meta_fp:
+            json.dump({"format" : self.FORMAT,
+                       "version" : 1,
+                       "dtype" : self.dtype,
+                       "variables" : self.space.names,
+                       "values" : self.space.values,
+                       "extra_columns" : self.extra_columns,
+                       "run_column" : self.run_column,
+                       "columns" : self.columns,
+                       "first_run" : self.first_run,
+                       "runs" : self.num_rows,
+                       "clones" : self.clones},
+                      meta_fp)
+            meta_fp.write("\n")
+
+
+class RunEmitter(object):
+    """
+    Writes the xml setup files, and optionally script files, of the runs of 
+    an experiment.
+
+    Runs are numbered as in the original main loop: run number enum belongs 
+    to combination enum // reps_of_experiment, and runs of the same 
+    combination are consecutive. Any range of runs can therefore be written 
+    independently, which is what the parallel and sharded modes rely on. An 
+    emitter can be pickled and sent to worker processes.
+
+    If only a selection of the combinations is split (see 
+    sampleCombinations), the runs keep the numbers they have in a complete 
+    split, and ranges of runs are given as positions in the sequence of 
+    selected runs instead of as run numbers (see runNumber).
+
+    Parameters
+    ----------
+
+    experiment : xml node
+       Experiment node with the varying value sets removed.
+
+    value_tuples : list
+       List of tuples on the form (variable_name, [value_0, ... , value_N]).
+
+    reps_in_experiment : int
+       Number of repetitions in each run.
+
+    reps_of_experiment : int
+       Number of runs (repetition clones) per combination.
+
+    output_dir : str
+       Directory of the xml setup files.
+
+    output_prefix : str
+       Prefix of all file names.
+
+    nlogo_file : str, optional
+       Path of the model file, used in scripts.
+
+    script_template : str, optional
+       Script template string. If None no scripts are written. The template
+       is compiled once, and may use the key {clone}, the index of the run 
+       among the runs of its combination, and {param:variable_name}.
+
+    script_extension : str, optional
+       File name extension of the script files.
+
+    script_output_dir : str, optional
+       Directory of the script files. Default is output_dir.
+
+    csv_output_dir : str, optional
+       Directory used for the {csv} key in scripts. Default is output_dir.
+
+    dom_writer : bool, optional
+       If True build and write a DOM node per run, as saveExperimentToXMLFile
+       does, instead of using the faster ExperimentWriter. The output is the 
+       same.
+
+    packed : bool, optional
+       If True the runs will be written in packs, see renderPack, and the 
+       script template is compiled for packs.
+
+    selection : sequence, optional
+       Increasing combination numbers of the combinations to split. Default
+       is all combinations.
+
+    """
+
+    def __init__(self,
+                 experiment,
+                 value_tuples,
+                 reps_in_experiment,
+                 reps_of_experiment,
+                 output_dir,
+                 output_prefix,
+                 nlogo_file = None,
+                 script_template = None,
+                 script_extension = "",
+                 script_output_dir = None,
+                 csv_output_dir = None,
+                 dom_writer = False,
+                 packed = False,
+                 selection = None):
+        self.experiment = experiment
+        self.value_tuples = value_tuples
+        self.space = CombinationSpace(value_tuples)
+        self.reps_in_experiment = reps_in_experiment
+        self.reps_of_experiment = reps_of_experiment
+        self.num_individual_runs = len(self.space)
+        self.selection = selection
+        if selection != None:
+            self.num_runs = len(selection) * reps_of_experiment
+        else:
+            self.num_runs = self.num_individual_runs * reps_of_experiment
+        self.experiment_name = experimentFileName(experiment.getAttribute("name"))
+        self.output_dir = output_dir
+        self.output_prefix = output_prefix
+        self.nlogo_file = nlogo_file
+        self.packed = packed
+        if script_template != None and packed:
+            script_template = ScriptTemplate(script_template,
+                                             SCRIPT_KEYS + ("pack", "runs"),
+                                             [])
+        elif script_template != None:
+            script_template = ScriptTemplate(script_template,
+                                             SCRIPT_KEYS + ("clone",),
+                                             self.space.names)
+        self.script_template = script_template
+        self.script_extension = script_extension
+        self.script_output_dir = script_output_dir if script_output_dir != None else output_dir
+        self.csv_output_dir = csv_output_dir if csv_output_dir != None else output_dir
+        self.dom_writer = dom_writer
+        self.writer = ExperimentWriter(experiment, value_tuples)
+        # Steps of the time limit, the same for all runs.
+        self.time_limit = None
+        for time_limit in experiment.getElementsByTagName("timeLimit"):
+            try:
+                self.time_limit = int(float(time_limit.getAttribute("steps")))
+                break
+            except ValueError:
+                pass
+        # Sink receiving the files of the runs.
+        self.sink = FileSink()
+        # Content hashes of files from an earlier split, by file name.
+        # Set to track the written files and skip unchanged ones.
+        self.previous_files = None
+        # Cache of run outputs, and the hash of the model code. Set both
+        # to take runs from the cache instead of writing them.
+        self.result_cache = None
+        self.model_hash = None
+        # Timings of writing the runs. Set to a SplitStats to time them.
+        self.stats = None
+
+    def __getstate__(self):
+        # DOM nodes do not pickle well, send the XML instead.
+        state = self.__dict__.copy()
+        state["experiment"] = self.experiment.toxml()
+        if isinstance(self.sink, ArchiveSink):
+            # Only the main process can write to the archive.
+            state["sink"] = CollectSink()
+        else:
+            state["sink"] = FileSink()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.experiment = minidom.parseString(state["experiment"]).documentElement
+
+    def runNumberString(self, enum):
+        """
+        Zero padded run number used in file names.
+        """
+        return str(enum).zfill(len(str(self.num_individual_runs)))
+
+    def xmlFileName(self, enum):
+        """
+        Path of the xml setup file of run enum.
+        """
+        return os.path.join(self.output_dir, 
+                            self.output_prefix + self.experiment_name
+                            + self.runNumberString(enum)
+                            + '.xml')
+
+    def scriptFileName(self, enum):
+        """
+        Path of the script file of run enum.
+        """
+        return os.path.join(self.script_output_dir, 
+                            self.output_prefix 
+                            + self.experiment_name
+                            +"_script"
+                            + self.runNumberString(enum)
+                            + self.script_extension)
+
+    def runNumber(self, pos):
+        """
+        Run number of the run at position pos in the sequence of runs. The 
+        same as pos unless a selection of the combinations is split.
+        """
+        if self.selection == None:
+            return pos
+        clones = self.reps_of_experiment
+        return self.selection[pos // clones] * clones + pos % clones
+
+    def runs(self, start = 0, stop = None):
+        """
+        Generator giving the runs numbered start up to (excluding) stop, or,
+        if a selection of the combinations is split, the runs at positions 
+        start up to stop in the sequence of selected runs.
+
+        Yields
+        ------
+
+           : Tuple (enum, indices) where indices is the list of value indices
+           of the run's combination. The list is reused between yields.
+
+        """
+        if stop is None or stop > self.num_runs:
+            stop = self.num_runs
+        clones = self.reps_of_experiment
+        if self.selection != None:
+            for pos in range(start, stop):
+                enum = self.runNumber(pos)
+                if pos == start or pos % clones == 0:
+                    indices = self.space.indices(enum // clones)
+                yield enum, indices
+            return
+        enum = start
+        for indices in self.space.iterateIndices(start // clones, 
+                                                 (stop + clones - 1) // clones):
+            for exp_clone in range(enum % clones, clones):
+                if enum >= stop:
+                    return
+                yield enum, indices
+                enum += 1
+
+    def csvFileName(self, enum):
+        """
+        Path of the BehaviorSpace table output of run enum, as given by the 
+        {csv} key in scripts.
+        """
+        return os.path.join(self.csv_output_dir, self.jobName(enum) + ".csv")
+
+    def jobName(self, enum):
+        """
+        Name of the job of run enum, the xml setup file name without 
+        directory and extension.
+        """
+        return self.output_prefix + self.experiment_name + self.runNumberString(enum)
+
+    def packFileName(self, pack, num_packs):
+        """
+        Path of the xml setup file of pack number pack out of num_packs.
+        """
+        return os.path.join(self.output_dir, 
+                            self.output_prefix + self.experiment_name
+                            + "_pack" + str(pack).zfill(len(str(num_packs)))
+                            + '.xml')
+
+    def packScriptFileName(self, pack, num_packs):
+        """
+        Path of the script file of pack number pack out of num_packs.
+        """
+        return os.path.join(self.script_output_dir, 
+                            self.output_prefix + self.experiment_name
+                            + "_pack_script" + str(pack).zfill(len(str(num_packs)))
+                            + self.script_extension)
+
+    def timeLimit(self):
+        """
+        Number of steps in the timeLimit of the experiment, or None if the 
+        experiment has no time limit.
+        """
+        return self.time_limit
+
+    def runCost(self, indices, cost_hints = ()):
+        """
+        Estimated cost of a run.
+
+        The cost is the number of repetitions of the run times the number of 
+        steps in the time limit (1 if there is no time limit) times the value
+        of each hinted variable raised to its exponent.
+
+        Parameters
+        ----------
+
+        indices : list
+           Value indices of the run's combination.
+
+        cost_hints : list, optional
+           List of (variable_name, exponent) tuples. Variables that do not 
+           vary in the experiment are ignored.
+
+        Returns
+        -------
+
+        cost : float
+           The estimated cost.
+
+        """
+        cost = float(self.reps_in_experiment * (self.time_limit if self.time_limit else 1))
+        for name, exponent in cost_hints:
+            if name in self.space.names:
+                pos = self.space.names.index(name)
+                cost *= abs(float(self.space.values[pos][indices[pos]])) ** exponent
+        return cost
+
+    def renderPack(self, pack, num_packs, runs):
+        """
+        The files of a pack of runs.
+
+        All runs of the pack are put in the same setup file, each as an 
+        experiment named by the run's job name (see jobName). The script of 
+        the pack may use the keys {pack}, the pack number, and {runs}, the 
+        space separated names of the experiments in the setup file, in 
+        addition to the usual keys. {combination} is the pack number.
+
+        Parameters
+        ----------
+
+        pack : int
+           Pack number.
+
+        num_packs : int
+           Number of packs.
+
+        runs : list
+           List of (enum, indices) tuples of the runs in the pack.
+
+        Returns
+        -------
+
+        files : list
+           List of (file_name, contents) tuples.
+
+        """
+        xml_filename = self.packFileName(pack, num_packs)
+        parts = [ExperimentWriter.HEADER]
+        for enum, indices in runs:
+            if self.dom_writer:
+                experiment_instance = experimentInstance(self.experiment,
+                                                         self.space.combinationOfIndices(indices),
+                                                         self.reps_in_experiment,
+                                                         self.experiment.ownerDocument)
+                experiment_instance.setAttribute("name", self.jobName(enum))
+                parts.append(experiment_instance.toxml())
+            else:
+                parts.append(self.writer.renderExperiment(indices, 
+                                                          self.reps_in_experiment,
+                                                          self.jobName(enum)))
+        parts.append(ExperimentWriter.FOOTER)
+        files = [(xml_filename, "".join(parts))]
+
+        if self.script_template != None:
+            files.append((self.packScriptFileName(pack, num_packs),
+                          renderScript(
+                        xml_filename, 
+                        self.nlogo_file, 
+                        self.experiment.getAttribute("name"),
+                        pack,
+                        self.script_template,
+                        csv_output_dir = self.csv_output_dir,
+                        extra_keys = {"pack" : pack,
+                                      "runs" : " ".join([self.jobName(enum) for enum, indices in runs])}
+                        )))
+        return files
+
+    def emitPack(self, pack, num_packs, runs):
+        """
+        Write the files of a pack of runs. See renderPack.
+        """
+        if self.stats != None:
+            started = time.time()
+        files = self.renderPack(pack, num_packs, runs)
+        if self.stats != None:
+            self.stats.add("serialize", time.time() - started)
+            started = time.time()
+        for file_name, contents in files:
+            self.sink.write(file_name, contents)
+        if self.stats != None:
+            self.stats.add("write", time.time() - started)
+
+    def runKey(self, enum, indices):
+        """
+        Key identifying a run by its variable values and clone index, 
+        independently of the run number.
+        """
+        return json.dumps([[name, str(value)] for name, value \
+                               in self.space.combinationOfIndices(indices)]
+                          + [enum % self.reps_of_experiment])
+
+    def settingsHash(self):
+        """
+        Hash of everything that decides the files of the runs.
+
+        Two emitters with the same settings hash write the same files for 
+        the same run number.
+        """
+        return hashlib.sha1(json.dumps([self.experiment.toxml(),
+                                        self.value_tuples,
+                                        self.reps_in_experiment,
+                                        self.reps_of_experiment,
+                                        self.output_dir,
+                                        self.output_prefix,
+                                        self.nlogo_file,
+                                        self.script_template.template \
+                                            if self.script_template != None else None,
+                                        self.script_extension,
+                                        self.script_output_dir,
+                                        self.csv_output_dir],
+                                       default = str).encode("utf-8")).hexdigest()
+
+    def fingerprint(self, enum, indices):
+        """
+        Fingerprint of a run, identifying its results.
+
+        The fingerprint is a hash of the model code (model_hash), the 
+        experiment of the run, with its parameter values and repetitions but
+        not its name, and the index of the run among the runs of its 
+        combination. Runs with the same fingerprint in different splits 
+        give the same kind of results.
+        """
+        return hashlib.sha1("\n".join([self.model_hash,
+                                       str(enum % self.reps_of_experiment),
+                                       self.writer.renderExperiment(indices, 
+                                                                    self.reps_in_experiment,
+                                                                    name = "")])\
+                                .encode("utf-8")).hexdigest()
+
+    def fromCache(self, enum, indices):
+        """
+        Put the output of a run in place from the result cache, if it is 
+        there. Returns True if it was.
+        """
+        if self.result_cache == None:
+            return False
+        return self.result_cache.place(self.fingerprint(enum, indices), 
+                                       self.csvFileName(enum))
+
+    def render(self, enum, indices):
+        """
+        The files of a single run.
+
+        Parameters
+        ----------
+
+        enum : int
+           Run number.
+
+        indices : list
+           Value indices of the run's combination.
+
+        Returns
+        -------
+
+        files : list
+           List of (file_name, contents) tuples.
+
+        """
+        if self.stats != None:
+            started = time.time()
+        xml_filename = self.xmlFileName(enum)
+        if self.dom_writer:
+            experiment_instance = experimentInstance(self.experiment,
+                                                     self.space.combinationOfIndices(indices),
+                                                     self.reps_in_experiment,
+                                                     self.experiment.ownerDocument)
+            xmlfile = io.StringIO()
+            saveExperimentToXMLFile(experiment_instance, xmlfile)
+            files = [(xml_filename, xmlfile.getvalue())]
+        else:
+            files = [(xml_filename, self.writer.render(indices, self.reps_in_experiment))]
+        if self.stats != None:
+            self.stats.add("serialize", time.time() - started)
+
+        # Should a script file be created?
+        if self.script_template != None:
+            if self.stats != None:
+                started = time.time()
+            files.append((self.scriptFileName(enum),
+                          renderScript(
+                        xml_filename, 
+                        self.nlogo_file, 
+                        self.experiment.getAttribute("name"),
+                        enum,
+                        self.script_template,
+                        csv_output_dir = self.csv_output_dir,
+                        extra_keys = {"clone" : enum % self.reps_of_experiment},
+                        parameters = dict(self.space.combinationOfIndices(indices))
+                        )))
+            if self.stats != None:
+                self.stats.add("script", time.time() - started)
+        return files
+
+    def emit(self, enum, indices):
+        """
+        Write the files of a single run.
+
+        If previous_files is set, a file is only written if it does not 
+        exist or its content hash differs from the one recorded.
+
+        Parameters
+        ----------
+
+        enum : int
+           Run number.
+
+        indices : list
+           Value indices of the run's combination.
+
+        Returns
+        -------
+
+        record : dict or None
+           If previous_files is set, a record of the run for SplitState, 
+           otherwise None.
+
+        """
+        files = self.render(enum, indices)
+        if self.stats != None:
+            started = time.time()
+        if self.previous_files == None:
+            for file_name, contents in files:
+                self.sink.write(file_name, contents)
+            if self.stats != None:
+                self.stats.add("write", time.time() - started)
+            return None
+
+        hashes = {}
+        for file_name, contents in files:
+            digest = hashlib.sha1(contents.encode("utf-8")).hexdigest()
+            hashes[file_name] = digest
+            if self.previous_files.get(file_name) == digest \
+                    and os.path.exists(file_name):
+                continue
+            self.sink.write(file_name, contents)
+        if self.stats != None:
+            self.stats.add("write", time.time() - started)
+        return {"key" : self.runKey(enum, indices), 
+                "run" : enum,
+                "files" : hashes}
+
+    def emitRange(self, start = 0, stop = None, run_table = None, records = None):
+        """
+        Write the files of the runs numbered start up to (excluding) stop.
+
+        Runs found in the result cache, if one is set, are not written (see
+        fromCache), but are included in the run table.
+
+        Parameters
+        ----------
+
+        start : int, optional
+           First run number.
+
+        stop : int, optional
+           Run number to stop at. Default is the number of runs.
+
+        run_table : RunTableWriter or BinaryRunTableWriter, optional
+           If given, the row of each run is written to it once the run's 
+           files have been written.
+
+        records : list or SplitState, optional
+           If given, the record returned by emit is appended to it for each
+           run.
+
+        Returns
+        -------
+
+        num_emitted : int
+           Number of runs written.
+
+        """
+        num_emitted = 0
+        for enum, indices in self.runs(start, stop):
+            if self.fromCache(enum, indices):
+                if run_table != None:
+                    run_table.writeRun(enum, indices)
+                if records != None:
+                    records.append({"key" : self.runKey(enum, indices), 
+                                    "run" : enum,
+                                    "files" : {}})
+                continue
+            record = self.emit(enum, indices)
+            if run_table != None:
+                run_table.writeRun(enum, indices)
+            if records != None:
+                records.append(record)
+            num_emitted += 1
+        return num_emitted
+
+
+# Emitter of a worker process in parallel mode.
+_worker_emitter = None
+
+def _initEmitWorker(pickled_emitter):
+    # The emitter is pickled explicitly, as forked workers would otherwise
+    # inherit the emitter of the main process, sink included.
+    global _worker_emitter
+    _worker_emitter = pickle.loads(pickled_emitter)
+
+def _emitWorkerRange(run_range):
+    records = None
+    if _worker_emitter.previous_files != None:
+        records = []
+    stats = None
+    if _worker_emitter.stats != None:
+        # The timings of each chunk are sent back and added up.
+        stats = _worker_emitter.stats = SplitStats()
+    count = _worker_emitter.emitRange(*run_range, records = records)
+    files = None
+    if isinstance(_worker_emitter.sink, CollectSink):
+        files = _worker_emitter.sink.take()
+    elif stats != None:
+        stats.addSink(_worker_emitter.sink)
+        _worker_emitter.sink = FileSink()
+    return count, records, files, stats
+
+
+def emitRuns(emitter, start, stop, jobs = 1, run_table = None, state = None, chunk_size = None):
+    """
+    Write the files of a range of runs, optionally using a pool of worker 
+    processes.
+
+    With more than one job the runs are partitioned into chunks of 
+    consecutive run numbers which are handed out to the workers, so the files
+    are identical to those of emitter.emitRange(start, stop). The run table 
+    is written in run order by the calling process while the workers write 
+    the files.
+
+    Parameters
+    ----------
+
+    emitter : RunEmitter
+       Emitter of the experiment.
+
+    start : int
+       First run number.
+
+    stop : int
+       Run number to stop at (excluded).
+
+    jobs : int, optional
+       Number of worker processes. Default is 1, writing all files in the 
+       calling process.
+
+    run_table : RunTableWriter or BinaryRunTableWriter, optional
+       If given, the row of each run is written to it.
+
+    state : SplitState, optional
+       If given, runs already completed according to the state are skipped,
+       and a record of each written run is added to it. The emitter's 
+       previous_files should be set from the state.
+
+    chunk_size : int, optional
+       Number of runs handed to a worker at a time. By default the range is
+       split in about eight chunks per worker.
+
+    Returns
+    -------
+
+    num_emitted : int
+       Number of runs written.
+
+    """
+    if state != None:
+        ranges = state.remainingRanges(start, stop, emitter.runNumber)
+    else:
+        ranges = [(start, stop)]
+
+    if jobs <= 1:
+        if run_table != None and ranges != [(start, stop)]:
+            # Not all runs are emitted, write the run table separately.
+            for enum, indices in emitter.runs(start, stop):
+                run_table.writeRun(enum, indices)
+            run_table = None
+        num_emitted = 0
+        for rstart, rstop in ranges:
+            num_emitted += emitter.emitRange(rstart, rstop, 
+                                             run_table = run_table, 
+                                             records = state)
+        return num_emitted
+
+    if chunk_size == None:
+        chunk_size = max(1, min(4096, sum([rstop - rstart for rstart, rstop in ranges]) // (8 * jobs)))
+    chunks = [(cstart, min(rstop, cstart + chunk_size)) \
+                  for rstart, rstop in ranges \
+                  for cstart in range(rstart, rstop, chunk_size)]
+    pool = multiprocessing.Pool(jobs, _initEmitWorker, (pickle.dumps(emitter),))
+    try:
+        if isinstance(emitter.sink, ArchiveSink):
+            # Files are sent back to be written in run order.
+            results = pool.imap(_emitWorkerRange, chunks)
+        else:
+            results = pool.imap_unordered(_emitWorkerRange, chunks)
+        if run_table != None:
+            for enum, indices in emitter.runs(start, stop):
+                run_table.writeRun(enum, indices)
+        num_emitted = 0
+        for count, records, files, stats in results:
+            num_emitted += count
+            if stats != None:
+                emitter.stats.merge(stats)
+            if state != None:
+                for record in records:
+                    state.append(record)
+            if files != None:
+                if emitter.stats != None:
+                    started = time.time()
+                for file_name, contents in files:
+                    emitter.sink.write(file_name, contents)
+                if emitter.stats != None:
+                    emitter.stats.add("write", time.time() - started)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return num_emitted
+
+
+class SplitState(object):
+    """
+    Record of the files written by a split, used for incremental and 
+    resumable splitting.
+
+    The state is a JSON lines file. The first line holds the settings hash 
+    of the split and the range of runs, each following line a record of a 
+    run: its key (variable values and clone index), run number, and the 
+    content hash of each of its files. A final line marks the split as 
+    complete.
+
+    While a split is running the records are appended, and flushed 
+    regularly, to a file postfixed '.partial'. When the split is complete 
+    the partial file replaces the state file. If a partial file with the 
+    same settings and range is found when the state is opened the split is 
+    resumed: runs recorded in it are not emitted again.
+
+    Parameters
+    ----------
+
+    file_name : str
+       Name of the state file.
+
+    settings : str
+       Settings hash of the emitter, see RunEmitter.settingsHash.
+
+    start : int
+       First run number of the split.
+
+    stop : int
+       Run number to stop at (excluded).
+
+    flush_interval : int, optional
+       Number of records between each flush of the partial file.
+
+    """
+
+    FORMAT = "split_nlogo_experiment split state"
+
+    def __init__(self, file_name, settings, start, stop, flush_interval = 1000):
+        self.file_name = file_name
+        self.partial_name = file_name + ".partial"
+        self.flush_interval = flush_interval
+        self.header = {"format" : self.FORMAT,
+                       "version" : 1,
+                       "settings" : settings,
+                       "start" : start,
+                       "stop" : stop}
+        self.counts = {"added" : 0, "changed" : 0, "unchanged" : 0, "removed" : 0}
+        self.resumed = 0
+        self.seen = set()
+        self.since_flush = 0
+
+        # Files of the last complete split.
+        self.previous = {}
+        header, records, complete, size = self._load(self.file_name)
+        if header != None:
+            for record in records:
+                self.previous[record["key"]] = record["files"]
+        self.previous_files = {}
+        for files in self.previous.values():
+            self.previous_files.update(files)
+
+        # Runs of an interrupted split with the same settings.
+        self.done = set()
+        header, records, complete, size = self._load(self.partial_name)
+        if header == self.header and not complete:
+            # Cut off a line torn by the interruption, so that the records
+            # appended next are read back.
+            os.truncate(self.partial_name, size)
+            self.fp = open(self.partial_name, 'a')
+            for record in records:
+                self._count(record)
+                self.done.add(record["run"])
+            self.resumed = len(self.done)
+        else:
+            self.fp = open(self.partial_name, 'w')
+            self._writeLine(self.header)
+
+    def _load(self, file_name):
+        # Returns the header, the run records, whether the state is complete
+        # and the size in bytes of the complete lines read.
+        header, records, complete, size = None, [], False, 0
+        if not os.path.exists(file_name):
+            return header, records, complete, size
+        with open(file_name, 'rb') as fp:
+            for line in fp:
+                if not line.endswith(b"\n"):
+                    # The last line of an interrupted split.
+                    break
+                try:
+                    entry = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    break
+                size += len(line)
+                if header == None:
+                    if not isinstance(entry, dict) or entry.get("format") != self.FORMAT:
+                        sys.stderr.write("Warning: Ignoring '{0}', not a split state file.\n"\
+                                             .format(file_name))
+                        return None, [], False, 0
+                    header = entry
+                elif entry.get("complete") == True:
+                    complete = True
+                else:
+                    records.append(entry)
+        return header, records, complete, size
+
+    def _writeLine(self, entry):
+        self.fp.write(json.dumps(entry))
+        self.fp.write("\n")
+
+    def _count(self, record):
+        self.seen.add(record["key"])
+        previous = self.previous.get(record["key"])
+        if previous == None:
+            self.counts["added"] += 1
+        elif previous == record["files"]:
+            self.counts["unchanged"] += 1
+        else:
+            self.counts["changed"] += 1
+
+    def remainingRanges(self, start, stop, run_number = None):
+        """
+        Ranges of the runs in [start, stop) not completed by an interrupted
+        split.
+
+        Parameters
+        ----------
+
+        start, stop : int
+           Range of run positions, see RunEmitter.runs.
+
+        run_number : function, optional
+           Function giving the run number of a position, such as 
+           RunEmitter.runNumber. Default is the position itself.
+
+        Returns
+        -------
+
+        ranges : list
+           List of (start, stop) tuples.
+
+        """
+        if len(self.done) < 1:
+            return [(start, stop)]
+        ranges = []
+        rstart = None
+        for pos in range(start, stop):
+            enum = run_number(pos) if run_number != None else pos
+            if enum in self.done:
+                if rstart != None:
+                    ranges.append((rstart, pos))
+                    rstart = None
+            elif rstart == None:
+                rstart = pos
+        if rstart != None:
+            ranges.append((rstart, stop))
+        return ranges
+
+    def append(self, record):
+        """
+        Add the record of a written run.
+        """
+        self._count(record)
+        self._writeLine(record)
+        self.since_flush += 1
+        if self.since_flush >= self.flush_interval:
+            self.fp.flush()
+            self.since_flush = 0
+
+    def close(self):
+        """
+        Mark the split as complete and replace the state file.
+
+        Returns
+        -------
+
+        counts : dict
+           Number of runs added, changed, unchanged and removed compared to
+           the previous complete split.
+
+        """
+        self._writeLine({"complete" : True})
+        self.fp.close()
+        os.replace(self.partial_name, self.file_name)
+        self.counts["removed"] = len([key for key in self.previous if key not in self.seen])
+        return self.counts
+
+
+class ResultCache(object):
+    """
+    Directory of run outputs, keyed by the fingerprint of the run.
+
+    Outputs are stored as read-only copies, named by their fingerprint (see
+    RunEmitter.fingerprint), so the same run in a later split can use the
+    cached output instead of being run again. The last use of an output is
+    the modification time of an empty file next to it, with the extension
+    '.used', rather than that of the output, which may be linked to a run's
+    output.
+
+    Parameters
+    ----------
+
+    directory : str
+       The cache directory. Created when needed.
+
+    mode : str, optional
+       How a cached output is put in place of a run's output: "copy" makes
+       a copy, "link" a hard link (or a copy if linking fails), and 
+       "exclude" leaves it in the cache. A linked output shares the 
+       read-only file of the cache, so it can not be written without 
+       first being removed.
+
+    """
+
+    MODES = ("copy", "link", "exclude")
+
+    def __init__(self, directory, mode = "copy"):
+        if mode not in self.MODES:
+            raise ValueError("Unknown result cache mode '{0}'.".format(mode))
+        self.directory = directory
+        self.mode = mode
+
+    def path(self, fingerprint):
+        """
+        File name of the cached output with the given fingerprint.
+        """
+        return os.path.join(self.directory, fingerprint[:2], fingerprint + ".csv")
+
+    def _usedPath(self, cached):
+        # File whose modification time is the last use of a cached output.
+        return os.path.splitext(cached)[0] + ".used"
+
+    def _markUsed(self, cached):
+        # A cache that can not be written is still used.
+        try:
+            with open(self._usedPath(cached), 'a'):
+                pass
+            os.utime(self._usedPath(cached), None)
+        except OSError:
+            pass
+
+    def lookup(self, fingerprint):
+        """
+        File name of the cached output with the given fingerprint, or None
+        if it is not in the cache. Marks the output as recently used.
+        """
+        cached = self.path(fingerprint)
+        if not os.path.exists(cached):
+            return None
+        self._markUsed(cached)
+        return cached
+
+    def place(self, fingerprint, file_name):
+        """
+        Put the cached output with the given fingerprint in place as 
+        file_name, according to the mode.
+
+        Returns
+        -------
+
+        found : bool
+           True if the output was in the cache.
+
+        """
+        cached = self.lookup(fingerprint)
+        if cached == None:
+            return False
+        if self.mode == "exclude":
+            return True
+        if os.path.exists(file_name):
+            if self.mode == "link" and os.path.samefile(cached, file_name):
+                return True
+            # Removed rather than overwritten, as it may be linked.
+            os.remove(file_name)
+        elif not os.path.isdir(os.path.dirname(file_name) or "."):
+            os.makedirs(os.path.dirname(file_name))
+        if self.mode == "link":
+            try:
+                os.link(cached, file_name)
+                return True
+            except OSError:
+                pass
+        shutil.copyfile(cached, file_name)
+        return True
+
+    def store(self, fingerprint, file_name):
+        """
+        Copy the output file_name into the cache under the given 
+        fingerprint, unless it is there already.
+
+        Returns
+        -------
+
+        stored : bool
+           True if the output was added to the cache.
+
+        """
+        cached = self.path(fingerprint)
+        if os.path.exists(cached):
+            return False
+        if not os.path.isdir(os.path.dirname(cached)):
+            os.makedirs(os.path.dirname(cached))
+        # Copy under a temporary name, so that an interrupted copy is not
+        # taken for a cached output.
+        if os.path.exists(cached + ".tmp"):
+            os.remove(cached + ".tmp")
+        shutil.copyfile(file_name, cached + ".tmp")
+        # Read-only, so that a linked output is not rewritten in place.
+        os.chmod(cached + ".tmp", 0o444)
+        os.replace(cached + ".tmp", cached)
+        self._markUsed(cached)
+        return True
+
+    def evict(self, max_bytes = None, max_age = None):
+        """
+        Remove outputs from the cache, the least recently used first.
+
+        Outputs without a '.used' file, as stored by earlier versions, were
+        last used when they were modified. '.used' files left without 
+        their output are removed.
+
+        Parameters
+        ----------
+
+        max_bytes : int, optional
+           Remove outputs until the cache holds at most this many bytes.
+
+        max_age : float, optional
+           Remove outputs not used in this many seconds.
+
+        Returns
+        -------
+
+        removed : int
+           Number of outputs removed.
+
+        """
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            names = set(filenames)
+            for filename in filenames:
+                if filename.endswith(".csv"):
+                    cached = os.path.join(dirpath, filename)
+                    stat = os.stat(cached)
+                    used = stat.st_mtime
+                    if os.path.basename(self._usedPath(cached)) in names:
+                        used = os.stat(self._usedPath(cached)).st_mtime
+                    entries.append((used, stat.st_size, cached))
+                elif filename.endswith(".used") \
+                        and filename[:-len(".used")] + ".csv" not in names:
+                    os.remove(os.path.join(dirpath, filename))
+        entries.sort()
+        total = sum([size for used, size, cached in entries])
+        now = time.time()
+        removed = 0
+        for used, size, cached in entries:
+            if (max_age != None and now - used > max_age) \
+                    or (max_bytes != None and total > max_bytes):
+                os.remove(cached)
+                if os.path.exists(self._usedPath(cached)):
+                    os.remove(self._usedPath(cached))
+                total -= size
+                removed += 1
+        return removed
+
+
+# Number of lines before the column names in a BehaviorSpace table file.
+BEHAVIORSPACE_PREAMBLE_LINES = 6
+
+
+def readRunOutputHeader(csv_file):
+    """
+    Column names of a BehaviorSpace table output file.
+
+    Returns
+    -------
+
+    header : list
+       The column names, or None if the file has no header.
+
+    """
+    with open(csv_file, newline = "") as csvfp:
+        reader = csv.reader(csvfp)
+        for line in range(BEHAVIORSPACE_PREAMBLE_LINES):
+            if next(reader, None) == None:
+                return None
+        return next(reader, None)
+
+
+def _mergeWorkerRange(task):
+    # Read the table outputs of a range of runs and return their rows 
+    # joined with the run number and varying values, as CSV text.
+    (rstart, rstop), header = task
+    emitter = _worker_emitter
+    # Columns of the output holding values already given by the run.
+    keep = [pos for pos, name in enumerate(header) if name not in emitter.space.names]
+    text = io.StringIO()
+    writer = csv.writer(text)
+    missing = []
+    mismatched = []
+    rows = 0
+    for enum, indices in emitter.runs(rstart, rstop):
+        try:
+            with open(emitter.csvFileName(enum), newline = "") as csvfp:
+                reader = csv.reader(csvfp)
+                for line in range(BEHAVIORSPACE_PREAMBLE_LINES):
+                    next(reader, None)
+                if next(reader, None) != header:
+                    mismatched.append(enum)
+                    continue
+                run_columns = [enum] + [value for name, value in \
+                                            emitter.space.combinationOfIndices(indices)]
+                for row in reader:
+                    writer.writerow(run_columns + [row[pos] for pos in keep])
+                    rows += 1
+        except IOError:
+            missing.append(enum)
+    return rstop, text.getvalue(), rows, missing, mismatched
+
+
+def mergeRunOutputs(emitter, 
+                    output_file, 
+                    start = 0, 
+                    stop = None, 
+                    jobs = 1, 
+                    chunk_size = 256,
+                    progress = None):
+    """
+    Merge the BehaviorSpace table outputs of the runs of a split into a 
+    single CSV file.
+
+    The output file of each run is found as the {csv} key of the run's 
+    script. The BehaviorSpace preamble is skipped, and each row is prefixed
+    with the run number and the values of the varying variables of the run,
+    as in the run table. Columns of the outputs with the same name as a 
+    varying variable are left out. Rows are written in run order.
+
+    The outputs are read by a pool of worker processes, a chunk of runs at 
+    a time, so memory use does not depend on the number of runs. The 
+    number of merged runs is recorded in a file with the name of the output
+    file postfixed '.progress' after each chunk, and a merge that was 
+    interrupted is resumed from there when called again with the same 
+    arguments. The progress file is removed when the merge is complete.
+
+    Parameters
+    ----------
+
+    emitter : RunEmitter
+       Emitter of the split experiment, with the same settings as when it
+       was split.
+
+    output_file : str
+       Name of the merged CSV file.
+
+    start : int
+       Position of the first run, see RunEmitter.runs.
+
+    stop : int, optional
+       Position to stop at (excluded). Default is all runs.
+
+    jobs : int, optional
+       Number of worker processes.
+
+    chunk_size : int, optional
+       Number of runs read by a worker at a time.
+
+    progress : function, optional
+       Called as progress(merged, total) after each chunk, with the number 
+       of runs merged and the total number of runs.
+
+    Returns
+    -------
+
+    counts : dict
+       Number of "runs" and "rows" merged, and lists of the run numbers of
+       the "missing" outputs and of outputs with "mismatched" columns, 
+       which are left out of the merge.
+
+    """
+    if stop is None or stop > emitter.num_runs:
+        stop = emitter.num_runs
+    progress_file = output_file + ".progress"
+    settings = hashlib.sha1(json.dumps([emitter.value_tuples,
+                                        emitter.reps_of_experiment,
+                                        emitter.selection,
+                                        emitter.csv_output_dir,
+                                        emitter.jobName(0),
+                                        start,
+                                        stop],
+                                       default = str).encode("utf-8")).hexdigest()
+    counts = {"runs" : 0, "rows" : 0, "missing" : [], "mismatched" : []}
+
+    # The columns are those of the first output found.
+    header = None
+    for enum, indices in emitter.runs(start, stop):
+        try:
+            header = readRunOutputHeader(emitter.csvFileName(enum))
+        except IOError:
+            continue
+        if header != None:
+            break
+    if header == None:
+        counts["missing"] = [enum for enum, indices in emitter.runs(start, stop)]
+        return counts
+
+    # Check if an earlier merge was interrupted.
+    position = start
+    offset = 0
+    try:
+        with open(progress_file) as progressfp:
+            previous = json.load(progressfp)
+        if previous["settings"] == settings and previous["header"] == header:
+            position = previous["position"]
+            offset = previous["bytes"]
+            counts = previous["counts"]
+    except (IOError, ValueError, KeyError):
+        pass
+
+    def saveProgress(position, offset):
+        with open(progress_file + ".tmp", 'w') as progressfp:
+            json.dump({"settings" : settings,
+                       "header" : header,
+                       "position" : position,
+                       "bytes" : offset,
+                       "counts" : counts},
+                      progressfp)
+        os.replace(progress_file + ".tmp", progress_file)
+
+    if position > start:
+        outfp = open(output_file, 'r+', newline = "")
+        outfp.seek(offset)
+        outfp.truncate()
+    else:
+        outfp = open(output_file, 'w', newline = "")
+        csv.writer(outfp).writerow([RunTableWriter.ENR_STR] + emitter.space.names
+                                   + [name for name in header if name not in emitter.space.names])
+    tasks = [((cstart, min(stop, cstart + chunk_size)), header) \
+                 for cstart in range(position, stop, chunk_size)]
+    pool = None
+    try:
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs, _initEmitWorker, (pickle.dumps(emitter),))
+            results = pool.imap(_mergeWorkerRange, tasks)
+        else:
+            _initEmitWorker(pickle.dumps(emitter))
+            results = map(_mergeWorkerRange, tasks)
+        for rstop, text, rows, missing, mismatched in results:
+            outfp.write(text)
+            outfp.flush()
+            counts["runs"] += rstop - position - len(missing) - len(mismatched)
+            counts["rows"] += rows
+            counts["missing"] += missing
+            counts["mismatched"] += mismatched
+            position = rstop
+            saveProgress(position, outfp.tell())
+            if progress != None:
+                progress(position - start, stop - start)
+        if pool != None:
+            pool.close()
+    except:
+        if pool != None:
+            pool.terminate()
+        raise
+    finally:
+        if pool != None:
+            pool.join()
+        outfp.close()
+    os.remove(progress_file)
+    return counts
+
+
+def runOutputComplete(csv_file, repetitions):
+    """
+    Check if a BehaviorSpace table output holds all repetitions of a run.
+
+    The output is complete if its "[run number]" column has at least 
+    repetitions distinct values. Note that a repetition killed while 
+    running may still have written some rows.
+
+    Parameters
+    ----------
+
+    csv_file : str
+       Name of the output file.
+
+    repetitions : int
+       Number of repetitions of the run.
+
+    Returns
+    -------
+
+    complete : bool
+       True if the output is complete, False if it is not or can not be 
+       read.
+
+    """
+    try:
+        with open(csv_file, newline = "") as csvfp:
+            reader = csv.reader(csvfp)
+            for line in range(BEHAVIORSPACE_PREAMBLE_LINES):
+                next(reader, None)
+            header = next(reader, None)
+            if header == None or "[run number]" not in header:
+                return False
+            column = header.index("[run number]")
+            done = set()
+            for row in reader:
+                if len(row) > column:
+                    done.add(row[column])
+                    if len(done) >= repetitions:
+                        return True
+            return len(done) >= repetitions
+    except IOError:
+        return False
+
+
+def runStatus(emitter, start = 0, stop = None, csv_file_name = None):
+    """
+    Find the runs of a split whose outputs are missing or incomplete.
+
+    The output directory is listed once, and only outputs that exist are 
+    read. See runOutputComplete.
+
+    Parameters
+    ----------
+
+    emitter : RunEmitter
+       Emitter of the split experiment, with the same settings as when it
+       was split.
+
+    start : int
+       Position of the first run, see RunEmitter.runs.
+
+    stop : int, optional
+       Position to stop at (excluded). Default is all runs.
+
+    csv_file_name : function, optional
+       Function giving the output file name of the run at a position. 
+       Default is the {csv} file of the run's script, see 
+       RunEmitter.csvFileName.
+
+    Returns
+    -------
+
+    status : dict
+       Number of "complete" runs, and lists of the positions of the runs 
+       whose outputs are "missing" and "incomplete".
+
+    """
+    if stop is None or stop > emitter.num_runs:
+        stop = emitter.num_runs
+    if csv_file_name == None:
+        csv_file_name = lambda pos: emitter.csvFileName(emitter.runNumber(pos))
+    listed = {}
+    status = {"complete" : 0, "missing" : [], "incomplete" : []}
+    for pos in range(start, stop):
+        file_name = csv_file_name(pos)
+        directory, base_name = os.path.split(file_name)
+        if directory not in listed:
+            try:
+                listed[directory] = set(os.listdir(directory if directory != "" else "."))
+            except OSError:
+                listed[directory] = set()
+        if base_name not in listed[directory]:
+            status["missing"].append(pos)
+        elif runOutputComplete(file_name, emitter.reps_in_experiment):
+            status["complete"] += 1
+        else:
+            status["incomplete"].append(pos)
+    return status
+
+
+def formatIndexList(numbers):
+    """
+    Compact list of increasing integers, with ranges, e.g. '0-3,7,9-11'. 
+    This is the format of the array option of SLURM and PBS.
+    """
+    ranges = []
+    for number in numbers:
+        if len(ranges) > 0 and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+    return ",".join([str(first) if first == last else "{0}-{1}".format(first, last) \
+                         for first, last in ranges])
+
+
+DEFAULT_HEADLESS_COMMAND = "netlogo-headless.sh --model {model} --experiment {experiment} --setup-file {setup} --table {csv}"
+
+
+def _killRun(process):
+    # Kill a run and the processes it started, such as the java process of
+    # netlogo-headless.sh, which are in the process group of the run.
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            process.kill()
+    else:
+        process.kill()
+    return process.wait()
+
+
+def executeRuns(emitter,
+                command = DEFAULT_HEADLESS_COMMAND,
+                start = 0,
+                stop = None,
+                max_concurrent = 1,
+                timeout = None,
+                retries = 0,
+                progress = None,
+                poll_interval = 0.05):
+    """
+    Run the runs of a split on the local machine.
+
+    The files of each run are written (see RunEmitter.emit) just before the
+    run is started, so no more runs are prepared than can be run. At most 
+    max_concurrent runs are executed at the same time. Each run is started 
+    in a session of its own, so that a run that is killed is killed with 
+    all processes it started. If the emitter has a 
+    result cache, runs found in it are not executed, and the outputs of 
+    completed runs are stored in it. The standard output
+    and error of a run are written to a file named as the run's setup file,
+    but with the extension '.log'.
+
+    Parameters
+    ----------
+
+    emitter : RunEmitter
+       Emitter of the experiment.
+
+    command : str
+       Command line running a single run. It is split into arguments as by
+       a shell, and each argument may use the keys of script templates, 
+       e.g. {setup} and {csv}. The command is run directly, not by a shell.
+
+    start : int
+       Position of the first run, see RunEmitter.runs.
+
+    stop : int, optional
+       Position to stop at (excluded). Default is all runs.
+
+    max_concurrent : int, optional
+       Largest number of runs executed at the same time.
+
+    timeout : float, optional
+       Seconds after which a run is killed and counted as failed.
+
+    retries : int, optional
+       Number of times a failed run is started again.
+
+    progress : function, optional
+       Called as progress(done, failed, running, total, seconds) whenever a
+       run finishes, with the number of runs done (including those taken 
+       from the result cache), failed (after all retries) and running, the
+       total number of runs, and the seconds since the start.
+
+    poll_interval : float, optional
+       Seconds between checks of the running runs.
+
+    Returns
+    -------
+
+    result : dict
+       Number of runs "done", "cached" and "retried", the run numbers of the
+       "failed" runs, and the "seconds" taken.
+
+    """
+    if stop is None or stop > emitter.num_runs:
+        stop = emitter.num_runs
+    arguments = [ScriptTemplate(argument, SCRIPT_KEYS + ("clone",), emitter.space.names) \
+                     for argument in shlex.split(command)]
+    new_runs = emitter.runs(start, stop)
+    # Runs to start again, with their number of earlier attempts.
+    retry_runs = collections.deque()
+    running = []
+    result = {"done" : 0, "cached" : 0, "retried" : 0, "failed" : [], "seconds" : 0.0}
+    total = stop - start
+    started = time.time()
+
+    def launch(enum, indices, attempt):
+        xml_filename = emitter.xmlFileName(enum)
+        args = [renderScript(xml_filename,
+                             emitter.nlogo_file,
+                             emitter.experiment.getAttribute("name"),
+                             enum,
+                             argument,
+                             csv_output_dir = emitter.csv_output_dir,
+                             extra_keys = {"clone" : enum % emitter.reps_of_experiment},
+                             parameters = dict(emitter.space.combinationOfIndices(indices))) \
+                    for argument in arguments]
+        log = open(os.path.splitext(xml_filename)[0] + ".log", 'w')
+        try:
+            process = subprocess.Popen(args, stdout = log, stderr = subprocess.STDOUT,
+                                       start_new_session = True)
+        except:
+            log.close()
+            raise
+        running.append((process, log, enum, indices, attempt, time.time()))
+
+    try:
+        while True:
+            # Fill the free slots, retries first.
+            while len(running) < max_concurrent:
+                if len(retry_runs) > 0:
+                    launch(*retry_runs.popleft())
+                    continue
+                run = next(new_runs, None)
+                if run == None:
+                    break
+                enum, indices = run[0], list(run[1])
+                if emitter.fromCache(enum, indices):
+                    result["cached"] += 1
+                    continue
+                emitter.emit(enum, indices)
+                launch(enum, indices, 0)
+            if len(running) < 1:
+                break
+            time.sleep(poll_interval)
+            finished = False
+            still_running = []
+            for process, log, enum, indices, attempt, run_started in running:
+                returncode = process.poll()
+                if returncode == None and timeout != None \
+                        and time.time() - run_started > timeout:
+                    returncode = _killRun(process)
+                    log.write("\nKilled after {0} seconds.\n".format(timeout))
+                if returncode == None:
+                    still_running.append((process, log, enum, indices, attempt, run_started))
+                    continue
+                log.close()
+                if returncode == 0:
+                    result["done"] += 1
+                    if emitter.result_cache != None \
+                            and runOutputComplete(emitter.csvFileName(enum), 
+                                                  emitter.reps_in_experiment):
+                        emitter.result_cache.store(emitter.fingerprint(enum, indices),
+                                                   emitter.csvFileName(enum))
+                elif attempt < retries:
+                    result["retried"] += 1
+                    retry_runs.append((enum, indices, attempt + 1))
+                else:
+                    result["failed"].append(enum)
+                finished = True
+            running[:] = still_running
+            if finished and progress != None:
+                progress(result["done"] + result["cached"], len(result["failed"]), len(running),
+                         total, time.time() - started)
+    finally:
+        # Do not leave runs behind if interrupted.
+        for process, log, enum, indices, attempt, run_started in running:
+            _killRun(process)
+            log.close()
+    result["failed"].sort()
+    result["seconds"] = time.time() - started
+    return result
+
+
+def formatProgress(done, failed, running, total, seconds):
+    """
+    One line progress report of executed runs, with throughput and 
+    estimated time left. Takes the arguments of the progress function of 
+    executeRuns.
+    """
+    finished = done + failed
+    rate = finished / seconds if seconds > 0 else 0.0
+    if rate > 0:
+        left = int(round((total - finished) / rate))
+        eta = "{0}:{1:02d}:{2:02d}".format(left // 3600, left // 60 % 60, left % 60)
+    else:
+        eta = "unknown"
+    return "{0} of {1} run(s) finished, {2} failed, {3} running, {4:.2f} runs/s, time left {5}."\
+        .format(finished, total, failed, running, rate, eta)
+
+
+class SplitStats(object):
+    """
+    Timings and counts of a split, for finding where the time goes.
+
+    The time spent in each phase of the split is added up over the runs and
+    experiments. The phases are
+
+    read
+       Reading the model file and parsing the experiments.
+
+    expand
+       Expanding the value sets and preparing the experiment for writing.
+
+    plan, merge, status, execute
+       Planning, merging, checking or executing the runs, in those modes.
+
+    serialize
+       Creating the XML of the setup files.
+
+    script
+       Rendering the scripts.
+
+    write
+       Writing the setup and script files (to the sink).
+
+    run_table
+       Writing the run table.
+
+    close
+       Closing the sink, e.g. finishing an archive.
+
+    With worker processes (see --jobs) the times of the workers are summed,
+    so the phases may add up to more than the total time.
+
+    Counts of runs, and of the files and bytes written, are kept in the
+    attributes runs, files and bytes.
+    """
+
+    PHASES = ("read", "expand", "plan", "merge", "status", "execute", 
+              "serialize", "script", "write", "run_table", "close")
+
+    def __init__(self):
+        self.started = time.time()
+        self.seconds = None
+        self.phases = {}
+        self.runs = 0
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, phase, seconds):
+        """
+        Add seconds to the time spent in phase.
+        """
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def timed(self, phase, iterable):
+        """
+        Iterate over iterable, adding the time taken to produce each item to 
+        phase.
+        """
+        iterator = iter(iterable)
+        while True:
+            started = time.time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(phase, time.time() - started)
+                return
+            self.add(phase, time.time() - started)
+            yield item
+
+    def addSink(self, sink):
+        """
+        Count the files and bytes written by sink.
+        """
+        self.files += sink.files_written
+        self.bytes += sink.bytes_written
+
+    def merge(self, other):
+        """
+        Add the timings and counts of other, for instance from a worker 
+        process.
+        """
+        for phase, seconds in other.phases.items():
+            self.add(phase, seconds)
+        self.runs += other.runs
+        self.files += other.files
+        self.bytes += other.bytes
+
+    def stop(self):
+        """
+        Stop the clock of the total time.
+        """
+        self.seconds = time.time() - self.started
+
+    def peakMemory(self):
+        """
+        Peak resident set size in bytes of this process, and of the largest 
+        of its finished worker processes. None if not known.
+        """
+        if resource == None:
+            return None, None
+        # ru_maxrss is in bytes on Mac OS X, and in kilobytes elsewhere.
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, \
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+
+    def toDict(self):
+        """
+        The statistics as a dictionary, for saving as JSON. Call stop first.
+        """
+        peak_rss, peak_rss_workers = self.peakMemory()
+        return {"seconds" : self.seconds,
+                "phases" : dict([(phase, self.phases[phase]) \
+                                     for phase in self.PHASES if phase in self.phases]),
+                "runs" : self.runs,
+                "runs_per_second" : self.runs / self.seconds if self.seconds > 0 else None,
+                "files" : self.files,
+                "bytes" : self.bytes,
+                "peak_rss" : peak_rss,
+                "peak_rss_workers" : peak_rss_workers}
+
+    def format(self):
+        """
+        The statistics as a text report. Call stop first.
+        """
+        stats = self.toDict()
+        lines = ["{0:<10} {1:>10}".format("Phase", "Seconds")]
+        for phase, seconds in stats["phases"].items():
+            lines.append("{0:<10} {1:>10.3f}".format(phase, seconds))
+        lines.append("{0:<10} {1:>10.3f}".format("total", stats["seconds"]))
+        lines.append("Runs: {0} ({1:.1f} per second)"\
+                         .format(stats["runs"], stats["runs_per_second"] or 0.0))
+        lines.append("Files: {0}, bytes: {1}".format(stats["files"], stats["bytes"]))
+        if stats["peak_rss"] != None:
+            lines.append("Peak memory: {0:.1f} MB, workers {1:.1f} MB"\
+                             .format(stats["peak_rss"] / 1048576.0, 
+                                     stats["peak_rss_workers"] / 1048576.0))
+        return "\n".join(lines) + "\n"
+
+
+class TimedRunTable(object):
+    """
+    Run table writer adding the time spent writing to the run_table phase
+    of a SplitStats. Takes the run table writer to time, and the stats.
+    """
+
+    def __init__(self, run_table, stats):
+        self.run_table = run_table
+        self.stats = stats
+
+    def writeRun(self, enum, indices, extra = ()):
+        started = time.time()
+        self.run_table.writeRun(enum, indices, extra)
+        self.stats.add("run_table", time.time() - started)
+
+    def close(self):
+        started = time.time()
+        self.run_table.close()
+        self.stats.add("run_table", time.time() - started)
+
+
+def packRuns(emitter, start, stop, runs_per_pack = None, cost_per_pack = None, cost_hints = ()):
+    """
+    Group runs into packs sharing a setup file.
+
+    Runs are given by their position (see RunEmitter.runs), which is their
+    run number unless a selection of the combinations is split.
+
+    With runs_per_pack each pack holds that many consecutive runs. With 
+    cost_per_pack the runs are spread over as many packs as needed for the 
+    total estimated cost (see RunEmitter.runCost) divided by cost_per_pack,
+    balancing the cost of the packs by assigning the most expensive 
+    remaining run to the cheapest pack (longest processing time first).
+
+    Parameters
+    ----------
+
+    emitter : RunEmitter
+       Emitter of the experiment.
+
+    start : int
+       Position of the first run.
+
+    stop : int
+       Position to stop at (excluded).
+
+    runs_per_pack : int, optional
+       Number of runs per pack.
+
+    cost_per_pack : float, optional
+       Target estimated cost of each pack. Used if runs_per_pack is None.
+
+    cost_hints : list, optional
+       List of (variable_name, exponent) tuples for the cost estimate.
+
+    Returns
+    -------
+
+    packs : list
+       One list of run positions per pack, each in increasing order.
+
+    """
+    if stop <= start:
+        return []
+    if runs_per_pack != None:
+        return [list(range(pstart, min(stop, pstart + runs_per_pack))) \
+                    for pstart in range(start, stop, runs_per_pack)]
+
+    costs = array.array("d", [emitter.runCost(indices, cost_hints) \
+                                  for enum, indices in emitter.runs(start, stop)])
+    num_packs = max(1, min(stop - start, int(math.ceil(sum(costs) / cost_per_pack))))
+    # (load, pack number) of each pack, the cheapest first.
+    loads = [(0.0, pack) for pack in range(num_packs)]
+    packs = [[] for pack in range(num_packs)]
+    for pos in sorted(range(len(costs)), key = lambda pos: -costs[pos]):
+        load, pack = heapq.heappop(loads)
+        packs[pack].append(start + pos)
+        heapq.heappush(loads, (load + costs[pos], pack))
+    for runs in packs:
+        runs.sort()
+    return packs
+
+
+def planSplit(emitter,
+              start,
+              stop,
+              array_job = False,
+              array_script_template = None,
+              runs_per_pack = None,
+              cost_per_pack = None,
+              cost_hints = (),
+              run_table_format = None,
+              seconds_per_step = None):
+    """
+    Size and cost estimate of a split, without writing any runs.
+
+    The number of files and the total size are projected from the files 
+    of the first and the last run (or pack), so the time taken does not 
+    depend on the number of runs.
+
+    Parameters
+    ----------
+
+    emitter : RunEmitter
+       Emitter of the experiment.
+
+    start : int
+       First run number.
+
+    stop : int
+       Run number to stop at (excluded).
+
+    array_job : bool, optional
+       Plan an array job split instead of one file per run.
+
+    array_script_template : str, optional
+       Template of the array job script, if one is created.
+
+    runs_per_pack : int, optional
+       Plan packing with this number of runs per pack.
+
+    cost_per_pack : float, optional
+       Plan packing with this estimated cost per pack.
+
+    cost_hints : list, optional
+       List of (variable_name, exponent) tuples for the cost estimate.
+
+    run_table_format : str, optional
+       "csv" or "binary" if a run table is created, otherwise None.
+
+    seconds_per_step : float, optional
+       Measured or guessed run time of a single simulation step, used to 
+       estimate core hours.
+
+    Returns
+    -------
+
+    plan : dict
+       The plan, with JSON compatible values.
+
+    """
+    num_runs = max(0, stop - start)
+    sample_runs = [(enum, list(indices)) for enum, indices in emitter.runs(start, start + 1)]
+    if num_runs > 1:
+        sample_runs += [(enum, list(indices)) for enum, indices in emitter.runs(stop - 1, stop)]
+
+    def projectedBytes(files_per_sample, count):
+        # Average size of the sampled files times the count.
+        if len(files_per_sample) < 1:
+            return 0
+        sizes = [sum([len(contents.encode("utf-8")) for file_name, contents in files]) \
+                     for files in files_per_sample]
+        return int(round(float(sum(sizes)) / len(sizes) * count))
+
+    num_packs = None
+    if array_job:
+        manifest = io.StringIO()
+        saveArrayManifest(manifest, emitter.experiment, emitter.value_tuples,
+                          emitter.reps_in_experiment, emitter.reps_of_experiment,
+                          emitter.selection)
+        num_files = 1
+        num_bytes = len(manifest.getvalue().encode("utf-8"))
+        if array_script_template != None:
+            # The array job script is about the size of its template.
+            num_files += 1
+            num_bytes += len(array_script_template.encode("utf-8"))
+    elif runs_per_pack != None or cost_per_pack != None:
+        if runs_per_pack != None:
+            num_packs = (num_runs + runs_per_pack - 1) // runs_per_pack
+        else:
+            costs = [emitter.runCost(indices, cost_hints) for enum, indices in sample_runs]
+            total_cost = float(sum(costs)) / max(1, len(costs)) * num_runs
+            num_packs = max(1, min(num_runs, int(math.ceil(total_cost / cost_per_pack)))) \
+                if num_runs > 0 else 0
+        num_files = num_packs * (2 if emitter.script_template != None else 1)
+        num_bytes = 0
+        if num_packs > 0:
+            # A pack of average size, from the first run of the pack.
+            pack_size = int(math.ceil(float(num_runs) / num_packs))
+            files = emitter.renderPack(0, num_packs, sample_runs[:1] * pack_size)
+            num_bytes = projectedBytes([files], num_packs)
+    else:
+        num_files = num_runs * (2 if emitter.script_template != None else 1)
+        num_bytes = projectedBytes([emitter.render(enum, indices) \
+                                        for enum, indices in sample_runs], num_runs)
+
+    # Array tasks of a sample get a column with the task index.
+    task_column = array_job and emitter.selection != None
+    if run_table_format == "csv":
+        num_files += 1
+        rows = [[RunTableWriter.ENR_STR] + emitter.space.names + (["Task"] if task_column else [])] \
+            + [[enum] + [value for name, value in emitter.space.combinationOfIndices(indices)] \
+                   + ([stop - 1] if task_column else []) \
+                   for enum, indices in sample_runs]
+        table = io.StringIO()
+        csv.writer(table).writerows(rows)
+        row_bytes = float(len(table.getvalue()) - len(table.getvalue().splitlines(True)[0])) \
+            / max(1, len(sample_runs))
+        num_bytes += len(table.getvalue().splitlines(True)[0]) + int(round(row_bytes * num_runs))
+    elif run_table_format == "binary":
+        num_files += 2
+        max_size = max(emitter.space.sizes + [num_packs + 1 if num_packs != None else 1]
+                       + ([stop + 1] if task_column else [])
+                       + ([emitter.runNumber(stop - 1) + 1] \
+                              if emitter.selection != None and stop > start else []))
+        for typecode in "BHIL":
+            if max_size <= 1 << (8 * array.array(typecode).itemsize):
+                break
+        itemsize = array.array(typecode).itemsize
+        num_columns = len(emitter.space.names) + (1 if num_packs != None or task_column else 0) \
+            + (1 if emitter.selection != None else 0)
+        num_bytes += itemsize * num_columns * num_runs \
+            + len(json.dumps(emitter.space.values, default = str))
+
+    steps = emitter.timeLimit()
+    num_repetitions = num_runs * emitter.reps_in_experiment
+    total_steps = num_repetitions * steps if steps != None else None
+    core_hours = None
+    if total_steps != None and seconds_per_step != None:
+        core_hours = total_steps * seconds_per_step / 3600.0
+
+    return {"experiment" : emitter.experiment.getAttribute("name"),
+            "variables" : [{"name" : name, "values" : size} \
+                               for name, size in zip(emitter.space.names, emitter.space.sizes)],
+            "combinations" : emitter.num_individual_runs,
+            "repetitions_per_run" : emitter.reps_in_experiment,
+            "runs_per_combination" : emitter.reps_of_experiment,
+            "first_run" : start,
+            "runs" : num_runs,
+            "packs" : num_packs,
+            "repetitions" : num_repetitions,
+            "files" : num_files,
+            "bytes" : num_bytes,
+            "time_limit_steps" : steps,
+            "steps" : total_steps,
+            "core_hours" : core_hours}
+
+
+def parseCostHint(hint):
+    """
+    Parse a cost hint on the form variable[=exponent].
+
+    Returns
+    -------
+
+    variable_name, exponent : str, float
+       The exponent is 1 if not given.
+
+    """
+    name, sep, exponent = hint.partition("=")
+    try:
+        return name, float(exponent) if sep else 1.0
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid cost hint '{0}', expected variable[=exponent]".format(hint))
+
+
+def parseSize(size):
+    """
+    Parse a size in bytes, optionally with one of the suffixes K, M, G or T
+    (powers of 1024).
+
+    Returns
+    -------
+
+    size : int
+       The size in bytes.
+
+    """
+    multipliers = {"K" : 1 << 10, "M" : 1 << 20, "G" : 1 << 30, "T" : 1 << 40}
+    number = size.strip().upper()
+    multiplier = 1
+    if number[-1:] in multipliers:
+        multiplier = multipliers[number[-1]]
+        number = number[:-1]
+    try:
+        return int(float(number) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid size '{0}'".format(size))
+
+
+def parseShard(shard):
+    """
+    Parse a shard specification on the form k/n.
+
+    Parameters
+    ----------
+
+    shard : str
+       Shard k of n, 1 <= k <= n.
+
+    Returns
+    -------
+
+    k, n : int
+       The shard number and number of shards.
+
+    """
+    try:
+        k, n = [int(x) for x in shard.split("/")]
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid shard '{0}', expected k/n".format(shard))
+    if n < 1 or k < 1 or k > n:
+        raise argparse.ArgumentTypeError("invalid shard '{0}', k must be in the range 1 to n".format(shard))
+    return k, n
+
+
+def shardRange(num_runs, k, n):
+    """
+    Range of run numbers of shard k out of n.
+
+    The shards are contiguous, disjoint, and cover all runs. Sizes differ by 
+    at most one.
+
+    Returns
+    -------
+
+    start, stop : int
+       First run number of the shard, and the run number to stop at.
+
+    """
+    return num_runs * (k - 1) // n, num_runs * k // n
+
+
+def buildArgumentParser():
+    """
+    The command line argument parser of split_nlogo_experiment.
+
+    Returns
+    -------
+
+    aparser : argparse.ArgumentParser
+       The parser.
+
+    """
     aparser = argparse.ArgumentParser(description = "Split nlogo behavioral space experiments.")
-    aparser.add_argument("nlogo_file", help = "Netlogo .nlogo file with the original experiment")
+    aparser.add_argument("nlogo_file", nargs = "?", help = "Netlogo .nlogo file with the original experiment")
     aparser.add_argument("experiment", nargs = "*", help = "Name of one or more experiments in the nlogo file to expand. If none are given, --all_experiments must be set.")
     aparser.add_argument("--all_experiments", action="store_true", help = "If set all experiments in the .nlogo file will be expanded.")
+    aparser.add_argument("--list_experiments", action="store_true", help = "List the names of the experiments in the .nlogo file and exit.")
     aparser.add_argument("--repetitions_per_run", type=int, nargs = 1, help="Number of repetitions per generated experiment run. If the nlogo file is set to repeat an experiment N times, these will be split into N/n individual experiment runs (each repeating n times), where n is the argument given to this switch. Note that if n does not divide N this operation will result in a lower number of total repetitions.")
     aparser.add_argument("--output_dir", default="./", help = "Path to output directory if not current directory.")
     aparser.add_argument("--output_prefix", default="", help = "Generated files are named after the experiment, if set, the value given for this option will be prefixed to that name.")
@@ -232,35 +4060,153 @@ if __name__ == "__main__":
     aparser.add_argument("--create_script", dest = "script_template_file", help = "Tell the program to generate script files (for instance PBS files) alongside the xml setup files. A template file must be provided. See the external documentation for more details.")
     aparser.add_argument("--script_output_dir", help = "Path to output directory for script files. If not specified, the same directory as for the xml setup files is used.")
     aparser.add_argument("--csv_output_dir", help = "Path to output directory where the table data from the simulations will be saved. Use with script files to set output directory for executed scripts. If not specified, the same directory as for the xml setup files is used.")
-    aparser.add_argument("--create_run_table", action="store_true", help = "Create a csv file containing a table of run numbers and corresponding parameter values. Will be named as the experiment but postfixed with '_run_table.csv'.")
+    aparser.add_argument("--create_run_table", action="store_true", help = "Create a csv file containing a table of run numbers and corresponding parameter values. Will be named as the experiment but postfixed with '_run_table.csv'. With --array_job and --sample the table has a last column 'Task' with the array task index of each run.")
+    aparser.add_argument("--run_table_format", choices = ["csv", "binary"], default = "csv", help = "Format of the run table. 'csv' (default) writes the run numbers and parameter values. 'binary' writes a file postfixed '_run_table.bin' holding the index of each run's parameter values as fixed size little endian integers, and a dictionary of the values in a file postfixed '_run_table.json'. The binary table can be memory mapped, for instance with numpy.memmap.")
     aparser.add_argument("--no_path_translation", action="store_true", help = "Turn off automatic path translation when generating scripts. Advanced use. By default all file and directory paths given are translated into absolute paths, and the existence of directories are tested. (This is because netlogo-headless.sh always run in the netlogo directory, which create problems with relative paths.) However automatic path translation may cause problems for users who, for instance, want to give paths that do yet exist, or split experiments on a different file system from where the simulations will run. In such cases enabling this option preserves the paths given to the program as they are and it is up to the user to make sure these will work.")
+    # Array job options.
+    aparser.add_argument("--array_job", action="store_true", help = "Instead of one xml setup file (and script) per run, write a single manifest file per experiment, named as the experiment but postfixed with '_manifest.json', and, if --create_script is given, a single array job script postfixed with '_array'. The script template may use the key {task_index}, which is replaced by the scheduler's array index variable (see --array_index), and {materialize}, a command writing the xml setup file of the current task to the {setup} path.")
+    aparser.add_argument("--array_index", default = "${SLURM_ARRAY_TASK_ID:-${PBS_ARRAYID:-$PBS_ARRAY_INDEX}}", help = "Shell expression giving the array task index in array job scripts. Tasks are numbered from 0. Default: '%(default)s'.")
+    aparser.add_argument("--materialize", nargs = 2, metavar = ("MANIFEST", "INDEX"), help = "Write the xml setup file of task INDEX in an array job manifest and exit. The nlogo_file argument is not used.")
+    aparser.add_argument("--materialize_output", default = "-", help = "File to write the xml setup file to when using --materialize, or the archive member to when using --extract. Default is standard output.")
+    aparser.add_argument("--exact_steps", action="store_true", help = "Compute the values of stepped value sets in exact decimal arithmetic, keeping the precision they are written with in the model file, so that for instance 0.1 steps give 0.3 rather than 0.30000000000000004. Note that the last value is then always included if it is on a step, which may give one value more than BehaviorSpace.")
+    aparser.add_argument("--dom_writer", action="store_true", help = "Build a complete XML document for every run when writing the xml setup files instead of reusing a pre-serialized experiment. Slower, but the output is the same. Mainly useful for verification.")
+    aparser.add_argument("--incremental", action="store_true", help = "Keep a record of the written files and their content hashes in a file postfixed '_split_state.jsonl', and only write files that are missing or whose content changed since the last split. Runs added, changed, unchanged and removed compared to the last split are reported. An interrupted incremental split is resumed where it stopped if split_nlogo_experiment is called again with the same arguments.")
+    # Archive options.
+    aparser.add_argument("--archive", help = "Write all xml setup and script files into a single archive with this file name instead of as separate files. The format is decided by the file ending: .tar, .tar.gz, .tgz, .tar.bz2, .tar.xz, .zip or .pack. Members are named by their path relative to the output directory. A .pack file has an index that allows reading a single member without reading the rest of the file, see --extract.")
+    aparser.add_argument("--extract", nargs = 2, metavar = ("ARCHIVE", "MEMBER"), help = "Write a single member of an archive created with --archive and exit. MEMBER is either the member's name or its number, counting from 0 in the order the files were written. The output file is given by --materialize_output. The nlogo_file argument is not used.")
+    # Packing options.
+    aparser.add_argument("--pack_runs", type = int, metavar = "K", help = "Put K consecutive runs in each xml setup file (and script), as separate experiments named after the runs' job names. Files are postfixed '_packN' and '_pack_scriptN'. Scripts may use the keys {pack} and {runs}, the latter a space separated list of the experiment names in the setup file. If a run table is created, it gets a column with the pack number of each run.")
+    aparser.add_argument("--pack_cost", type = float, metavar = "COST", help = "Like --pack_runs, but group the runs into packs with an estimated cost of about COST each, balancing the packs so they take about the same time. The cost of a run is estimated as its number of repetitions times the steps of the experiment's time limit, times any cost hints.")
+    aparser.add_argument("--cost_hint", type = parseCostHint, action = "append", default = [], metavar = "VARIABLE[=EXPONENT]", help = "With --pack_cost, multiply the estimated cost of a run by the value of VARIABLE raised to EXPONENT (default 1), for instance when the run time grows with the number of agents. May be given several times.")
+    # Parallel options.
+    aparser.add_argument("--jobs", type = int, default = 1, help = "Number of worker processes used to write the xml setup and script files. Default: 1.")
+    aparser.add_argument("--shard", type = parseShard, metavar = "K/N", help = "Only write the files of part K of N (counting from 1) of the runs. Each shard is a contiguous range of run numbers, numbered as in a complete split, so N invocations (e.g. on different machines) with K from 1 to N together write all files. The run table of a shard is postfixed with '_shardKofN'.")
+    # Sampling options.
+    aparser.add_argument("--sample", type = int, metavar = "N", help = "Only split N of the combinations of variable values, selected without enumerating all combinations. The runs keep the run numbers they have in a complete split, so files and run tables of different samples can be compared. See --sampling.")
+    aparser.add_argument("--sampling", choices = SAMPLING_METHODS, default = "random", help = "How --sample selects the combinations: 'random' (default) uniformly at random, 'lhs' by Latin hypercube sampling of the value lists, or 'halton' by the low discrepancy Halton sequence.")
+    aparser.add_argument("--seed", type = int, help = "Seed of the random number generator used by --sample, to get the same sample every time. With --sampling halton the seed randomly shifts the sequence, without a seed the sequence is used as it is.")
+    # Execution options.
+    aparser.add_argument("--execute", action="store_true", help = "Run the runs on this machine after writing their files, see --headless_command. The output of each run is written to a file named as its xml setup file but with the extension '.log'.")
+    aparser.add_argument("--headless_command", default = DEFAULT_HEADLESS_COMMAND, help = "Command running a single run with --execute. It may use the keys of script templates, such as {setup} and {csv}, and is run directly, not by a shell. Default: '%(default)s'.")
+    aparser.add_argument("--max_concurrent", type = int, default = multiprocessing.cpu_count(), help = "Largest number of runs executed at the same time with --execute. Default is the number of processors, %(default)s.")
+    aparser.add_argument("--run_timeout", type = float, metavar = "SECONDS", help = "With --execute, kill a run that takes longer than this, and count it as failed.")
+    aparser.add_argument("--retries", type = int, default = 0, help = "With --execute, number of times a failed run is started again. Default: 0.")
+    # Result options.
+    aparser.add_argument("--merge", action="store_true", help = "Instead of splitting, merge the BehaviorSpace table outputs of the runs (the {csv} files of the scripts) into a single csv file per experiment, named as the experiment but postfixed with '_merged.csv'. Each row is prefixed with its run number and the values of the varying variables. Give the same arguments as when splitting. An interrupted merge is resumed when called again. Use --jobs to read the outputs in parallel.")
+    aparser.add_argument("--status", action="store_true", help = "Instead of splitting, check which runs have complete BehaviorSpace table outputs (the {csv} files of the scripts). An output is complete if it holds all repetitions of the run. Give the same arguments as when splitting. The run numbers of missing and incomplete runs, or the task indices in array job mode, are written as a list of ranges (e.g. 3,7-9) to a file named as the experiment but postfixed with '_failed.txt', which can be given to the array option of the scheduler.")
+    aparser.add_argument("--resubmit", metavar = "DIR", help = "With --status, write the xml setup files (and scripts) of the missing and incomplete runs to the directory DIR. Their outputs are written to the same files as before.")
+    # Result cache options.
+    aparser.add_argument("--result_cache", metavar = "DIR", help = "Directory of a cache of run outputs. Runs whose output is in the cache are not written (or executed); the cached output is put in place of the run's output instead, see --cache_mode. Runs are identified by a fingerprint of the model code, the run's experiment and parameter values, its number of repetitions, and its index among the runs of its combination. Complete outputs are added to the cache by --status and --execute.")
+    aparser.add_argument("--cache_mode", choices = ResultCache.MODES, default = "copy", help = "How a cached output is put in place of a run's output: 'copy' (default) makes a copy, 'link' makes a hard link, or a copy if that is not possible, and 'exclude' only leaves the run out. Linking saves space and time, but the linked outputs are the read-only files of the cache and must be removed before they are written again.")
+    aparser.add_argument("--cache_max_size", type = parseSize, metavar = "SIZE", help = "Remove the least recently used outputs from the result cache until it is at most SIZE bytes. The suffixes K, M, G and T may be used, e.g. 20G.")
+    aparser.add_argument("--cache_max_age", type = float, metavar = "DAYS", help = "Remove outputs not used in DAYS days from the result cache.")
+    # Planning options.
+    aparser.add_argument("--plan", nargs = "?", const = "-", metavar = "FILE", help = "Do not write any setup, script or run table files, instead write a JSON description of what the split would create to FILE (default standard output): the number of runs, the number of values of each varying variable, the number of files, their estimated total size, and the number of simulation steps. The sizes are estimated from the first and last run, so planning takes the same time whatever the number of runs.")
+    aparser.add_argument("--seconds_per_step", type = float, help = "With --plan, the run time of one simulation step in seconds, used to estimate the core hours of the experiments.")
+    # Batch options.
+    aparser.add_argument("--batch", metavar = "CONFIG", help = "Split the models and experiments listed in the JSON file CONFIG, each with its own options, in a single process. Each model file is read once. With --jobs, the number of experiments split at the same time. Only --jobs, --stats, --stats_json and --profile may be given on the command line; all other options, and the models, go in CONFIG. Plans of entries with --plan are written as one JSON list per plan file, one object per entry with its model, experiments and total. See the external documentation for the format.")
+    # Statistics options.
+    aparser.add_argument("--stats", action="store_true", help = "When done, write the time spent in each phase of the split (reading the model, expanding the value sets, creating the XML, rendering scripts, writing files, writing the run table, ...), the number of runs, files and bytes written, the runs per second and the peak memory use to standard error.")
+    aparser.add_argument("--stats_json", metavar = "FILE", help = "Like --stats, but write the statistics as JSON to FILE, for instance to keep with the job logs.")
+    aparser.add_argument("--profile", metavar = "FILE", help = "Run split_nlogo_experiment under cProfile and save the profile to FILE, for reading with the pstats module. Only the main process is profiled.")
     aparser.add_argument("-v", "--version", action = "version", version = "split_nlogo_experiment version {0}".format(__version__))
-    
-    argument_ns = aparser.parse_args()
+    return aparser
 
 
-    # Check so that there's either experiments listed, or the all_experiments switch is set.
-    if len(argument_ns.experiment) < 1 and argument_ns.all_experiments == False:
-        print("Warning. You must either list one or more experiments to expand, or use the --all_experiments switch.")
-        exit(0)
+# Options that apply to a whole batch rather than to its entries.
+BATCH_OPTIONS = ("batch", "jobs", "stats", "stats_json", "profile")
 
-    experiments_xml = ""
-    try:
-        with open(argument_ns.nlogo_file) as nlogof:
-            # An .nlogo file contain a lot of non-xml data
-            # this is a hack to ignore those lines and
-            # read the experiments data into an xml string
-            # that can be parsed.
-            nlogo_text = nlogof.read()
-            alist = nlogo_text.split("<experiments>")
-            for elem in alist[1:]:
-                blist = elem.split("</experiments>")
-                experiments_xml += "<experiments>{0}</experiments>\n".format(blist[0])
-    except IOError as ioe:
-        sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
-        exit(ioe.errno)
+def checkArguments(aparser, argument_ns):
+    """
+    Check that the options of a split go together. Errors are reported by
+    aparser.error, which exits.
+
+    Parameters
+    ----------
+
+    aparser : argparse.ArgumentParser
+       Parser from buildArgumentParser.
+
+    argument_ns : argparse.Namespace
+       The parsed arguments.
+
+    """
+    if argument_ns.batch != None:
+        # The options of the splits are given in the batch configuration.
+        defaults = vars(aparser.parse_args([]))
+        for action in aparser._actions:
+            if action.dest not in BATCH_OPTIONS and action.dest in defaults \
+                    and getattr(argument_ns, action.dest) != defaults[action.dest]:
+                aparser.error("argument {0}: not allowed with argument --batch, give it in the batch configuration"\
+                                  .format("/".join(action.option_strings) or action.dest))
+        if argument_ns.jobs < 1:
+            aparser.error("argument --jobs: must be at least 1")
+        return
+
+    if argument_ns.archive != None and argument_ns.incremental == True:
+        aparser.error("argument --incremental: not allowed with argument --archive")
+
+    if argument_ns.pack_runs != None or argument_ns.pack_cost != None:
+        if argument_ns.pack_runs != None and argument_ns.pack_cost != None:
+            aparser.error("argument --pack_cost: not allowed with argument --pack_runs")
+        if argument_ns.pack_runs != None and argument_ns.pack_runs < 1:
+            aparser.error("argument --pack_runs: must be at least 1")
+        if argument_ns.pack_cost != None and argument_ns.pack_cost <= 0:
+            aparser.error("argument --pack_cost: must be positive")
+        for option in ("array_job", "incremental", "shard", "merge", "status", "execute", "result_cache"):
+            if getattr(argument_ns, option) not in (None, False):
+                aparser.error("argument --{0}: not allowed with job packing".format(option))
+        if argument_ns.jobs > 1:
+            aparser.error("argument --jobs: not allowed with job packing")
+
+    if argument_ns.jobs < 1:
+        aparser.error("argument --jobs: must be at least 1")
+
+    if argument_ns.sample != None and argument_ns.sample < 1:
+        aparser.error("argument --sample: must be at least 1")
+
+    if argument_ns.shard != None and argument_ns.array_job == True:
+        aparser.error("argument --shard: not allowed with argument --array_job")
+
+    if argument_ns.merge == True and argument_ns.array_job == True:
+        aparser.error("argument --merge: not allowed with argument --array_job")
+
+    if argument_ns.execute == True:
+        for option in ("array_job", "incremental", "archive", "merge", "status", "plan"):
+            if getattr(argument_ns, option) not in (None, False):
+                aparser.error("argument --{0}: not allowed with argument --execute".format(option))
+        if argument_ns.max_concurrent < 1:
+            aparser.error("argument --max_concurrent: must be at least 1")
+        if argument_ns.retries < 0:
+            aparser.error("argument --retries: must not be negative")
 
+    if argument_ns.result_cache != None and argument_ns.array_job == True \
+            and argument_ns.status == False:
+        aparser.error("argument --result_cache: not allowed with argument --array_job, except with --status")
 
+    if argument_ns.resubmit != None:
+        if argument_ns.status == False:
+            aparser.error("argument --resubmit: requires argument --status")
+        if argument_ns.array_job == True:
+            aparser.error("argument --resubmit: not allowed with argument --array_job")
+
+
+def prepareArguments(argument_ns):
+    """
+    Prepare parsed arguments for splitting.
+
+    Paths are made absolute, unless no_path_translation is set, and the
+    script template is read. The attributes nlogo_file_abs,
+    script_template, script_extension and repetitions are added to
+    argument_ns.
+
+    Parameters
+    ----------
+
+    argument_ns : argparse.Namespace
+       The parsed arguments. Will be modified.
+
+    """
     # Absolute paths.
     # We create absolute paths for some files and paths in case given relative.
 
@@ -277,194 +4223,994 @@ if __name__ == "__main__":
     elif argument_ns.no_path_translation == False:
         argument_ns.csv_output_dir = os.path.abspath(argument_ns.csv_output_dir)
 
+    if argument_ns.result_cache != None and argument_ns.no_path_translation == False:
+        argument_ns.result_cache = os.path.abspath(argument_ns.result_cache)
+
+    if argument_ns.resubmit != None and argument_ns.no_path_translation == False:
+        argument_ns.resubmit = os.path.abspath(argument_ns.resubmit)
+
     # This is the absolute path name of the nlogo model file.
     if argument_ns.no_path_translation == False:
-        nlogo_file_abs = os.path.abspath(argument_ns.nlogo_file)
+        argument_ns.nlogo_file_abs = os.path.abspath(argument_ns.nlogo_file)
     else:
-        nlogo_file_abs = argument_ns.nlogo_file
+        argument_ns.nlogo_file_abs = argument_ns.nlogo_file
 
     # Check if scripts should be generated and read the template file.
+    argument_ns.script_template = None
+    argument_ns.script_extension = ""
     if argument_ns.script_template_file != None:
-        script_extension = os.path.splitext(argument_ns.script_template_file)[1]
-        try:
-            with open(argument_ns.script_template_file) as pbst:
-                script_template_string = pbst.read()
-        except IOError as ioe:
-            sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
-            exit(ioe.errno)
+        argument_ns.script_extension = os.path.splitext(argument_ns.script_template_file)[1]
+        with open(argument_ns.script_template_file) as pbst:
+            argument_ns.script_template = pbst.read()
 
-            sys.stdout.write("tst {0}: ".format(argument_ns.repetitions_per_run))
-        
+    if argument_ns.repetitions_per_run != None:
+        argument_ns.repetitions = argument_ns.repetitions_per_run[0]
+    else:
+        argument_ns.repetitions = None
 
-    # Start processing.
 
-    original_dom = minidom.parseString(experiments_xml)
-    # Need a document to create nodes.
-    # Create a new experiments document to use as container.
-    experimentDoc = minidom.getDOMImplementation().createDocument(None, "experiments", None)    
+def isSplitting(argument_ns):
+    """
+    True if the arguments ask for a split, False if they ask for a plan, a
+    merge or a status check, which do not split the experiments.
+    """
+    return argument_ns.plan == None and argument_ns.merge == False \
+        and argument_ns.status == False
 
-    # Remember which experiments were processed.
-    processed_experiments = []
-    
-    for orig_experiment in original_dom.getElementsByTagName("experiment"):
-
-
-        if argument_ns.all_experiments == True \
-                or orig_experiment.getAttribute("name") \
-                in argument_ns.experiment:
-
-            processed_experiments.append(orig_experiment.getAttribute("name"))
-
-            experiment = orig_experiment.cloneNode(deep = True)
-
-            # Store tuples of varying variables and their possible values.
-            value_tuples = []
-            num_individual_runs = 1
-
-            # Number of repetieitons.
-            # In the experiment.
-            # Read original value first. Default is to have all internal.
-            reps_in_experiment = int(experiment.getAttribute("repetitions"));
-            # Repeats of the created experiment.
-            reps_of_experiment = 1;
-            # Check if we should split experiments. An unset switch or value <= 0 means no splitting.
-            if argument_ns.repetitions_per_run != None \
-                    and argument_ns.repetitions_per_run[0] > 0:
-                original_reps = int(experiment.getAttribute("repetitions"))
-                if original_reps >= argument_ns.repetitions_per_run[0]:
-                    reps_in_experiment = int(argument_ns.repetitions_per_run[0])
-                    reps_of_experiment = int(original_reps / reps_in_experiment)
-                    if(original_reps % reps_in_experiment != 0):
-                        sys.stderr.write("Warning: Number of repetitions per experiment does not divide the number of repetitions in the nlogo file. New number of repetitions is {0} ({1} per experiment in {2} unique script(s)). Original number of repetitions per experiment: {3}.\n"\
-                                             .format((reps_in_experiment*reps_of_experiment), 
-                                                     reps_in_experiment, 
-                                                     reps_of_experiment,
-                                                     original_reps))
-
-            # Handle enumeratedValueSets
-            for evs in experiment.getElementsByTagName("enumeratedValueSet"):
-                values = evs.getElementsByTagName("value")
-                # If an enumeratedValueSet has more than a single value, it should
-                # be included in the value expansion tuples.
-                if len(values) > 1:
-                    # A tuple is the name of the variable and
-                    # A list of all the values.
-                    value_tuples.append((evs.getAttribute("variable"), 
-                                         [val.getAttribute("value") \
-                                              for val in values]
-                                         )
-                                        )
-                    num_individual_runs *= len(value_tuples[-1][1])
-                    # Remove the node.
-                    experiment.removeChild(evs)
-                    
-
-            # Handle steppedValueSet
-            for svs in experiment.getElementsByTagName("steppedValueSet"):
-                first = float(svs.getAttribute("first"))
-                last = float(svs.getAttribute("last"))
-                step = float(svs.getAttribute("step"))
-                # Add values to the tuple list.
-                value_tuples.append((svs.getAttribute("variable"),
-                                     steppedValueSet(first, step, last)
-                                     )
-                                    )
-                num_individual_runs *= len(value_tuples[-1][1])
-                # Remove node.
-                experiment.removeChild(svs)
-
-            
-            # Now create the different individual runs.
-            enum = 0
-            # Keep track of the parameter values in a run table.
-            run_table = []
-            ENR_STR = "Experiment number"
-            if num_individual_runs > 1:
-                vsgen = expandValueSets(value_tuples)
-            else:
-                # If there were no experiments to expand create a dummy-
-                # expansion just to make sure the single experiment is still
-                # created.
-                vsgen = [[]]
-
-            for exp in vsgen:
-                for exp_clone in range(reps_of_experiment):
-                    # Add header in case we are on the first row.
-                    if enum < 1:
-                        run_table.append([ENR_STR])
-                    run_table.append([enum])
-
-                    experiment_instance = experiment.cloneNode(deep = True)
-                    experiment_instance.setAttribute("repetitions",str(reps_in_experiment))
-                    for evs_name, evs_value in exp:
-                        evs = experimentDoc.createElement("enumeratedValueSet")
-                        evs.setAttribute("variable", evs_name)
-                        vnode = experimentDoc.createElement("value")
-                        vnode.setAttribute("value", str(evs_value))
-                        evs.appendChild(vnode)
-                        experiment_instance.appendChild(evs)
-
-                        # Add header in case we are on first pass.
-                        if enum < 1:
-                            run_table[0].append(evs_name)
-                        # Always add the current value.
-                        run_table[-1].append(evs_value)
-
-                    # Replace some special characters (including space) with chars that may cause problems in a file name.
-                    # This is NOT fail safe right now. Assuming some form of useful experiment naming practice.
-                    experiment_name = experiment_instance.getAttribute("name").replace(' ', '_').replace('/', '-').replace('\\','-')
-                    xml_filename = os.path.join(argument_ns.output_dir, 
-                                                argument_ns.output_prefix + experiment_name
-                                                + str(enum).zfill(len(str(num_individual_runs)))
-                                                + '.xml')
-                    try:
-                        with open(xml_filename, 'w') as xmlfile:
-                            saveExperimentToXMLFile(experiment_instance, xmlfile)
-
-                    except IOError as ioe:
-                        sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
-                        exit(ioe.errno)
-
-                    # Should a script file be created?
-                    if argument_ns.script_template_file != None:                        
-                        script_file_name = os.path.join(argument_ns.script_output_dir, 
-                                                        argument_ns.output_prefix 
-                                                        + experiment_name
-                                                        +"_script"
-                                                        + str(enum).zfill(len(str(num_individual_runs)))
-                                                        + script_extension)
-                        try:
-                            with open(script_file_name,'w') as scriptfile:
-                                createScriptFile(
-                                    scriptfile,
-                                    xml_filename, 
-                                    nlogo_file_abs, 
-                                    experiment.getAttribute("name"),
-                                    enum,
-                                    script_template_string,
-                                    csv_output_dir = argument_ns.csv_output_dir,
-                                    )
-                        except IOError as ioe:
-                            sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
-                            exit(ioe.errno)
-
-                    enum += 1
-            # Check if the run table should be saved.
-            if argument_ns.create_run_table == True:
-                run_table_file_name = os.path.join(argument_ns.output_dir, 
-                                                   argument_ns.output_prefix 
-                                                   + experiment_name
-                                                   + "_run_table.csv")
+
+def openSink(argument_ns):
+    """
+    The sink receiving the files of a split: an archive if one is asked
+    for, otherwise the file system.
+    """
+    if argument_ns.archive != None and argument_ns.array_job == False \
+            and isSplitting(argument_ns):
+        return openArchiveSink(argument_ns.archive, argument_ns.output_dir)
+    return FileSink()
+
+
+def splitExperiment(orig_experiment, argument_ns, sink, model_hash = None, stats = None):
+    """
+    Split a single experiment as asked for by the arguments.
+
+    This is what split_nlogo_experiment does for each experiment: write the
+    runs (or a manifest, or packs) and run table, or plan the split, merge
+    the outputs, check their status, or execute the runs. Progress and
+    summaries are printed.
+
+    Parameters
+    ----------
+
+    orig_experiment : xml node
+       The experiment as read from the model file. Not modified.
+
+    argument_ns : argparse.Namespace
+       Arguments checked by checkArguments and prepared by
+       prepareArguments.
+
+    sink : FileSink or ArchiveSink
+       Sink receiving the files of the runs. Not closed.
+
+    model_hash : str, optional
+       Hash of the model code (see modelCodeHash). Needed if
+       argument_ns.result_cache is set.
+
+    stats : SplitStats, optional
+       If given, the phases of the split are timed and the runs counted.
+
+    Returns
+    -------
+
+    result : dict
+       The "experiment" name, the "first_run" position and number of
+       "runs" of the split, and depending on the mode the "plan", the
+       "merge" counts, the "status", the "execute" result or the
+       incremental "state" counts.
+
+    Raises
+    ------
+
+    IOError
+       If a file can not be read or written.
+
+    ValueError
+       If the experiment is invalid.
+
+    """
+    splitting = isSplitting(argument_ns)
+
+    if stats != None:
+        started = time.time()
+
+    experiment = orig_experiment.cloneNode(deep = True)
+
+    # Number of repetitions in the created experiments, and repeats
+    # of the created experiment.
+    reps_in_experiment, reps_of_experiment = \
+        splitRepetitions(int(experiment.getAttribute("repetitions")),
+                         argument_ns.repetitions)
+
+    # Store tuples of varying variables and their possible values.
+    try:
+        value_tuples = extractValueSets(experiment, exact_steps = argument_ns.exact_steps)
+    except ValueError as err:
+        raise ValueError("{0} In experiment '{1}'.".format(err, experiment.getAttribute("name")))
+
+    # An experiment without varying variables has a single, empty,
+    # combination so the experiment is still created.
+    space = CombinationSpace(value_tuples)
+    num_individual_runs = len(space)
+    if num_individual_runs < 1:
+        sys.stderr.write("Warning: Experiment '{0}' has a value set without values and expands to no runs.\n"\
+                             .format(experiment.getAttribute("name")))
+
+    experiment_name = experimentFileName(experiment.getAttribute("name"))
+
+    # Check if only a sample of the combinations should be split.
+    selection = None
+    if argument_ns.sample != None:
+        selection = sampleCombinations(space,
+                                       argument_ns.sample,
+                                       method = argument_ns.sampling,
+                                       seed = argument_ns.seed)
+
+    # In array job mode the runs are described by a manifest and
+    # materialized by each task, rather than written here.
+    if argument_ns.array_job == True and splitting:
+        manifest_file_name = os.path.join(argument_ns.output_dir,
+                                          argument_ns.output_prefix
+                                          + experiment_name
+                                          + "_manifest.json")
+        with open(manifest_file_name, 'w') as manifest_fp:
+            num_tasks = saveArrayManifest(manifest_fp,
+                                          experiment,
+                                          value_tuples,
+                                          reps_in_experiment,
+                                          reps_of_experiment,
+                                          selection)
+
+        if argument_ns.script_template_file != None:
+            task_index = argument_ns.array_index
+            xml_filename = os.path.join(argument_ns.output_dir,
+                                        argument_ns.output_prefix
+                                        + experiment_name
+                                        + task_index
+                                        + '.xml')
+            script_file_name = os.path.join(argument_ns.script_output_dir,
+                                            argument_ns.output_prefix
+                                            + experiment_name
+                                            +"_array"
+                                            + argument_ns.script_extension)
+            materialize_cmd = '"{0}" "{1}" --materialize "{2}" "{3}" --materialize_output "{4}"'\
+                .format(sys.executable,
+                        os.path.abspath(__file__),
+                        manifest_file_name,
+                        task_index,
+                        xml_filename)
+            with open(script_file_name,'w') as scriptfile:
+                createScriptFile(
+                    scriptfile,
+                    xml_filename,
+                    argument_ns.nlogo_file_abs,
+                    experiment.getAttribute("name"),
+                    task_index,
+                    argument_ns.script_template,
+                    csv_output_dir = argument_ns.csv_output_dir,
+                    extra_keys = {
+                        "task_index" : task_index,
+                        "task_count" : num_tasks,
+                        "task_last" : num_tasks - 1,
+                        "array_job" : argument_ns.output_prefix + experiment_name,
+                        "manifest" : manifest_file_name,
+                        "materialize" : materialize_cmd
+                        },
+                    parameters = {}
+                    )
+
+    # Now create the different individual runs.
+    emitter = RunEmitter(experiment,
+                         value_tuples,
+                         reps_in_experiment,
+                         reps_of_experiment,
+                         argument_ns.output_dir,
+                         argument_ns.output_prefix,
+                         nlogo_file = argument_ns.nlogo_file_abs,
+                         script_template = argument_ns.script_template \
+                             if argument_ns.array_job == False \
+                             and (splitting or argument_ns.plan != None \
+                                      or argument_ns.resubmit != None) else None,
+                         script_extension = argument_ns.script_extension,
+                         script_output_dir = argument_ns.script_output_dir,
+                         csv_output_dir = argument_ns.csv_output_dir,
+                         dom_writer = argument_ns.dom_writer,
+                         packed = argument_ns.pack_runs != None \
+                             or argument_ns.pack_cost != None,
+                         selection = selection)
+    emitter.sink = sink
+    # Check if run outputs should be taken from, and kept in, a cache.
+    result_cache = None
+    if argument_ns.result_cache != None:
+        result_cache = ResultCache(argument_ns.result_cache, argument_ns.cache_mode)
+        emitter.result_cache = result_cache
+        emitter.model_hash = model_hash
+    if argument_ns.shard != None:
+        start, stop = shardRange(emitter.num_runs, *argument_ns.shard)
+    else:
+        start, stop = 0, emitter.num_runs
+    result = {"experiment" : experiment.getAttribute("name"),
+              "first_run" : start,
+              "runs" : stop - start}
+    if stats != None:
+        stats.add("expand", time.time() - started)
+        started = time.time()
+        if argument_ns.plan == None:
+            stats.runs += stop - start
+
+    # The cost hints must name numeric variables, checked before any run
+    # is costed.
+    if argument_ns.pack_cost != None:
+        for name, exponent in argument_ns.cost_hint:
+            if name not in emitter.space.names:
+                sys.stderr.write("Warning: Cost hint variable '{0}' does not vary in experiment '{1}'. Ignoring.\n"\
+                                     .format(name, experiment.getAttribute("name")))
+                continue
+            for value in emitter.space.values[emitter.space.names.index(name)]:
                 try:
-                    with open(run_table_file_name, 'w') as run_table_file:
-                        rt_csv_writer =  csv.writer(run_table_file)
-                        for row in run_table:
-                            rt_csv_writer.writerow(row)
-                except IOError as ioe:
-                    sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
-                    exit(ioe.errno)
+                    float(value)
+                except ValueError:
+                    raise ValueError("--cost_hint variable '{0}' has the non-numeric value {1} in experiment '{2}'."\
+                                         .format(name, value, experiment.getAttribute("name")))
+
+    # When planning, only estimate what would be written.
+    if argument_ns.plan != None:
+        result["plan"] = planSplit(emitter, start, stop,
+                                   array_job = argument_ns.array_job,
+                                   array_script_template = argument_ns.script_template \
+                                       if argument_ns.array_job == True else None,
+                                   runs_per_pack = argument_ns.pack_runs,
+                                   cost_per_pack = argument_ns.pack_cost,
+                                   cost_hints = argument_ns.cost_hint,
+                                   run_table_format = argument_ns.run_table_format \
+                                       if argument_ns.create_run_table == True else None,
+                                   seconds_per_step = argument_ns.seconds_per_step)
+        if stats != None:
+            stats.add("plan", time.time() - started)
+        return result
+
+    # When merging, collect the outputs of the runs instead of
+    # splitting.
+    if argument_ns.merge == True:
+        merged_file_name = os.path.join(argument_ns.output_dir,
+                                        argument_ns.output_prefix
+                                        + experiment_name
+                                        + "_merged"
+                                        + ("_shard{0}of{1}".format(*argument_ns.shard) \
+                                               if argument_ns.shard != None else "")
+                                        + ".csv")
+        if sys.stderr.isatty():
+            def progress(merged, total):
+                sys.stderr.write("\rMerged {0} of {1} runs.".format(merged, total))
+        else:
+            progress = None
+        counts = mergeRunOutputs(emitter, merged_file_name, start, stop,
+                                 jobs = argument_ns.jobs,
+                                 progress = progress)
+        if stats != None:
+            stats.add("merge", time.time() - started)
+        if progress != None:
+            sys.stderr.write("\n")
+        print("Experiment '{0}': {1} run(s) with {2} row(s) merged into '{3}'."\
+                  .format(experiment.getAttribute("name"),
+                          counts["runs"],
+                          counts["rows"],
+                          merged_file_name))
+        if len(counts["missing"]) > 0:
+            sys.stderr.write("Warning: The output of {0} run(s) of experiment '{1}' is missing, for instance '{2}'.\n"\
+                                 .format(len(counts["missing"]),
+                                         experiment.getAttribute("name"),
+                                         emitter.csvFileName(counts["missing"][0])))
+        if len(counts["mismatched"]) > 0:
+            sys.stderr.write("Warning: The output of {0} run(s) of experiment '{1}' has other columns than the first and was left out, for instance '{2}'.\n"\
+                                 .format(len(counts["mismatched"]),
+                                         experiment.getAttribute("name"),
+                                         emitter.csvFileName(counts["mismatched"][0])))
+        result["merge"] = counts
+        return result
+
+    # When checking the status, find the runs without complete
+    # outputs instead of splitting.
+    if argument_ns.status == True:
+        if argument_ns.array_job == True:
+            # Array tasks write outputs named by the task index.
+            csv_file_name = lambda pos: os.path.join(argument_ns.csv_output_dir,
+                                                     argument_ns.output_prefix
+                                                     + experiment_name
+                                                     + str(pos)
+                                                     + ".csv")
+        else:
+            csv_file_name = None
+        status = runStatus(emitter, start, stop, csv_file_name)
+        failed = sorted(status["missing"] + status["incomplete"])
+        if result_cache != None:
+            # Keep the complete outputs for later splits.
+            failed_positions = set(failed)
+            for pos, (enum, indices) in enumerate(emitter.runs(start, stop), start):
+                if pos not in failed_positions:
+                    result_cache.store(emitter.fingerprint(enum, indices),
+                                       csv_file_name(pos) if csv_file_name != None \
+                                           else emitter.csvFileName(enum))
+        if argument_ns.array_job == False:
+            failed = [emitter.runNumber(pos) for pos in failed]
+        print("Experiment '{0}': {1} of {2} run(s) complete, {3} missing, {4} incomplete."\
+                  .format(experiment.getAttribute("name"),
+                          status["complete"],
+                          stop - start,
+                          len(status["missing"]),
+                          len(status["incomplete"])))
+        failed_file_name = os.path.join(argument_ns.output_dir,
+                                        argument_ns.output_prefix
+                                        + experiment_name
+                                        + "_failed"
+                                        + ("_shard{0}of{1}".format(*argument_ns.shard) \
+                                               if argument_ns.shard != None else "")
+                                        + ".txt")
+        with open(failed_file_name, 'w') as failedfp:
+            failedfp.write(formatIndexList(failed) + "\n")
+        if argument_ns.resubmit != None:
+            emitter.output_dir = argument_ns.resubmit
+            emitter.script_output_dir = argument_ns.resubmit
+            for enum in failed:
+                indices = emitter.space.indices(enum // reps_of_experiment)
+                if not emitter.fromCache(enum, indices):
+                    emitter.emit(enum, indices)
+        if stats != None:
+            stats.add("status", time.time() - started)
+        result["status"] = status
+        return result
+
+    emitter.stats = stats
+
+    # Check if runs should be packed into shared setup files.
+    packs = None
+    extra_columns = ()
+    if argument_ns.pack_runs != None or argument_ns.pack_cost != None:
+        packs = packRuns(emitter, start, stop,
+                         runs_per_pack = argument_ns.pack_runs,
+                         cost_per_pack = argument_ns.pack_cost,
+                         cost_hints = argument_ns.cost_hint)
+        pack_of_run = array.array("L", [0]) * (stop - start)
+        for pack, runs in enumerate(packs):
+            for pos in runs:
+                pack_of_run[pos - start] = pack
+        extra_columns = ("Pack",)
+    elif argument_ns.array_job == True and selection != None:
+        # Array tasks are numbered by their position among the selected
+        # runs, not by run number.
+        extra_columns = ("Task",)
+
+    # Check if a run table should be saved. It is written as the
+    # runs are emitted.
+    if argument_ns.shard != None:
+        shard_postfix = "_shard{0}of{1}".format(*argument_ns.shard)
+    else:
+        shard_postfix = ""
+    run_table = None
+    if argument_ns.create_run_table == True:
+        run_table_file_base = os.path.join(argument_ns.output_dir,
+                                           argument_ns.output_prefix
+                                           + experiment_name
+                                           + "_run_table"
+                                           + shard_postfix)
+        if argument_ns.run_table_format == "binary":
+            run_table = BinaryRunTableWriter(run_table_file_base,
+                                             emitter.space,
+                                             first_run = start,
+                                             clones = reps_of_experiment,
+                                             extra_columns = extra_columns,
+                                             max_extra = len(packs) if packs != None \
+                                                 else (stop if len(extra_columns) > 0 else 0),
+                                             max_run = emitter.runNumber(stop - 1) \
+                                                 if selection != None and stop > start else None)
+        else:
+            run_table = RunTableWriter(run_table_file_base + ".csv",
+                                       emitter.space,
+                                       extra_columns = extra_columns)
+        if stats != None:
+            run_table = TimedRunTable(run_table, stats)
+
+    # Check if the split should be incremental.
+    state = None
+    if argument_ns.incremental == True and argument_ns.array_job == False:
+        state = SplitState(os.path.join(argument_ns.output_dir,
+                                        argument_ns.output_prefix
+                                        + experiment_name
+                                        + "_split_state"
+                                        + shard_postfix
+                                        + ".jsonl"),
+                           emitter.settingsHash(),
+                           start, stop)
+        emitter.previous_files = state.previous_files
+        if state.resumed > 0:
+            print("Resuming split of experiment '{0}', {1} run(s) already done."\
+                      .format(experiment.getAttribute("name"), state.resumed))
+
+    if argument_ns.array_job == True:
+        if run_table != None:
+            for pos, (enum, indices) in enumerate(emitter.runs(start, stop), start):
+                run_table.writeRun(enum, indices, (pos,) if selection != None else ())
+    elif argument_ns.execute == True:
+        if run_table != None:
+            for enum, indices in emitter.runs(start, stop):
+                run_table.writeRun(enum, indices)
+        if sys.stderr.isatty():
+            def progress(*counts):
+                sys.stderr.write("\r" + formatProgress(*counts))
+        else:
+            progress = None
+        if stats != None:
+            started = time.time()
+        executed = executeRuns(emitter,
+                               argument_ns.headless_command,
+                               start,
+                               stop,
+                               max_concurrent = argument_ns.max_concurrent,
+                               timeout = argument_ns.run_timeout,
+                               retries = argument_ns.retries,
+                               progress = progress)
+        if stats != None:
+            stats.add("execute", time.time() - started)
+        if progress != None:
+            sys.stderr.write("\n")
+        print("Experiment '{0}': {1} run(s) done, {2} failed, {3} retried, in {4:.1f} seconds."\
+                  .format(experiment.getAttribute("name"),
+                          executed["done"],
+                          len(executed["failed"]),
+                          executed["retried"],
+                          executed["seconds"]))
+        if executed["cached"] > 0:
+            print("Experiment '{0}': {1} run(s) taken from the result cache."\
+                      .format(experiment.getAttribute("name"), executed["cached"]))
+        if len(executed["failed"]) > 0:
+            sys.stderr.write("Warning: Run(s) {0} of experiment '{1}' failed, see their .log files.\n"\
+                                 .format(formatIndexList(executed["failed"]),
+                                         experiment.getAttribute("name")))
+        result["execute"] = executed
+    elif packs != None:
+        for pack, runs in enumerate(packs):
+            emitter.emitPack(pack, len(packs),
+                             [(emitter.runNumber(pos),
+                               emitter.space.indices(emitter.runNumber(pos) // reps_of_experiment)) \
+                                  for pos in runs])
+        if run_table != None:
+            for pos, (enum, indices) in enumerate(emitter.runs(start, stop), start):
+                run_table.writeRun(enum, indices, (pack_of_run[pos - start],))
+    else:
+        num_emitted = emitRuns(emitter, start, stop,
+                               jobs = argument_ns.jobs,
+                               run_table = run_table,
+                               state = state)
+        num_cached = stop - start - num_emitted - (state.resumed if state != None else 0)
+        if result_cache != None and num_cached > 0:
+            print("Experiment '{0}': {1} run(s) taken from the result cache."\
+                      .format(experiment.getAttribute("name"), num_cached))
+    if run_table != None:
+        run_table.close()
+    if state != None:
+        counts = state.close()
+        print("Experiment '{0}': {1} run(s) added, {2} changed, {3} unchanged, {4} removed."\
+                  .format(experiment.getAttribute("name"),
+                          counts["added"],
+                          counts["changed"],
+                          counts["unchanged"],
+                          counts["removed"]))
+        result["state"] = counts
+    return result
+
+
+def planSummary(results):
+    """
+    The plan of a model's experiments, with their totals, as written by
+    --plan.
+
+    Parameters
+    ----------
+
+    results : list
+       Results of splitExperiment with plans, for the experiments of the 
+       model.
+
+    Returns
+    -------
+
+    plan : dict
+       The "experiments" plans and their "total".
+
+    """
+    plans = [result["plan"] for result in results]
+    totals = {}
+    for key in ("runs", "files", "bytes", "steps", "core_hours"):
+        values = [plan[key] for plan in plans]
+        totals[key] = sum(values) if None not in values else None
+    return {"experiments" : plans, "total" : totals}
+
+
+def writePlan(plan_file, plan):
+    """
+    Write a plan as JSON to the file plan_file, or to standard output if it
+    is "-".
+    """
+    if plan_file == "-":
+        json.dump(plan, sys.stdout, indent = 2)
+        sys.stdout.write("\n")
+    else:
+        with open(plan_file, 'w') as planfp:
+            json.dump(plan, planfp, indent = 2)
+            planfp.write("\n")
+
+
+def finishSplit(argument_ns, results, write_plan = True):
+    """
+    Finish the split of a model's experiments: trim the result cache, write
+    the plan, and warn about experiments not found.
+
+    Parameters
+    ----------
+
+    argument_ns : argparse.Namespace
+       Arguments of the split, as given to splitExperiment.
+
+    results : list
+       Results of splitExperiment for the experiments of the model.
+
+    write_plan : bool, optional
+       If False the plan is not written, for instance because it is
+       written together with others.
+
+    Raises
+    ------
+
+    IOError
+       If the plan can not be written, or the cache trimmed.
+
+    """
+    if argument_ns.result_cache != None and (argument_ns.cache_max_size != None \
+                                                 or argument_ns.cache_max_age != None):
+        removed = ResultCache(argument_ns.result_cache).evict(argument_ns.cache_max_size,
+                                                              argument_ns.cache_max_age * 86400.0 \
+                                                                  if argument_ns.cache_max_age != None else None)
+        if removed > 0:
+            print("Removed {0} output(s) from the result cache.".format(removed))
+
+    if argument_ns.plan != None and write_plan:
+        writePlan(argument_ns.plan, planSummary(results))
 
     # Warn if some experiments could not be found in the file.
+    processed_experiments = [result["experiment"] for result in results]
     for ename in argument_ns.experiment:
         if ename not in processed_experiments:
             print("Warning - Experiment named '{0}' not found in model file '{1}'".format(ename, argument_ns.nlogo_file))
+
+
+def splitModel(argument_ns, sink = None, stats = None):
+    """
+    Split the experiments of a model, as split_nlogo_experiment does on the
+    command line. Library equivalent of calling the program.
+
+    Parameters
+    ----------
+
+    argument_ns : argparse.Namespace
+       Arguments checked by checkArguments and prepared by
+       prepareArguments. An argument namespace can be created with
+       buildArgumentParser().parse_args([...]).
+
+    sink : FileSink or ArchiveSink, optional
+       Sink receiving the files of the runs. If not given a sink is opened
+       (see openSink) and closed when done.
+
+    stats : SplitStats, optional
+       If given, the phases of the split are timed and the runs, files and
+       bytes counted.
+
+    Returns
+    -------
+
+    results : list
+       Results of splitExperiment for each experiment.
+
+    Raises
+    ------
+
+    IOError
+       If a file can not be read or written.
+
+    ValueError
+       If an experiment or the archive format is invalid.
+
+    """
+    model_hash = None
+    if argument_ns.result_cache != None:
+        model_hash = modelCodeHash(argument_ns.nlogo_file)
+
+    own_sink = sink == None
+    if own_sink:
+        sink = openSink(argument_ns)
+
+    if argument_ns.all_experiments == True:
+        selected_experiments = None
+    else:
+        selected_experiments = argument_ns.experiment
+
+    orig_experiments = iterateExperiments(argument_ns.nlogo_file, selected_experiments)
+    if stats != None:
+        orig_experiments = stats.timed("read", orig_experiments)
+
+    results = []
+    for orig_experiment in orig_experiments:
+        results.append(splitExperiment(orig_experiment, argument_ns, sink, model_hash, stats))
+
+    if own_sink:
+        if stats != None:
+            started = time.time()
+        sink.close()
+        if stats != None:
+            stats.add("close", time.time() - started)
+            stats.addSink(sink)
+    finishSplit(argument_ns, results)
+    return results
+
+
+def loadBatchConfig(config_fp, aparser = None):
+    """
+    Read a batch configuration.
+
+    The configuration is a JSON object with a list of "entries", each an
+    object with the "model" file, a list of "experiments" (or
+    "all_experiments" set to true), and any command line options, named as
+    on the command line without the leading dashes. Options in the object
+    "defaults" apply to all entries unless the entry sets them. Switches
+    are given as true or false, and options that may be given several
+    times as lists. For instance
+
+       {"defaults" : {"repetitions_per_run" : 10, "create_run_table" : true},
+        "entries" : [{"model" : "a.nlogo", "experiments" : ["sweep"],
+                      "output_dir" : "out/a"},
+                     {"model" : "b.nlogo", "all_experiments" : true,
+                      "output_dir" : "out/b", "archive" : "out/b.pack"}]}
+
+    Parameters
+    ----------
+
+    config_fp : file pointer
+       File opened for reading.
+
+    aparser : argparse.ArgumentParser, optional
+       Parser of the entries' options. Default is buildArgumentParser().
+
+    Returns
+    -------
+
+    entries : list
+       One argparse.Namespace per entry, checked by checkArguments.
+
+    """
+    if aparser == None:
+        aparser = buildArgumentParser()
+    config = json.load(config_fp)
+    if not isinstance(config, dict) or not isinstance(config.get("entries"), list):
+        raise ValueError("A batch configuration must be an object with a list of entries.")
+    entries = []
+    for entry in config["entries"]:
+        options = dict(config.get("defaults", {}))
+        options.update(entry)
+        if "model" not in options:
+            raise ValueError("Batch entry without a model: {0}".format(json.dumps(entry)))
+        argv = [options.pop("model")] + list(options.pop("experiments", []))
+        for option, value in sorted(options.items()):
+            if value == True and isinstance(value, bool):
+                argv.append("--" + option)
+            elif isinstance(value, list):
+                for item in value:
+                    argv += ["--" + option, str(item)]
+            elif value not in (None, False):
+                argv += ["--" + option, str(value)]
+        argument_ns = aparser.parse_args(argv)
+        checkArguments(aparser, argument_ns)
+        if len(argument_ns.experiment) < 1 and argument_ns.all_experiments == False:
+            aparser.error("batch entry for model '{0}' has no experiments and does not set all_experiments"\
+                              .format(argument_ns.nlogo_file))
+        if argument_ns.batch != None:
+            aparser.error("argument --batch: not allowed in a batch entry")
+        entries.append(argument_ns)
+    return entries
+
+
+def _splitBatchTask(task):
+    # Split one experiment of a batch in a worker process. Files for a
+    # shared archive are sent back to the main process.
+    entry, argument_ns, experiment_xml, model_hash, archived, timed = task
+    stats = SplitStats() if timed else None
+    experiment = minidom.parseString(experiment_xml).documentElement
+    sink = CollectSink() if archived else FileSink()
+    result = splitExperiment(experiment, argument_ns, sink, model_hash, stats)
+    if stats != None and not archived:
+        stats.addSink(sink)
+    return entry, result, sink.take() if archived else None, stats
+
+
+def runBatch(entries, jobs = 1, stats = None):
+    """
+    Split the experiments of several models in one process.
+
+    Each model file is read once, however many entries and experiments use
+    it. Entries with the same archive share a single archive sink. With
+    jobs > 1 the experiments are split concurrently by a pool of worker
+    processes (each splitting with a single process), and the files of
+    shared archives are written by the calling process. The plans of 
+    entries with --plan are written as a single JSON list per plan file 
+    (or standard output), with one object per entry holding its "model" 
+    and its plan as written by splitModel.
+
+    Parameters
+    ----------
+
+    entries : list
+       Argument namespaces, as from loadBatchConfig. Will be prepared by
+       prepareArguments.
+
+    jobs : int, optional
+       Number of experiments split at the same time.
+
+    stats : SplitStats, optional
+       If given, the phases of the splits are timed and the runs, files and
+       bytes counted.
+
+    Returns
+    -------
+
+    results : list
+       For each entry, the list of results of splitExperiment.
+
+    Raises
+    ------
+
+    IOError
+       If a file can not be read or written.
+
+    ValueError
+       If an experiment or archive format is invalid.
+
+    """
+    for argument_ns in entries:
+        prepareArguments(argument_ns)
+        if jobs > 1:
+            # Worker processes can not start pools of their own.
+            argument_ns.jobs = 1
+
+    # One sink per archive, shared by the entries writing to it.
+    sinks = {}
+    entry_sinks = []
+    for argument_ns in entries:
+        sink = openSink(argument_ns)
+        if isinstance(sink, ArchiveSink):
+            archive_name = os.path.abspath(argument_ns.archive)
+            if archive_name in sinks:
+                sink.close()
+                sink = sinks[archive_name]
+            sinks[archive_name] = sink
+        entry_sinks.append(sink)
+
+    # Read each model once, and collect the experiments of all entries.
+    models = collections.OrderedDict()
+    for entry, argument_ns in enumerate(entries):
+        models.setdefault(argument_ns.nlogo_file, []).append(entry)
+    tasks = []
+    model_hashes = {}
+    for nlogo_file, model_entries in models.items():
+        if stats != None:
+            started = time.time()
+        names = set()
+        for entry in model_entries:
+            if entries[entry].all_experiments == True:
+                names = None
+                break
+            names.update(entries[entry].experiment)
+        if any([entries[entry].result_cache != None for entry in model_entries]):
+            model_hashes[nlogo_file] = modelCodeHash(nlogo_file)
+        for orig_experiment in iterateExperiments(nlogo_file, names):
+            name = orig_experiment.getAttribute("name")
+            experiment_xml = orig_experiment.toxml()
+            for entry in model_entries:
+                if entries[entry].all_experiments == True or name in entries[entry].experiment:
+                    tasks.append((entry,
+                                  entries[entry],
+                                  experiment_xml,
+                                  model_hashes.get(nlogo_file),
+                                  isinstance(entry_sinks[entry], ArchiveSink),
+                                  stats != None))
+        if stats != None:
+            stats.add("read", time.time() - started)
+
+    results = [[] for argument_ns in entries]
+    pool = None
+    try:
+        if jobs > 1:
+            pool = multiprocessing.Pool(jobs)
+            for entry, result, files, task_stats in pool.imap_unordered(_splitBatchTask, tasks):
+                results[entry].append(result)
+                if task_stats != None:
+                    stats.merge(task_stats)
+                if files != None:
+                    for file_name, contents in files:
+                        entry_sinks[entry].write(file_name, contents)
+            pool.close()
+        else:
+            for entry, argument_ns, experiment_xml, model_hash, archived, timed in tasks:
+                experiment = minidom.parseString(experiment_xml).documentElement
+                results[entry].append(splitExperiment(experiment, argument_ns,
+                                                      entry_sinks[entry], model_hash,
+                                                      stats))
+    except:
+        if pool != None:
+            pool.terminate()
+        raise
+    finally:
+        if pool != None:
+            pool.join()
+
+    for sink in set(entry_sinks):
+        if stats != None:
+            started = time.time()
+        sink.close()
+        if stats != None:
+            stats.add("close", time.time() - started)
+            stats.addSink(sink)
+    plans = collections.OrderedDict()
+    for argument_ns, entry_results in zip(entries, results):
+        finishSplit(argument_ns, entry_results, write_plan = False)
+        if argument_ns.plan != None:
+            plan = collections.OrderedDict([("model", argument_ns.nlogo_file)])
+            plan.update(planSummary(entry_results))
+            plans.setdefault(argument_ns.plan, []).append(plan)
+    for plan_file, entry_plans in plans.items():
+        writePlan(plan_file, entry_plans)
+    return results
+
+
+def startProfile(argument_ns):
+    """
+    Start profiling if argument_ns.profile is set. Returns the profiler, or
+    None.
+    """
+    if argument_ns.profile == None:
+        return None
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def reportStats(argument_ns, stats, profiler = None):
+    """
+    Write the statistics of a split as asked for by --stats and 
+    --stats_json, and save the profile started by startProfile.
+    """
+    if profiler != None:
+        profiler.disable()
+        profiler.dump_stats(argument_ns.profile)
+    if stats == None:
+        return
+    stats.stop()
+    if argument_ns.stats == True:
+        sys.stderr.write(stats.format())
+    if argument_ns.stats_json != None:
+        with open(argument_ns.stats_json, 'w') as statsfp:
+            json.dump(stats.toDict(), statsfp, indent = 2)
+            statsfp.write("\n")
+
+
+def main(argv = None):
+    """
+    Run split_nlogo_experiment with the given command line arguments, by
+    default those of the program.
+    """
+    aparser = buildArgumentParser()
+    argument_ns = aparser.parse_args(argv)
+
+
+    # Materializing a single array task does not involve the model file.
+    if argument_ns.materialize != None:
+        manifest_file, task_index = argument_ns.materialize
+        try:
+            with open(manifest_file) as manifest_fp:
+                manifest = loadArrayManifest(manifest_fp)
+            if argument_ns.materialize_output == "-":
+                materializeTask(manifest, int(task_index), sys.stdout)
+            else:
+                with open(argument_ns.materialize_output, 'w') as xmlfile:
+                    materializeTask(manifest, int(task_index), xmlfile)
+        except IOError as ioe:
+            sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
+            exit(ioe.errno)
+        except (ValueError, IndexError) as err:
+            sys.stderr.write("Error: {0} '{1}'\n".format(err, manifest_file))
+            exit(1)
+        exit(0)
+
+    # Extracting an archive member does not involve the model file either.
+    if argument_ns.extract != None:
+        archive_name, member = argument_ns.extract
+        if member.isdigit():
+            member = int(member)
+        try:
+            data = extractArchiveMember(archive_name, member)
+            if argument_ns.materialize_output == "-":
+                sys.stdout.write(data.decode("utf-8"))
+            else:
+                with open(argument_ns.materialize_output, 'wb') as outfp:
+                    outfp.write(data)
+        except IOError as ioe:
+            sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
+            exit(ioe.errno)
+        except (ValueError, IndexError, KeyError, tarfile.TarError, zipfile.BadZipfile) as err:
+            sys.stderr.write("Error: {0} '{1}'\n".format(err, archive_name))
+            exit(1)
+        exit(0)
+
+    stats = None
+    if argument_ns.stats == True or argument_ns.stats_json != None:
+        stats = SplitStats()
+
+    # A batch lists the models and experiments in a configuration file.
+    if argument_ns.batch != None:
+        checkArguments(aparser, argument_ns)
+        try:
+            with open(argument_ns.batch) as config_fp:
+                entries = loadBatchConfig(config_fp, aparser)
+            profiler = startProfile(argument_ns)
+            runBatch(entries, jobs = argument_ns.jobs, stats = stats)
+            reportStats(argument_ns, stats, profiler)
+        except IOError as ioe:
+            sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
+            exit(ioe.errno)
+        except ValueError as err:
+            sys.stderr.write("Error: {0}\n".format(err))
+            exit(1)
+        exit(0)
+
+    if argument_ns.nlogo_file == None:
+        aparser.error("the following arguments are required: nlogo_file")
+
+    checkArguments(aparser, argument_ns)
+
+    # Check so that there's either experiments listed, or the all_experiments switch is set.
+    if len(argument_ns.experiment) < 1 and argument_ns.all_experiments == False \
+            and argument_ns.list_experiments == False:
+        print("Warning. You must either list one or more experiments to expand, or use the --all_experiments switch.")
+        exit(0)
+
+    # An .nlogo file contain a lot of non-xml data, only the experiments
+    # are read and parsed.
+    if argument_ns.list_experiments == True:
+        try:
+            for ename in listExperiments(argument_ns.nlogo_file):
+                print(ename)
+        except IOError as ioe:
+            sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
+            exit(ioe.errno)
+        exit(0)
+
+    try:
+        profiler = startProfile(argument_ns)
+        prepareArguments(argument_ns)
+        splitModel(argument_ns, stats = stats)
+        reportStats(argument_ns, stats, profiler)
+    except IOError as ioe:
+        sys.stderr.write(ioe.strerror + " '{0}'\n".format(ioe.filename))
+        exit(ioe.errno)
+    except ValueError as err:
+        sys.stderr.write("Error: {0}\n".format(err))
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
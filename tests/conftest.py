@@ -0,0 +1,74 @@
+import os
+
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import split_nlogo_experiment as sne
+
+
+EXPERIMENT = """<experiments>
+  <experiment name="sweep" repetitions="4" runMetricsEveryStep="false">
+    <setup>setup</setup>
+    <go>go</go>
+    <timeLimit steps="10"/>
+    <metric>count turtles</metric>
+    <enumeratedValueSet variable="density">
+      <value value="10"/>
+      <value value="20"/>
+      <value value="30"/>
+    </enumeratedValueSet>
+    <enumeratedValueSet variable="label">
+      <value value="&quot;a &amp; b&quot;"/>
+      <value value="&quot;c &lt; d&quot;"/>
+    </enumeratedValueSet>
+    <steppedValueSet variable="rate" first="1" step="1" last="3"/>
+    <enumeratedValueSet variable="constant">
+      <value value="7"/>
+    </enumeratedValueSet>
+  </experiment>
+  <experiment name="single" repetitions="1" runMetricsEveryStep="true">
+    <setup>setup</setup>
+    <go>go</go>
+    <enumeratedValueSet variable="density">
+      <value value="10"/>
+    </enumeratedValueSet>
+  </experiment>
+</experiments>"""
+
+
+def writeModel(nlogo_file, experiments = EXPERIMENT):
+    """
+    Write a small .nlogo model with the given experiments section.
+    """
+    sections = ["globals [ g ]\nto setup\nend\nto go\nend"] + [""] * 11
+    sections[7] = experiments
+    with open(nlogo_file, 'w') as nlogofp:
+        nlogofp.write("\n@#$#@#$#@\n".join(sections) + "\n")
+    return nlogo_file
+
+
+@pytest.fixture
+def model(tmp_path):
+    """
+    A small model with the experiments 'sweep' (18 combinations of four
+    repetitions) and 'single' (one run).
+    """
+    return writeModel(str(tmp_path / "model.nlogo"))
+
+
+@pytest.fixture
+def split():
+    """
+    Function splitting with the given command line arguments, as the
+    program does, and returning the results of splitModel.
+    """
+    def splitArguments(arguments):
+        aparser = sne.buildArgumentParser()
+        argument_ns = aparser.parse_args(arguments)
+        sne.checkArguments(aparser, argument_ns)
+        sne.prepareArguments(argument_ns)
+        return sne.splitModel(argument_ns)
+    return splitArguments
@@ -0,0 +1,57 @@
+import csv
+
+import io
+
+import json
+
+import os
+
+import split_nlogo_experiment as sne
+
+
+def test_sampled_array_job_run_table_has_task_column(model, tmp_path, split):
+    output_dir = str(tmp_path)
+    options = [model, "sweep", "--output_dir", output_dir, "--array_job",
+               "--sample", "5", "--seed", "2", "--repetitions_per_run", "2",
+               "--create_run_table"]
+    split(options)
+
+    with open(os.path.join(output_dir, "sweep_run_table.csv")) as csvfp:
+        rows = list(csv.reader(csvfp))
+    header = rows[0]
+    assert header[0] == sne.RunTableWriter.ENR_STR and header[-1] == "Task"
+    assert [int(row[-1]) for row in rows[1:]] == list(range(10))
+    # The run numbers are those of a complete split.
+    run_numbers = [int(row[0]) for row in rows[1:]]
+    assert run_numbers == sorted(run_numbers) and run_numbers != list(range(10))
+
+    # Row i holds the values of array task i.
+    with open(os.path.join(output_dir, "sweep_manifest.json")) as manifest_fp:
+        manifest = sne.loadArrayManifest(manifest_fp)
+    for row in rows[1:]:
+        xmlfile = io.StringIO()
+        sne.materializeTask(manifest, int(row[-1]), xmlfile)
+        for name, value in zip(header[1:-1], row[1:-1]):
+            assert '<enumeratedValueSet variable="{0}"><value value="{1}"/>'\
+                .format(name, sne._escapeAttribute(value)) in xmlfile.getvalue()
+
+
+def test_sampled_array_job_binary_run_table(model, tmp_path, split):
+    output_dir = str(tmp_path)
+    split([model, "sweep", "--output_dir", output_dir, "--array_job",
+            "--sample", "5", "--seed", "2", "--create_run_table",
+            "--run_table_format", "binary"])
+    with open(os.path.join(output_dir, "sweep_run_table.json")) as jsonfp:
+        meta = json.load(jsonfp)
+    assert meta["extra_columns"] == ["Task"]
+    assert meta["run_column"] == True
+    assert meta["columns"] == len(meta["variables"]) + 2
+
+
+def test_array_job_without_sample_has_no_task_column(model, tmp_path, split):
+    output_dir = str(tmp_path)
+    split([model, "sweep", "--output_dir", output_dir, "--array_job",
+            "--create_run_table"])
+    with open(os.path.join(output_dir, "sweep_run_table.csv")) as csvfp:
+        header = next(csv.reader(csvfp))
+    assert header == [sne.RunTableWriter.ENR_STR, "density", "label", "rate"]
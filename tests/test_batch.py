@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+import split_nlogo_experiment as sne
+
+
+def _writeConfig(tmp_path, config):
+    config_file = tmp_path / "batch.json"
+    config_file.write_text(json.dumps(config))
+    return str(config_file)
+
+
+def test_batch_plan_on_standard_output_is_one_document(model, tmp_path, capsys):
+    config_file = _writeConfig(tmp_path, {
+        "defaults" : {"plan" : True, "output_dir" : str(tmp_path)},
+        "entries" : [{"model" : model, "experiments" : ["sweep"]},
+                     {"model" : model, "all_experiments" : True,
+                      "repetitions_per_run" : 2}]})
+    with pytest.raises(SystemExit) as exit_info:
+        sne.main(["--batch", config_file])
+    assert exit_info.value.code == 0
+    plans = json.loads(capsys.readouterr().out)
+    assert [plan["model"] for plan in plans] == [model, model]
+    assert [plan["total"]["runs"] for plan in plans] == [18, 37]
+    assert [experiment["experiment"] for experiment in plans[1]["experiments"]] \
+        == ["sweep", "single"]
+
+
+def test_batch_plans_to_the_same_file(model, tmp_path):
+    plan_file = str(tmp_path / "plan.json")
+    config_file = _writeConfig(tmp_path, {
+        "defaults" : {"plan" : plan_file, "output_dir" : str(tmp_path)},
+        "entries" : [{"model" : model, "experiments" : ["sweep"]},
+                     {"model" : model, "experiments" : ["single"]}]})
+    with pytest.raises(SystemExit):
+        sne.main(["--batch", config_file])
+    with open(plan_file) as planfp:
+        plans = json.load(planfp)
+    assert [plan["total"]["runs"] for plan in plans] == [18, 1]
+
+
+@pytest.mark.parametrize("arguments", [["--create_script", "template.sh"],
+                                       ["--output_dir", "out"],
+                                       ["model.nlogo"]])
+def test_batch_rejects_entry_options_on_the_command_line(tmp_path, arguments):
+    config_file = _writeConfig(tmp_path, {"entries" : []})
+    with pytest.raises(SystemExit) as exit_info:
+        sne.main(["--batch", config_file] + arguments)
+    assert exit_info.value.code == 2
+
+
+def test_batch_allows_batch_options(tmp_path):
+    config_file = _writeConfig(tmp_path, {"entries" : []})
+    with pytest.raises(SystemExit) as exit_info:
+        sne.main(["--batch", config_file, "--jobs", "2",
+                  "--stats_json", str(tmp_path / "stats.json")])
+    assert exit_info.value.code == 0
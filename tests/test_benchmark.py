@@ -0,0 +1,46 @@
+import importlib.util
+
+import json
+
+import os
+
+import pytest
+
+
+BENCHMARK = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                         "benchmarks", "benchmark_split.py")
+
+
+@pytest.fixture(scope = "module")
+def benchmark():
+    spec = importlib.util.spec_from_file_location("benchmark_split", BENCHMARK)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("scale", [3, 4, 6])
+def test_scale_variables(benchmark, scale):
+    enumerated, stepped = benchmark.scaleVariables(scale)
+    combinations = 1
+    for variable, values in enumerated:
+        combinations *= len(values)
+    for variable, first, step, last in stepped:
+        combinations *= (float(last) - float(first)) / float(step) + 1
+    assert round(combinations) == 10 ** scale
+
+
+def test_golden_check_passes(benchmark, tmp_path):
+    work_dir = tmp_path / "work"
+    work_dir.mkdir()
+    assert benchmark.goldenCheck(benchmark.DEFAULT_SCRIPT, str(work_dir), str(tmp_path)) == []
+
+
+def test_benchmark_and_baseline(benchmark, tmp_path):
+    result = benchmark.benchmark(benchmark.DEFAULT_SCRIPT, str(tmp_path), str(tmp_path), 3)
+    assert result["runs"] == 1000 and result["files"] == 1000
+    baseline = {"results" : [dict(result, runs_per_second = result["runs_per_second"] * 2)]}
+    report, regressions = benchmark.compareBaseline([result], baseline, 0.2)
+    assert regressions == 1 and report[0].endswith("REGRESSION")
+    report, regressions = benchmark.compareBaseline([result], json.loads(json.dumps(baseline)), 0.6)
+    assert regressions == 0
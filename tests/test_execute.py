@@ -0,0 +1,187 @@
+import os
+
+import shlex
+
+import sys
+
+import time
+
+import split_nlogo_experiment as sne
+
+from conftest import writeModel
+
+
+EXPERIMENT = """<experiments>
+  <experiment name="sweep" repetitions="2" runMetricsEveryStep="false">
+    <setup>setup</setup>
+    <go>go</go>
+    <enumeratedValueSet variable="density">
+      <value value="10"/>
+      <value value="20"/>
+      <value value="30"/>
+    </enumeratedValueSet>
+    <steppedValueSet variable="rate" first="1" step="1" last="2"/>
+  </experiment>
+</experiments>"""
+
+# Stand-in for netlogo-headless.sh. Records when it ran and writes a one
+# repetition table output, except that it hangs for density 30 and rate 2.
+STAND_IN = """import os, sys, time
+csv_file, job, density, rate, clone, record_dir = sys.argv[1:]
+with open(os.path.join(record_dir, job + ".attempts"), 'a') as fp:
+    fp.write("attempt\\n")
+started = time.time()
+if density == "30" and rate == "2.0":
+    time.sleep(60)
+time.sleep(0.2)
+with open(csv_file, 'w') as fp:
+    fp.write("\\n" * 6 + '"[run number]","density","rate","[step]","count turtles"\\n')
+    fp.write('"1","{0}","{1}","10","{2}"\\n'.format(density, rate, clone))
+with open(os.path.join(record_dir, job + ".times"), 'a') as fp:
+    fp.write("{0} {1}\\n".format(started, time.time()))
+"""
+
+# Stand-in that starts a process of its own and waits for it, as
+# netlogo-headless.sh does with java. Records the pid of that process.
+SPAWNING_STAND_IN = """import os, subprocess, sys
+record_dir, job = sys.argv[1:]
+child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(60)"])
+with open(os.path.join(record_dir, job + ".pid"), 'w') as fp:
+    fp.write(str(child.pid))
+child.wait()
+"""
+
+# Runs 10 and 11 (combination 5, both clones) hang.
+HANGING = ["sweep10", "sweep11"]
+
+
+def _setup(tmp_path):
+    nlogo_file = writeModel(str(tmp_path / "model.nlogo"), EXPERIMENT)
+    stand_in = tmp_path / "stand_in.py"
+    stand_in.write_text(STAND_IN)
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    record_dir = tmp_path / "records"
+    record_dir.mkdir()
+    command = " ".join([shlex.quote(sys.executable), shlex.quote(str(stand_in)),
+                        "{csv}", "{job}", "{param:density}", "{param:rate}", "{clone}",
+                        shlex.quote(str(record_dir))])
+    return nlogo_file, str(output_dir), str(record_dir), command
+
+
+def _attempts(record_dir):
+    attempts = {}
+    for file_name in os.listdir(record_dir):
+        if file_name.endswith(".attempts"):
+            with open(os.path.join(record_dir, file_name)) as fp:
+                attempts[file_name[:-len(".attempts")]] = len(fp.readlines())
+    return attempts
+
+
+def _maxConcurrent(record_dir):
+    events = []
+    for file_name in os.listdir(record_dir):
+        if file_name.endswith(".times"):
+            with open(os.path.join(record_dir, file_name)) as fp:
+                for line in fp:
+                    started, stopped = [float(t) for t in line.split()]
+                    events += [(started, 1), (stopped, -1)]
+    # Ends sort before starts at the same time.
+    running = largest = 0
+    for moment, change in sorted(events):
+        running += change
+        largest = max(largest, running)
+    return largest
+
+
+def test_execute_concurrency_timeout_retries_cache_and_status(tmp_path, split, monkeypatch):
+    nlogo_file, output_dir, record_dir, command = _setup(tmp_path)
+    cache_dir = str(tmp_path / "cache")
+    options = [nlogo_file, "sweep", "--output_dir", output_dir,
+               "--repetitions_per_run", "1",
+               "--result_cache", cache_dir]
+    execute = options + ["--execute", "--headless_command", command,
+                         "--max_concurrent", "3",
+                         "--run_timeout", "1",
+                         "--retries", "2"]
+
+    executed = split(execute)[0]["execute"]
+    assert executed["done"] == 10
+    assert executed["failed"] == [10, 11]
+    assert executed["retried"] == 4
+    assert executed["cached"] == 0
+    attempts = _attempts(record_dir)
+    assert len(attempts) == 12
+    for job, count in attempts.items():
+        assert count == (3 if job in HANGING else 1)
+    assert 1 < _maxConcurrent(record_dir) <= 3
+    for job in HANGING:
+        with open(os.path.join(output_dir, job + ".log")) as logfp:
+            assert "Killed after 1.0 seconds." in logfp.read()
+
+    # The complete outputs are in the cache, so only the hanging runs are
+    # started again.
+    calls = []
+    monkeypatch.setattr(sys.stderr, "isatty", lambda: True)
+    monkeypatch.setattr(sne, "formatProgress", lambda *counts: calls.append(counts) or "")
+    executed = split(execute[:-2] + ["--retries", "0"])[0]["execute"]
+    assert executed["cached"] == 10
+    assert executed["done"] == 0
+    assert executed["failed"] == [10, 11]
+    attempts = _attempts(record_dir)
+    for job, count in attempts.items():
+        assert count == (4 if job in HANGING else 1)
+    # The total does not change as runs are taken from the cache, and the
+    # cached runs count as done.
+    assert set(counts[3] for counts in calls) == set([12])
+    assert calls[-1][:3] == (10, 2, 0)
+
+    status = split(options + ["--status"])[0]["status"]
+    assert status["complete"] == 10
+    with open(os.path.join(output_dir, "sweep_failed.txt")) as failedfp:
+        assert failedfp.read() == "10-11\n"
+
+
+def test_execute_never_exceeds_max_concurrent(tmp_path, split):
+    nlogo_file, output_dir, record_dir, command = _setup(tmp_path)
+    executed = split([nlogo_file, "sweep", "--output_dir", output_dir,
+                       "--repetitions_per_run", "1",
+                       "--execute", "--headless_command", command,
+                       "--max_concurrent", "2",
+                       "--run_timeout", "0.5"])[0]["execute"]
+    assert executed["done"] == 10
+    assert executed["failed"] == [10, 11]
+    assert executed["retried"] == 0
+    assert 1 < _maxConcurrent(record_dir) <= 2
+
+
+def _alive(pid):
+    # Zombies waiting to be reaped are not alive.
+    try:
+        with open("/proc/{0}/stat".format(pid)) as statfp:
+            return statfp.read().rsplit(")", 1)[1].split()[0] not in ("Z", "X")
+    except IOError:
+        return False
+
+
+def test_timeout_kills_the_processes_started_by_a_run(tmp_path, split):
+    nlogo_file, output_dir, record_dir, command = _setup(tmp_path)
+    stand_in = tmp_path / "spawning_stand_in.py"
+    stand_in.write_text(SPAWNING_STAND_IN)
+    command = " ".join([shlex.quote(sys.executable), shlex.quote(str(stand_in)),
+                        shlex.quote(record_dir), "{job}"])
+    executed = split([nlogo_file, "sweep", "--output_dir", output_dir,
+                      "--repetitions_per_run", "2",
+                      "--execute", "--headless_command", command,
+                      "--max_concurrent", "6",
+                      "--run_timeout", "1"])[0]["execute"]
+    assert executed["failed"] == list(range(6))
+    pids = []
+    for file_name in os.listdir(record_dir):
+        with open(os.path.join(record_dir, file_name)) as fp:
+            pids.append(int(fp.read()))
+    assert len(pids) == 6
+    deadline = time.time() + 5
+    while any(_alive(pid) for pid in pids) and time.time() < deadline:
+        time.sleep(0.1)
+    assert not any(_alive(pid) for pid in pids)
@@ -0,0 +1,102 @@
+import io
+
+import itertools
+
+import split_nlogo_experiment as sne
+
+from conftest import writeModel
+
+
+ESCAPED = """<experiments>
+  <experiment name="quote &quot;&amp;&quot; &lt;&gt;" repetitions="3" runMetricsEveryStep="true">
+    <setup>setup</setup>
+    <go>go</go>
+    <exitCondition>ticks &gt; 10 and count turtles &lt; 5</exitCondition>
+    <enumeratedValueSet variable="label">
+      <value value="&quot;a &amp; b&quot;"/>
+      <value value="&quot;c &lt; d &gt; e&quot;"/>
+      <value value="&quot;plain&quot;"/>
+    </enumeratedValueSet>
+    <steppedValueSet variable="rate" first="0" step="0.1" last="0.3"/>
+    <enumeratedValueSet variable="constant">
+      <value value="&quot;x &amp; y&quot;"/>
+    </enumeratedValueSet>
+  </experiment>
+  <experiment name="constant" repetitions="2" runMetricsEveryStep="false">
+    <setup>setup</setup>
+    <go>go</go>
+    <enumeratedValueSet variable="density">
+      <value value="10"/>
+    </enumeratedValueSet>
+  </experiment>
+  <experiment name="empty" repetitions="1" runMetricsEveryStep="false"/>
+</experiments>"""
+
+NLOGOX = """<?xml version="1.0" encoding="UTF-8"?>
+<model version="NetLogo 7.0.0">
+  <code>to setup end to go end</code>
+  <experiments>
+    <experiment name="sweep" repetitions="2" sequentialRunOrder="true" runMetricsEveryStep="true">
+      <setup>setup</setup>
+      <go>go</go>
+      <metrics>
+        <metric>count turtles</metric>
+      </metrics>
+      <constants>
+        <enumeratedValueSet variable="label">
+          <value value="&quot;a &amp; b&quot;"></value>
+          <value value="&quot;c&quot;"></value>
+        </enumeratedValueSet>
+        <steppedValueSet variable="rate" first="1" step="1" last="3"></steppedValueSet>
+        <enumeratedValueSet variable="constant">
+          <value value="5"></value>
+        </enumeratedValueSet>
+      </constants>
+    </experiment>
+  </experiments>
+</model>
+"""
+
+
+def _checkExperiments(nlogo_file, expected):
+    checked = []
+    for experiment in sne.iterateExperiments(nlogo_file):
+        value_tuples = sne.extractValueSets(experiment)
+        writer = sne.ExperimentWriter(experiment, value_tuples)
+        ranges = [range(len(values)) for name, values in value_tuples]
+        for indices in itertools.product(*ranges):
+            for repetitions in (1, 7):
+                combination = [(name, values[i]) for (name, values), i \
+                                   in zip(value_tuples, indices)]
+                dom_file = io.StringIO()
+                sne.saveExperimentToXMLFile(
+                    sne.experimentInstance(experiment, combination, repetitions,
+                                           experiment.ownerDocument),
+                    dom_file)
+                assert writer.render(list(indices), repetitions) == dom_file.getvalue()
+        checked.append(experiment.getAttribute("name"))
+    assert checked == expected
+
+
+def test_writer_matches_dom_with_escaping(tmp_path):
+    nlogo_file = writeModel(str(tmp_path / "escaped.nlogo"), ESCAPED)
+    _checkExperiments(nlogo_file, ['quote "&" <>', "constant", "empty"])
+
+
+def test_writer_matches_dom_nlogox(tmp_path):
+    nlogo_file = str(tmp_path / "model.nlogox")
+    with open(nlogo_file, 'w') as nlogofp:
+        nlogofp.write(NLOGOX)
+    _checkExperiments(nlogo_file, ["sweep"])
+
+
+def test_nlogox_value_sets_go_in_constants(tmp_path):
+    nlogo_file = str(tmp_path / "model.nlogox")
+    with open(nlogo_file, 'w') as nlogofp:
+        nlogofp.write(NLOGOX)
+    experiment = next(sne.iterateExperiments(nlogo_file))
+    writer = sne.ExperimentWriter(experiment, sne.extractValueSets(experiment))
+    xml = writer.render([0, 2], 2)
+    constants = xml[xml.index("<constants>"):xml.index("</constants>")]
+    assert '<enumeratedValueSet variable="label"><value value="&quot;a &amp; b&quot;"/></enumeratedValueSet>' in constants
+    assert '<enumeratedValueSet variable="rate"><value value="3.0"/></enumeratedValueSet>' in constants
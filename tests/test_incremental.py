@@ -0,0 +1,61 @@
+import json
+
+import os
+
+
+def _stateLines(output_dir):
+    with open(os.path.join(output_dir, "sweep_split_state.jsonl")) as statefp:
+        return [json.loads(line) for line in statefp]
+
+
+def _tornPartial(output_dir, records):
+    # The partial state of a split interrupted while writing the record
+    # after the given number of records.
+    state_file = os.path.join(output_dir, "sweep_split_state.jsonl")
+    with open(state_file) as statefp:
+        lines = statefp.readlines()
+    with open(state_file + ".partial", 'w') as partialfp:
+        partialfp.writelines(lines[:1 + records])
+        partialfp.write(lines[1 + records][:len(lines[1 + records]) // 2])
+
+
+def test_incremental_rerun_is_unchanged(model, tmp_path, split):
+    options = [model, "sweep", "--output_dir", str(tmp_path), "--incremental"]
+    assert split(options)[0]["state"]["added"] == 18
+    modified = os.path.getmtime(str(tmp_path / "sweep00.xml"))
+    os.utime(str(tmp_path / "sweep00.xml"), (modified - 100, modified - 100))
+    counts = split(options)[0]["state"]
+    assert counts == {"added" : 0, "changed" : 0, "unchanged" : 18, "removed" : 0}
+    # Unchanged files are not written again.
+    assert os.path.getmtime(str(tmp_path / "sweep00.xml")) == modified - 100
+
+
+def test_incremental_detects_changed_runs(model, tmp_path, split):
+    options = [model, "sweep", "--output_dir", str(tmp_path), "--incremental"]
+    split(options)
+    counts = split(options + ["--repetitions_per_run", "2"])[0]["state"]
+    assert counts["added"] + counts["changed"] == 36
+    assert counts["unchanged"] == 0
+
+
+def test_resume_after_torn_line_then_rerun(model, tmp_path, split, capsys):
+    options = [model, "sweep", "--output_dir", str(tmp_path), "--incremental"]
+    split(options)
+    _tornPartial(str(tmp_path), 7)
+    os.remove(str(tmp_path / "sweep_split_state.jsonl"))
+    for file_name in os.listdir(str(tmp_path)):
+        if file_name.endswith(".xml") and int(file_name[5:7]) >= 7:
+            os.remove(str(tmp_path / file_name))
+
+    # The resumed split only writes the runs not recorded.
+    counts = split(options)[0]["state"]
+    assert "7 run(s) already done" in capsys.readouterr().out
+    assert counts["added"] == 18
+    assert len([name for name in os.listdir(str(tmp_path)) if name.endswith(".xml")]) == 18
+    lines = _stateLines(str(tmp_path))
+    assert lines[-1] == {"complete" : True}
+    assert sorted([line["run"] for line in lines[1:-1]]) == list(range(18))
+
+    # All runs are recorded, so a rerun finds them unchanged.
+    counts = split(options)[0]["state"]
+    assert counts == {"added" : 0, "changed" : 0, "unchanged" : 18, "removed" : 0}
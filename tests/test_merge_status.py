@@ -0,0 +1,108 @@
+import csv
+
+import os
+
+import split_nlogo_experiment as sne
+
+
+OPTIONS = ["--repetitions_per_run", "2"]
+
+MISSING = 3
+INCOMPLETE = 5
+MISMATCHED = 7
+
+
+def _writeOutputs(output_dir):
+    # BehaviorSpace table outputs of the 36 runs, two repetitions each, 
+    # except for a missing, an incomplete and a mismatched output.
+    with open(os.path.join(output_dir, "sweep_run_table.csv")) as csvfp:
+        table = list(csv.reader(csvfp))
+    for row in table[1:]:
+        enum = int(row[0])
+        if enum == MISSING:
+            continue
+        header = ["[run number]", "density", "label", "rate", "[step]", "count turtles"]
+        if enum == MISMATCHED:
+            header.append("mean energy")
+        with open(os.path.join(output_dir, "sweep{0:02d}.csv".format(enum)), 'w', newline = "") as outfp:
+            outfp.write("\n" * sne.BEHAVIORSPACE_PREAMBLE_LINES)
+            writer = csv.writer(outfp, quoting = csv.QUOTE_ALL)
+            writer.writerow(header)
+            for rep in range(1 if enum == INCOMPLETE else 2):
+                writer.writerow([2 * enum + rep + 1] + row[1:] + [10, enum * 10 + rep]
+                                + ([1.5] if enum == MISMATCHED else []))
+    return table
+
+
+def test_merge_prefixes_rows_with_run_values(model, tmp_path, split):
+    output_dir = str(tmp_path)
+    split([model, "sweep", "--output_dir", output_dir, "--create_run_table"] + OPTIONS)
+    table = _writeOutputs(output_dir)
+
+    counts = split([model, "sweep", "--output_dir", output_dir, "--merge"] + OPTIONS)[0]["merge"]
+    assert counts["missing"] == [MISSING]
+    assert counts["mismatched"] == [MISMATCHED]
+    assert counts["runs"] == 34
+    assert counts["rows"] == 2 * 34 - 1
+    with open(os.path.join(output_dir, "sweep_merged.csv")) as mergedfp:
+        merged = list(csv.reader(mergedfp))
+    assert merged[0] == table[0] + ["[run number]", "[step]", "count turtles"]
+    expected = []
+    for row in table[1:]:
+        enum = int(row[0])
+        if enum in (MISSING, MISMATCHED):
+            continue
+        for rep in range(1 if enum == INCOMPLETE else 2):
+            expected.append(row + [str(2 * enum + rep + 1), "10", str(enum * 10 + rep)])
+    assert merged[1:] == expected
+    assert not os.path.exists(os.path.join(output_dir, "sweep_merged.csv.progress"))
+
+
+def test_interrupted_merge_resumes(model, tmp_path, split, monkeypatch):
+    output_dir = str(tmp_path)
+    split([model, "sweep", "--output_dir", output_dir, "--create_run_table"] + OPTIONS)
+    _writeOutputs(output_dir)
+    merge = [model, "sweep", "--output_dir", output_dir, "--merge", "--jobs", "2"] + OPTIONS
+    split(merge)
+    with open(os.path.join(output_dir, "sweep_merged.csv")) as mergedfp:
+        complete = mergedfp.read()
+
+    # Interrupt the merge after the second chunk.
+    merge_run_outputs = sne.mergeRunOutputs
+    def interrupted(*args, **kwargs):
+        def progress(merged, total):
+            if merged >= 10:
+                raise KeyboardInterrupt()
+        return merge_run_outputs(*args, **dict(kwargs, chunk_size = 5, progress = progress))
+    monkeypatch.setattr(sne, "mergeRunOutputs", interrupted)
+    try:
+        split(merge)
+    except KeyboardInterrupt:
+        pass
+    assert os.path.exists(os.path.join(output_dir, "sweep_merged.csv.progress"))
+    monkeypatch.undo()
+
+    counts = split(merge)[0]["merge"]
+    assert counts["runs"] == 34
+    with open(os.path.join(output_dir, "sweep_merged.csv")) as mergedfp:
+        assert mergedfp.read() == complete
+
+
+def test_status_finds_missing_and_incomplete_outputs(model, tmp_path, split):
+    output_dir = str(tmp_path)
+    split([model, "sweep", "--output_dir", output_dir, "--create_run_table"] + OPTIONS)
+    _writeOutputs(output_dir)
+
+    status = split([model, "sweep", "--output_dir", output_dir, "--status"] + OPTIONS)[0]["status"]
+    assert status["complete"] == 34
+    assert status["missing"] == [MISSING]
+    assert status["incomplete"] == [INCOMPLETE]
+    with open(os.path.join(output_dir, "sweep_failed.txt")) as failedfp:
+        assert failedfp.read() == "{0},{1}\n".format(MISSING, INCOMPLETE)
+
+    # --resubmit writes the setup files of only the failed runs.
+    resubmit_dir = tmp_path / "resubmit"
+    resubmit_dir.mkdir()
+    split([model, "sweep", "--output_dir", output_dir, "--status",
+           "--resubmit", str(resubmit_dir)] + OPTIONS)
+    assert sorted(os.listdir(str(resubmit_dir))) == ["sweep03.xml", "sweep05.xml"]
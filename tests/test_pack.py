@@ -0,0 +1,32 @@
+import os
+
+import pytest
+
+import split_nlogo_experiment as sne
+
+
+def test_cost_hint_packs_balanced_runs(model, tmp_path, split):
+    output_dir = str(tmp_path / "out")
+    os.mkdir(output_dir)
+    results = split([model, "sweep", "--output_dir", output_dir,
+                     "--pack_cost", "2000", "--cost_hint", "density"])
+    assert results[0]["runs"] == 18
+    # The total cost is 40 * (10 + 20 + 30) * 6 = 14400.
+    assert len([name for name in os.listdir(output_dir) if name.endswith(".xml")]) == 8
+
+
+@pytest.mark.parametrize("plan", [False, True])
+def test_non_numeric_cost_hint_is_an_error(model, tmp_path, capsys, plan):
+    output_dir = str(tmp_path / "out")
+    os.mkdir(output_dir)
+    options = [model, "sweep", "--output_dir", output_dir,
+               "--pack_cost", "100", "--cost_hint", "label"]
+    if plan == True:
+        options += ["--plan", str(tmp_path / "plan.json")]
+    with pytest.raises(SystemExit) as exit_info:
+        sne.main(options)
+    assert exit_info.value.code == 1
+    error = capsys.readouterr().err
+    assert "Error: --cost_hint variable 'label' has the non-numeric value" in error
+    assert "could not convert" not in error
+    assert os.listdir(output_dir) == []
@@ -0,0 +1,52 @@
+import json
+
+import os
+
+import split_nlogo_experiment as sne
+
+
+TEMPLATE = "#!/bin/sh\n# {job}\nnetlogo --setup-file {setup} --table {csv}\n"
+
+
+def _plan(model, output_dir, options):
+    plan_file = os.path.join(output_dir, os.pardir, "plan.json")
+    sne.main([model, "sweep", "--output_dir", output_dir, "--plan", plan_file] + options)
+    with open(plan_file) as planfp:
+        return json.load(planfp)["total"]
+
+
+def _written(output_dir):
+    names = os.listdir(output_dir)
+    return len(names), sum([os.path.getsize(os.path.join(output_dir, name)) for name in names])
+
+
+def test_plan_matches_split_with_script_template(model, tmp_path):
+    template_file = tmp_path / "template.sh"
+    template_file.write_text(TEMPLATE)
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    options = ["--create_script", str(template_file), "--create_run_table",
+               "--repetitions_per_run", "2"]
+
+    total = _plan(model, str(output_dir), options)
+    assert os.listdir(str(output_dir)) == []
+    sne.main([model, "sweep", "--output_dir", str(output_dir)] + options)
+
+    num_files, num_bytes = _written(str(output_dir))
+    assert total["runs"] == 36
+    assert total["files"] == num_files == 2 * 36 + 1
+    # The sizes are projected from the first and last run, whose values
+    # differ in length here.
+    assert abs(total["bytes"] - num_bytes) <= 0.01 * num_bytes
+
+
+def test_plan_matches_split_without_script_template(model, tmp_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+
+    total = _plan(model, str(output_dir), [])
+    sne.main([model, "sweep", "--output_dir", str(output_dir)])
+
+    num_files, num_bytes = _written(str(output_dir))
+    assert total["files"] == num_files == 18
+    assert abs(total["bytes"] - num_bytes) <= 0.01 * num_bytes
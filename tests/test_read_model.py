@@ -0,0 +1,62 @@
+import os
+
+import xml.sax
+
+import pytest
+
+import split_nlogo_experiment as sne
+
+from conftest import writeModel
+
+from test_experiment_writer import NLOGOX
+
+
+# Experiments sections at the end of a model file that are not well 
+# formed XML. Reading stops before them when only experiments before them
+# are asked for.
+BROKEN = "<experimentsFoo/>\n<experiments><experiment name=\"broken\"><oops></experiments>"
+
+
+def _writeModelWithTrailer(nlogo_file, trailer):
+    writeModel(nlogo_file)
+    with open(nlogo_file, 'a') as nlogofp:
+        nlogofp.write(trailer)
+    return nlogo_file
+
+
+def test_reading_stops_once_the_named_experiments_are_found(tmp_path):
+    nlogo_file = _writeModelWithTrailer(str(tmp_path / "model.nlogo"), BROKEN)
+    names = [node.getAttribute("name") \
+                 for node in sne.iterateExperiments(nlogo_file, names = ["single", "sweep"])]
+    assert names == ["sweep", "single"]
+    with pytest.raises(xml.sax.SAXParseException):
+        list(sne.iterateExperiments(nlogo_file))
+    with pytest.raises(xml.sax.SAXParseException):
+        list(sne.iterateExperiments(nlogo_file, names = ["missing"]))
+
+
+def test_split_ignores_broken_sections_after_the_experiment(tmp_path, split):
+    nlogo_file = _writeModelWithTrailer(str(tmp_path / "model.nlogo"), BROKEN)
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    results = split([nlogo_file, "sweep", "--output_dir", str(output_dir)])
+    assert [result["runs"] for result in results] == [18]
+
+
+def test_list_and_split_nlogox(tmp_path, split):
+    nlogo_file = str(tmp_path / "model.nlogox")
+    with open(nlogo_file, 'w') as nlogofp:
+        nlogofp.write(NLOGOX)
+    assert sne.listExperiments(nlogo_file) == ["sweep"]
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    split([nlogo_file, "sweep", "--output_dir", str(output_dir), "--create_run_table"])
+    names = sorted(os.listdir(str(output_dir)))
+    assert names == ["sweep{0}.xml".format(run) for run in range(6)] + ["sweep_run_table.csv"]
+    with open(os.path.join(str(output_dir), "sweep_run_table.csv")) as csvfp:
+        assert csvfp.read().splitlines()[1:3] == ['0,"""a & b""",1.0', '1,"""a & b""",2.0']
+    with open(os.path.join(str(output_dir), "sweep5.xml")) as xmlfp:
+        xml_text = xmlfp.read()
+    assert 'repetitions="2"' in xml_text
+    assert '<steppedValueSet' not in xml_text
+    assert '<enumeratedValueSet variable="rate"><value value="3.0"/>' in xml_text
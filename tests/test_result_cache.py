@@ -0,0 +1,93 @@
+import os
+
+import stat
+
+import split_nlogo_experiment as sne
+
+
+FINGERPRINT = "ab" + "0" * 38
+
+
+def _cacheWithOutput(tmp_path, mode = "copy"):
+    output = tmp_path / "run0.csv"
+    output.write_text("original\n")
+    cache = sne.ResultCache(str(tmp_path / "cache"), mode)
+    assert cache.store(FINGERPRINT, str(output))
+    output.unlink()
+    return cache, str(output)
+
+
+def test_default_mode_copies(tmp_path):
+    cache = sne.ResultCache(str(tmp_path / "cache"))
+    assert cache.mode == "copy"
+    assert sne.buildArgumentParser().parse_args([]).cache_mode == "copy"
+
+
+def test_copied_output_can_be_rewritten(tmp_path):
+    cache, output = _cacheWithOutput(tmp_path)
+    assert cache.place(FINGERPRINT, output)
+    with open(output, 'w') as outfp:
+        outfp.write("rewritten\n")
+    with open(cache.path(FINGERPRINT)) as cachedfp:
+        assert cachedfp.read() == "original\n"
+
+
+def test_cached_outputs_are_read_only(tmp_path):
+    cache, output = _cacheWithOutput(tmp_path)
+    mode = os.stat(cache.path(FINGERPRINT)).st_mode
+    assert mode & (stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH) == 0
+
+
+def test_lookup_does_not_touch_linked_outputs(tmp_path):
+    cache, output = _cacheWithOutput(tmp_path, "link")
+    assert cache.place(FINGERPRINT, output)
+    assert os.path.samefile(output, cache.path(FINGERPRINT))
+    os.utime(output, (1000000000, 1000000000))
+    assert cache.lookup(FINGERPRINT) == cache.path(FINGERPRINT)
+    assert os.stat(output).st_mtime == 1000000000
+
+
+def test_place_replaces_existing_output(tmp_path):
+    cache, output = _cacheWithOutput(tmp_path, "link")
+    with open(output, 'w') as outfp:
+        outfp.write("partial\n")
+    assert cache.place(FINGERPRINT, output)
+    with open(output) as outfp:
+        assert outfp.read() == "original\n"
+    # Copying over a linked output removes the link first.
+    sne.ResultCache(cache.directory, "copy").place(FINGERPRINT, output)
+    assert not os.path.samefile(output, cache.path(FINGERPRINT))
+
+
+def test_linked_outputs_are_evicted_least_recently_used_first(tmp_path):
+    cache = sne.ResultCache(str(tmp_path / "cache"), "link")
+    fingerprints = ["ab" + str(n) * 38 for n in range(3)]
+    for n, fingerprint in enumerate(fingerprints):
+        output = tmp_path / "run{0}.csv".format(n)
+        output.write_text("output\n")
+        assert cache.store(fingerprint, str(output))
+        output.unlink()
+        assert cache.place(fingerprint, str(output))
+        # Stored and used long ago, in order.
+        os.utime(cache._usedPath(cache.path(fingerprint)), (1000000000 + n, 1000000000 + n))
+    # The oldest output is used again, so the second oldest is evicted.
+    assert cache.lookup(fingerprints[0]) != None
+    assert cache.evict(max_bytes = 2 * len("output\n")) == 1
+    assert [cache.lookup(fingerprint) != None for fingerprint in fingerprints] == [True, False, True]
+    assert not os.path.exists(cache._usedPath(cache.path(fingerprints[1])))
+    # The linked output of the evicted run is kept.
+    assert os.path.exists(str(tmp_path / "run1.csv"))
+
+    assert cache.evict(max_age = 3600) == 0
+
+
+def test_evict_without_used_files(tmp_path):
+    cache, output = _cacheWithOutput(tmp_path)
+    # Outputs stored by earlier versions were last used when modified.
+    os.remove(cache._usedPath(cache.path(FINGERPRINT)))
+    os.utime(cache.path(FINGERPRINT), (1000000000, 1000000000))
+    orphan = cache._usedPath(cache.path("ab" + "1" * 38))
+    open(orphan, 'w').close()
+    assert cache.evict(max_age = 3600) == 1
+    assert cache.lookup(FINGERPRINT) == None
+    assert not os.path.exists(orphan)
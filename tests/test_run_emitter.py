@@ -0,0 +1,19 @@
+import split_nlogo_experiment as sne
+
+
+def _emitter(model, tmp_path):
+    experiment = next(sne.iterateExperiments(model, ["sweep"]))
+    value_tuples = sne.extractValueSets(experiment)
+    return sne.RunEmitter(experiment, value_tuples, 4, 1, str(tmp_path), "")
+
+
+def test_time_limit(model, tmp_path):
+    assert _emitter(model, tmp_path).timeLimit() == 10
+
+
+def test_run_cost_does_not_walk_the_experiment(model, tmp_path, monkeypatch):
+    emitter = _emitter(model, tmp_path)
+    # The time limit is read once, when the emitter is created.
+    monkeypatch.setattr(emitter.experiment, "getElementsByTagName", None)
+    assert emitter.runCost([0, 1, 2]) == 40.0
+    assert emitter.runCost([2, 0, 2], [("density", 1), ("rate", 2)]) == 40.0 * 30 * 9
@@ -0,0 +1,73 @@
+import array
+
+import csv
+
+import json
+
+import os
+
+import sys
+
+import pytest
+
+import split_nlogo_experiment as sne
+
+
+def _tableFile(output_dir, extension):
+    # Sharded tables are named by the shard.
+    names = [name for name in os.listdir(output_dir) \
+                 if name.startswith("sweep_run_table") and name.endswith(extension)]
+    assert len(names) == 1
+    return os.path.join(output_dir, names[0])
+
+
+def _readCsv(output_dir):
+    with open(_tableFile(output_dir, ".csv")) as csvfp:
+        return list(csv.reader(csvfp))
+
+
+def _readBinary(output_dir):
+    # The CSV rows of a binary run table.
+    with open(_tableFile(output_dir, ".json")) as jsonfp:
+        meta = json.load(jsonfp)
+    assert meta["dtype"][:2] == "<u"
+    for typecode in "BHILQ":
+        if array.array(typecode).itemsize == int(meta["dtype"][2:]):
+            break
+    table = array.array(typecode)
+    with open(_tableFile(output_dir, ".bin"), 'rb') as binfp:
+        table.frombytes(binfp.read())
+    if sys.byteorder != "little":
+        table.byteswap()
+    columns = meta["columns"]
+    assert len(table) == meta["runs"] * columns
+    header = [sne.RunTableWriter.ENR_STR] + meta["variables"] + meta["extra_columns"]
+    rows = [header]
+    num_variables = len(meta["variables"])
+    for row_number in range(meta["runs"]):
+        row = list(table[row_number * columns:(row_number + 1) * columns])
+        if meta["run_column"]:
+            enum = row.pop(0)
+        else:
+            enum = meta["first_run"] + row_number
+        values = [meta["values"][pos][index] for pos, index in enumerate(row[:num_variables])]
+        rows.append([str(value) for value in [enum] + values + row[num_variables:]])
+    return rows
+
+
+@pytest.mark.parametrize("options", [[],
+                                     ["--repetitions_per_run", "2"],
+                                     ["--shard", "2/3"],
+                                     ["--pack_runs", "4"],
+                                     ["--array_job", "--sample", "5", "--seed", "2"]])
+def test_binary_run_table_reads_back_as_csv_run_table(model, tmp_path, split, options):
+    tables = []
+    for run_table_format in ["csv", "binary"]:
+        output_dir = tmp_path / run_table_format
+        output_dir.mkdir()
+        split([model, "sweep", "--output_dir", str(output_dir), "--create_run_table",
+               "--run_table_format", run_table_format] + options)
+        tables.append(output_dir)
+    csv_rows = _readCsv(str(tables[0]))
+    assert len(csv_rows) > 1
+    assert _readBinary(str(tables[1])) == csv_rows
@@ -0,0 +1,34 @@
+import pytest
+
+import split_nlogo_experiment as sne
+
+
+SPACE = sne.CombinationSpace([("a", list(range(20))),
+                              ("b", list(range(25))),
+                              ("c", list(range(40)))])
+
+
+@pytest.mark.parametrize("method", sne.SAMPLING_METHODS)
+@pytest.mark.parametrize("sample_size", [1, 100, 9999, 10000, 19999])
+def test_sample_distinct_and_sorted(method, sample_size):
+    combinations = sne.sampleCombinations(SPACE, sample_size, method, seed = 3)
+    assert len(combinations) == sample_size
+    assert combinations == sorted(set(combinations))
+    assert 0 <= combinations[0] and combinations[-1] < len(SPACE)
+
+
+@pytest.mark.parametrize("method", sne.SAMPLING_METHODS)
+def test_sample_reproducible(method):
+    assert sne.sampleCombinations(SPACE, 15000, method, seed = 1) \
+        == sne.sampleCombinations(SPACE, 15000, method, seed = 1)
+
+
+def test_sample_all():
+    assert sne.sampleCombinations(SPACE, 20000, "halton") == list(range(20000))
+
+
+def test_halton_near_size_of_space_leaves_out_halton_points():
+    # Selecting all but ten combinations leaves out ten Halton points.
+    kept = set(sne.sampleCombinations(SPACE, len(SPACE) - 10, "halton"))
+    assert set(range(len(SPACE))) - kept \
+        == set(sne.sampleCombinations(SPACE, 10, "halton"))
@@ -0,0 +1,26 @@
+import io
+
+import split_nlogo_experiment as sne
+
+
+def _script(template, parameters = None):
+    script_fp = io.StringIO()
+    sne.createScriptFile(script_fp, "/runs/sweep3.xml", "/models/model.nlogo",
+                         "sweep", 3, template, csv_output_dir = "/out",
+                         extra_keys = {"clone" : 1}, parameters = parameters)
+    return script_fp.getvalue()
+
+
+def test_create_script_file():
+    assert _script("{job} {combination} {csv} {clone} {param:density}\n", {"density" : 20}) \
+        == "sweep3 3 /out/sweep3.csv 1 20\n"
+
+
+def test_compiled_templates_are_bounded():
+    sne._compiledTemplate.cache_clear()
+    for i in range(1000):
+        assert _script("{job} " + str(i)) == "sweep3 " + str(i)
+    assert sne._compiledTemplate.cache_info().currsize <= 64
+    # A template used again is not compiled again.
+    _script("{job} 999")
+    assert sne._compiledTemplate.cache_info().hits >= 1
@@ -0,0 +1,68 @@
+import csv
+
+import os
+
+import pytest
+
+
+TEMPLATE = "#!/bin/sh\n# {job} {combination} {param:density} {param:label}\nnetlogo --setup-file {setup} --table {csv}\n"
+
+
+def _files(output_dir):
+    # The scripts hold the paths of the output directory, which differ.
+    contents = {}
+    for name in os.listdir(output_dir):
+        with open(os.path.join(output_dir, name), 'rb') as fp:
+            contents[name] = fp.read().replace(output_dir.encode("utf-8"), b"OUTPUT_DIR")
+    return contents
+
+
+def _runTableRows(output_dir, name):
+    with open(os.path.join(output_dir, name)) as csvfp:
+        return list(csv.reader(csvfp))
+
+
+def _splitInto(split, model, output_dir, options):
+    os.mkdir(output_dir)
+    split([model, "sweep", "--output_dir", output_dir] + options)
+    return _files(output_dir)
+
+
+@pytest.fixture
+def options(tmp_path):
+    template_file = tmp_path / "template.sh"
+    template_file.write_text(TEMPLATE)
+    return ["--create_script", str(template_file), "--create_run_table",
+            "--repetitions_per_run", "2"]
+
+
+def test_jobs_match_serial_split(model, tmp_path, split, options):
+    serial = _splitInto(split, model, str(tmp_path / "serial"), options)
+    assert len(serial) == 2 * 36 + 1
+    for jobs in ["2", "3"]:
+        assert _splitInto(split, model, str(tmp_path / ("jobs" + jobs)),
+                          options + ["--jobs", jobs]) == serial
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_shards_together_match_serial_split(model, tmp_path, split, options, jobs):
+    serial_dir = str(tmp_path / "serial")
+    serial = _splitInto(split, model, serial_dir, options)
+    shard_dir = str(tmp_path / "shards")
+    os.mkdir(shard_dir)
+    for shard in range(1, 4):
+        split([model, "sweep", "--output_dir", shard_dir, "--shard", "{0}/3".format(shard),
+               "--jobs", jobs] + options)
+    sharded = _files(shard_dir)
+
+    # The setup files and scripts are the same, and the run tables of the
+    # shards together are the run table of the serial split.
+    table_names = ["sweep_run_table_shard{0}of3.csv".format(shard) for shard in range(1, 4)]
+    rows = _runTableRows(serial_dir, "sweep_run_table.csv")
+    shard_rows = [_runTableRows(shard_dir, name) for name in table_names]
+    assert all(table[0] == rows[0] for table in shard_rows)
+    assert rows[1:] == sum([table[1:] for table in shard_rows], [])
+    for name in table_names:
+        del sharded[name]
+    del serial["sweep_run_table.csv"]
+    assert sharded == serial
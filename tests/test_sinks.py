@@ -0,0 +1,21 @@
+import os
+
+import split_nlogo_experiment as sne
+
+
+def test_file_sink_counts_bytes_on_disk(tmp_path):
+    sink = sne.FileSink()
+    file_names = [str(tmp_path / "ascii.xml"), str(tmp_path / "non_ascii.xml")]
+    sink.write(file_names[0], "<value value=\"plain\"/>\n")
+    sink.write(file_names[1], "<value value=\"åäö – λ\"/>\n")
+    sink.close()
+    assert sink.files_written == 2
+    assert sink.bytes_written == sum([os.path.getsize(name) for name in file_names])
+
+
+def test_archive_sink_counts_encoded_bytes(tmp_path):
+    sink = sne.openArchiveSink(str(tmp_path / "runs.pack"), str(tmp_path))
+    contents = "<value value=\"åäö\"/>\n"
+    sink.write(str(tmp_path / "run0.xml"), contents)
+    sink.close()
+    assert sink.bytes_written == len(contents.encode("utf-8"))
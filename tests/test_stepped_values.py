@@ -0,0 +1,43 @@
+import os
+
+import split_nlogo_experiment as sne
+
+from conftest import writeModel
+
+
+EXPERIMENT = """<experiments>
+  <experiment name="steps" repetitions="1" runMetricsEveryStep="false">
+    <setup>setup</setup>
+    <go>go</go>
+    <steppedValueSet variable="rate" first="0" step="0.1" last="0.5"/>
+  </experiment>
+</experiments>"""
+
+
+def test_float_steps_follow_behaviorspace():
+    assert sne.steppedValueSet(0, 0.1, 0.5) == [0.0, 0.1, 0.2, 0.30000000000000004, 0.4, 0.5]
+    # 0.1 * 3 is larger than 0.3, so the last value is left out.
+    assert sne.steppedValueSet(0, 0.1, 0.3) == [0.0, 0.1, 0.2]
+    assert sne.steppedValueSet(2, 1, 1) == []
+
+
+def test_exact_steps_keep_the_precision_of_the_model_file():
+    assert sne.steppedValueSet("0", "0.1", "0.5", exact = True) == \
+        ["0", "0.1", "0.2", "0.3", "0.4", "0.5"]
+    assert sne.steppedValueSet("0", "0.1", "0.3", exact = True) == ["0", "0.1", "0.2", "0.3"]
+    assert sne.steppedValueSet("1.00", "0.25", "2", exact = True) == \
+        ["1.00", "1.25", "1.50", "1.75", "2.00"]
+    assert sne.steppedValueSet("5", "1", "7", exact = True) == ["5", "6", "7"]
+
+
+def test_exact_steps_in_split_setup_files(tmp_path, split):
+    nlogo_file = writeModel(str(tmp_path / "model.nlogo"), EXPERIMENT)
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    split([nlogo_file, "steps", "--output_dir", str(output_dir), "--exact_steps"])
+    values = []
+    for run in range(6):
+        with open(os.path.join(str(output_dir), "steps{0}.xml".format(run))) as xmlfp:
+            xml = xmlfp.read()
+        values.append(xml.split('<value value="')[1].split('"')[0])
+    assert values == ["0", "0.1", "0.2", "0.3", "0.4", "0.5"]